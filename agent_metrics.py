@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Métricas en memoria del agente AutoMax (contadores, latencias y uso de tokens)
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+
+class AgentMetrics:
+    """
+    Registro de métricas seguro entre hilos. Se consulta desde /status.
+    """
+
+    def __init__(self, latency_window: int = 1000):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._latencies: Dict[str, deque] = {}
+        self._token_usage: Dict[str, Dict[str, int]] = {}
+        self._latency_window = latency_window
+
+    def increment(self, name: str, amount: int = 1):
+        """Incrementa un contador"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def get_counter(self, name: str) -> int:
+        """Valor actual de un contador"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def observe_latency(self, name: str, seconds: float):
+        """Registra una latencia (ventana deslizante)"""
+        with self._lock:
+            samples = self._latencies.get(name)
+            if samples is None:
+                samples = self._latencies[name] = deque(maxlen=self._latency_window)
+            samples.append(seconds)
+
+    def latency_count(self, name: str) -> int:
+        """Número de muestras de latencia en la ventana"""
+        with self._lock:
+            return len(self._latencies.get(name, ()))
+
+    def latency_percentile(self, name: str, percentile: float) -> Optional[float]:
+        """Percentil (0-100) de las latencias registradas, o None si no hay muestras"""
+        with self._lock:
+            samples = sorted(self._latencies.get(name, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def record_usage(self, task: str, usage: Any) -> Dict[str, int]:
+        """
+        Acumula el uso de tokens devuelto por la API, incluidos los tokens de
+        prompt servidos desde la caché de prefijos del proveedor
+        """
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+
+        with self._lock:
+            totals = self._token_usage.setdefault(task, {
+                "calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0
+            })
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["cached_tokens"] += cached_tokens
+            totals["completion_tokens"] += completion_tokens
+
+        return {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "completion_tokens": completion_tokens
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copia serializable de todas las métricas"""
+        with self._lock:
+            latencies = {
+                name: {
+                    "count": len(samples),
+                    "p50_ms": round(sorted(samples)[len(samples) // 2] * 1000, 1) if samples else None,
+                    "p95_ms": round(sorted(samples)[int(0.95 * (len(samples) - 1))] * 1000, 1) if samples else None
+                }
+                for name, samples in self._latencies.items()
+            }
+            token_usage = {}
+            for task, totals in self._token_usage.items():
+                entry = dict(totals)
+                entry["cached_ratio"] = round(totals["cached_tokens"] / totals["prompt_tokens"], 3) if totals["prompt_tokens"] else 0.0
+                token_usage[task] = entry
+            return {
+                "counters": dict(self._counters),
+                "latencies": latencies,
+                "token_usage": token_usage
+            }
+
+    def reset(self):
+        """Borra todas las métricas"""
+        with self._lock:
+            self._counters.clear()
+            self._latencies.clear()
+            self._token_usage.clear()
+
+
+# Instancia compartida por todo el proceso
+metrics = AgentMetrics()
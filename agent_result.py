@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Resultado de procesar un mensaje: texto, adjuntos, intención y tiempos de
+cada etapa. Se crea uno por petición, así que una única instancia del agente
+puede atender a muchos clientes a la vez sin mezclar sus respuestas.
+"""
+
+from typing import Dict, Any, Optional, List
+
+
+class Attachment:
+    """
+    Lo que acompaña al texto de la respuesta: la foto de un vehículo
+    ("image", con `path`) o un mensaje de lista de WhatsApp ("list", con
+    cabecera, cuerpo, botón y secciones en `data`)
+    """
+
+    __slots__ = ("kind", "path", "caption", "data")
+
+    def __init__(self, kind: str, path: Optional[str] = None, caption: Optional[str] = None,
+                 data: Optional[Dict[str, Any]] = None):
+        self.kind = kind
+        self.path = path
+        self.caption = caption
+        self.data = data
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "path": self.path, "caption": self.caption, "data": self.data}
+
+
+class AgentResult:
+    """
+    Respuesta del agente para una petición. `tool_name` indica qué
+    herramienta generó el texto (None si viene del LLM) para guardarlo
+    compacto en el historial; `vehicle_id` es el vehículo del que trata la
+    respuesta, que pasa a ser el vehículo en foco de la sesión.
+    """
+
+    __slots__ = ("text", "intent", "tool_name", "attachments", "timings", "cached", "error", "vehicle_id")
+
+    def __init__(self, text: str, intent: Optional[str] = None, tool_name: Optional[str] = None,
+                 attachments: Optional[List[Attachment]] = None, error: Optional[str] = None,
+                 vehicle_id: Optional[str] = None):
+        self.text = text
+        self.vehicle_id = vehicle_id
+        self.intent = intent
+        self.tool_name = tool_name
+        self.attachments: List[Attachment] = attachments or []
+        self.timings: Dict[str, float] = {}
+        self.cached = False
+        self.error = error
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        return f"AgentResult(intent={self.intent!r}, text={self.text[:40]!r}, attachments={len(self.attachments)})"
+
+    @property
+    def image_path(self) -> Optional[str]:
+        """Ruta de la primera imagen adjunta, si la hay"""
+        for attachment in self.attachments:
+            if attachment.kind == "image":
+                return attachment.path
+        return None
+
+    @property
+    def list_message(self) -> Optional[Dict[str, Any]]:
+        """Mensaje de lista adjunto (resultados del inventario), si lo hay"""
+        for attachment in self.attachments:
+            if attachment.kind == "list":
+                return attachment.data
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Formato de process_message"""
+        result = {
+            "success": self.error is None,
+            "response": self.text,
+            "type": "text",
+            "intent": self.intent,
+            "vehicle_id": self.vehicle_id,
+            "cached": self.cached,
+            "attachments": [attachment.to_dict() for attachment in self.attachments],
+            "image_path": self.image_path,
+            "list": self.list_message,
+            "timings_ms": {stage: round(seconds * 1000, 2) for stage, seconds in self.timings.items()}
+        }
+        if self.error is not None:
+            result["error"] = self.error
+        return result
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Caché semántica de respuestas de chat general para preguntas frecuentes
+("do you offer financing?", "can I test drive?", "is there a warranty?")
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, Optional, List, Tuple
+
+from agent_metrics import metrics as default_metrics
+from feature_search import tokenize
+
+# Palabras de relleno propias de las preguntas frecuentes (además de las de feature_search)
+FAQ_FILLER = frozenset((
+    "offer", "option", "possible", "available", "provide", "accept", "know", "question",
+    "there", "guys", "ofrecen", "posible", "disponible", "puedo", "puede", "podria",
+))
+NGRAM_SIZE = 3
+HASH_BUCKETS = 1 << 20
+_QUESTION_START = re.compile(
+    r"^\s*(?:¿|do|does|did|can|could|is|are|will|would|what|when|where|how|which|who|why|"
+    r"puedo|puede|hay|tienen|ofrecen|aceptan|cu[aá]l|cu[aá]ndo|d[oó]nde|c[oó]mo|qu[eé])\b",
+    re.IGNORECASE
+)
+_PROPER_NOUN = re.compile(r"(?<!^)(?<![.!?¿¡]\s)\b([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)\b")
+MAX_QUESTION_WORDS = 25
+# "is there no warranty?" no es "is there a warranty?" aunque los vectores casi coincidan
+_NEGATION = re.compile(
+    r"\b(?:no|not|never|without|cannot|none|nothing|neither|nor|nunca|sin|ning[uú]n[oa]?|nada|tampoco)\b"
+    r"|n['’]t\b",
+    re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=65536)
+def _bucket(feature: str) -> int:
+    """Dimensión estable de un n-grama o término (blake2b: igual en todos los procesos, a diferencia de hash())"""
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big") % HASH_BUCKETS
+
+
+def is_negated(text: str) -> bool:
+    """La pregunta lleva una negación ("no", "not", "don't", "sin"...)"""
+    return _NEGATION.search(text) is not None
+
+
+def question_terms(text: str) -> List[str]:
+    """Términos normalizados de una pregunta (sin tildes, sin relleno y con raíz)"""
+    return [term for term in tokenize(text) if term not in FAQ_FILLER]
+
+
+def question_vector(text: str) -> Dict[int, float]:
+    """
+    Vector disperso normalizado (L2) de n-gramas de caracteres de los términos,
+    más los términos completos, con hashing estable a HASH_BUCKETS dimensiones
+    """
+    terms = question_terms(text)
+    if not terms:
+        return {}
+    padded = f" {' '.join(terms)} "
+    vector: Dict[int, float] = {}
+    for start in range(len(padded) - NGRAM_SIZE + 1):
+        bucket = _bucket(padded[start:start + NGRAM_SIZE])
+        vector[bucket] = vector.get(bucket, 0.0) + 1.0
+    for term in terms:
+        bucket = _bucket("w:" + term)
+        vector[bucket] = vector.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {bucket: weight / norm for bucket, weight in vector.items()}
+
+
+def is_cacheable_question(question: str, answer: str) -> bool:
+    """
+    Solo preguntas cortas y genéricas: con forma de pregunta, sin cifras
+    (fechas, teléfonos, precios) y cuya respuesta no repite un nombre propio
+    de la pregunta ("I'm Maria, do you...?" → "Hi Maria, ...")
+    """
+    if not answer or len(question.split()) > MAX_QUESTION_WORDS or any(char.isdigit() for char in question):
+        return False
+    if "?" not in question and not _QUESTION_START.match(question):
+        return False
+    return not any(name in answer for name in _PROPER_NOUN.findall(question))
+
+
+class _Entry:
+    __slots__ = ("question", "answer", "vector", "negated", "created", "hits")
+
+    def __init__(self, question: str, answer: str, vector: Dict[int, float], created: float):
+        self.question = question
+        self.answer = answer
+        self.vector = vector
+        self.negated = is_negated(question)
+        self.created = created
+        self.hits = 0
+
+
+class SemanticAnswerCache:
+    """
+    Respuestas de GENERAL_CHAT indexadas por el vector de su pregunta. Una
+    pregunta nueva reutiliza la respuesta de la más parecida si la similitud
+    coseno supera el umbral y las dos llevan (o no) una negación. Índice
+    invertido dimensión → entradas, así que solo se comparan las entradas
+    que comparten algún n-grama.
+
+    Las entradas caducan a los SEMANTIC_CACHE_TTL segundos; con el máximo de
+    entradas se descartan las más antiguas.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, threshold: Optional[float] = None,
+                 ttl: Optional[float] = None, max_entries: Optional[int] = None,
+                 metrics=None, clock=time.monotonic):
+        if enabled is None:
+            enabled = os.getenv('SEMANTIC_CACHE', '1').lower() in ('1', 'true', 'yes')
+        if threshold is None:
+            threshold = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.8'))
+        if ttl is None:
+            ttl = float(os.getenv('SEMANTIC_CACHE_TTL', '21600'))
+        if max_entries is None:
+            max_entries = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '1000'))
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.metrics = metrics or default_metrics
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._postings: Dict[int, set] = {}
+        self._next_id = 0
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "stored": 0, "expired": 0, "evicted": 0, "purged": 0}
+
+    def lookup(self, question: str) -> Optional[Tuple[str, float]]:
+        """(respuesta, similitud) de la pregunta cacheada más parecida, o None"""
+        if not self.enabled:
+            return None
+        vector = question_vector(question)
+        negated = is_negated(question)
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._expire()
+            best_id, best_score = None, 0.0
+            if vector:
+                scores: Dict[int, float] = {}
+                for bucket, weight in vector.items():
+                    for entry_id in self._postings.get(bucket, ()):
+                        scores[entry_id] = scores.get(entry_id, 0.0) + weight * self._entries[entry_id].vector[bucket]
+                for entry_id, score in scores.items():
+                    if score > best_score and self._entries[entry_id].negated == negated:
+                        best_id, best_score = entry_id, score
+            if best_id is None or best_score < self.threshold:
+                self._stats["misses"] += 1
+                hit = None
+            else:
+                entry = self._entries[best_id]
+                entry.hits += 1
+                self._stats["hits"] += 1
+                hit = (entry.answer, best_score)
+        self.metrics.increment("answer_cache.hits" if hit else "answer_cache.misses")
+        return hit
+
+    def store(self, question: str, answer: str) -> bool:
+        """Guarda la respuesta si la pregunta es cacheable; devuelve True si se guardó"""
+        if not self.enabled or not is_cacheable_question(question, answer):
+            return False
+        vector = question_vector(question)
+        if not vector:
+            return False
+        with self._lock:
+            self._expire()
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(question, answer, vector, self._clock())
+            for bucket in vector:
+                self._postings.setdefault(bucket, set()).add(entry_id)
+            self._stats["stored"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evicted"] += 1
+        self.metrics.increment("answer_cache.stored")
+        return True
+
+    def purge(self) -> int:
+        """Vacía la caché (administración); devuelve cuántas entradas se eliminaron"""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._postings.clear()
+            self._stats["purged"] += removed
+        print(f"🧹 Caché de respuestas vaciada: {removed} entradas")
+        return removed
+
+    def report(self, include_questions: bool = False) -> Dict[str, Any]:
+        """
+        Aciertos, fallos y entradas (para /status). Las preguntas más
+        repetidas son texto de clientes: solo con `include_questions`, que
+        usa el endpoint /admin protegido por token.
+        """
+        with self._lock:
+            self._expire()
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            if include_questions:
+                top = sorted(self._entries.values(), key=lambda entry: entry.hits, reverse=True)[:5]
+                stats["top_questions"] = [{"question": entry.question, "hits": entry.hits}
+                                          for entry in top if entry.hits]
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        stats["enabled"] = self.enabled
+        stats["threshold"] = self.threshold
+        stats["ttl_s"] = self.ttl
+        return stats
+
+    def _expire(self):
+        # Las entradas están en orden de inserción: basta mirar desde el principio
+        limit = self._clock() - self.ttl
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if entry.created > limit:
+                break
+            self._remove(entry_id)
+            self._stats["expired"] += 1
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for bucket in entry.vector:
+            postings = self._postings.get(bucket)
+            if postings is not None:
+                postings.discard(entry_id)
+                if not postings:
+                    del self._postings[bucket]
@@ -0,0 +1,1372 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de rendimiento del agente AutoMax (no hacen llamadas a OpenAI)
+
+Uso:
+    python benchmark_performance.py            # ejecuta todos
+    python benchmark_performance.py history    # ejecuta solo los indicados
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, List, Callable
+
+from conversation_memory import ConversationMemory, estimate_messages_tokens
+
+# Los agentes de los benchmarks no deben escribir en la base de sesiones real
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("SESSION_COLD_DIR", "")
+
+RECORDED_CONVERSATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                      "data", "recorded_conversations.json")
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {}
+
+
+def benchmark(name: str):
+    """Registra una función de benchmark con un nombre corto"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def load_recorded_conversations() -> List[Dict[str, Any]]:
+    """Carga las conversaciones grabadas usadas como referencia"""
+    with open(RECORDED_CONVERSATIONS, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def make_offline_agent():
+    """Crea un agente sin cliente OpenAI para ejecutar solo las herramientas locales"""
+    from chat_agent_python import CarDealershipChatAgent
+    agent = CarDealershipChatAgent()
+    agent.llm.client = None
+    return agent
+
+
+def replay_tool_output(agent, turn: Dict[str, str]):
+    """Reproduce localmente la respuesta de un turno grabado: (texto, herramienta)"""
+    intent = turn["intent"]
+    message = turn["user"]
+    if intent == "SEARCH_INVENTORY":
+        return agent.search_inventory(message), "Inventory search results"
+    if intent == "VEHICLE_DETAILS":
+        return agent.get_vehicle_details(agent.detect_specific_vehicle(message)), "Vehicle details card"
+    if intent == "SCHEDULE_APPOINTMENT":
+        return agent.schedule_appointment(message), None
+    if intent == "COMPANY_INFO":
+        return agent.get_company_info(message), None
+    return turn["assistant"], None
+
+
+SYNTHETIC_MODELS = [
+    ("BMW", "X3", "SUV"), ("BMW", "Serie 3", "sedan"), ("Mercedes-Benz", "C-Class", "sedan"),
+    ("Mercedes-Benz", "GLC", "SUV"), ("Audi", "A4", "sedan"), ("Audi", "Q5", "SUV"),
+    ("Volkswagen", "Golf", "hatchback"), ("Volkswagen", "Tiguan", "SUV"), ("SEAT", "León", "hatchback"),
+    ("SEAT", "Ateca", "SUV"), ("Ford", "Mustang", "sports car"), ("Ford", "Focus", "hatchback"),
+]
+SYNTHETIC_COLORS = ["metallic blue", "storm bay blue", "obsidian black", "glacier white",
+                    "racing red", "silver grey", "desire blue", "pearl white"]
+SYNTHETIC_FUELS = ["Gasoline", "Gasoline", "Diesel", "Hybrid", "Electric"]
+SYNTHETIC_FEATURES = ["Leather seats", "Harman Kardon premium sound system", "Adaptive cruise control",
+                      "Wireless smartphone charger", "Panoramic sunroof", "All-wheel drive",
+                      "Heated seats", "Parking sensors", "LED headlights", "Navigation system"]
+# Marcas que _analyze_response buscaba antes de leerlas del catálogo
+LEGACY_RESPONSE_BRANDS = ("BMW", "Toyota", "Tesla", "Honda", "Ford", "Audi")
+
+
+def synthetic_vehicles(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Inventario sintético con el mismo formato de texto que data/vehicles.json"""
+    import random
+    rng = random.Random(seed)
+    vehicles = []
+    for index in range(count):
+        brand, model, vehicle_type = rng.choice(SYNTHETIC_MODELS)
+        year = rng.randint(2015, 2024)
+        mileage = 0 if year >= 2023 and rng.random() < 0.6 else rng.randint(5, 180) * 1000
+        power = rng.randint(90, 480)
+        vehicles.append({
+            "id": f"SYN_{index:06d}",
+            "brand": brand, "model": model, "year": year,
+            "price": f"€{rng.randint(12, 90) * 1000:,}",
+            "color": rng.choice(SYNTHETIC_COLORS), "type": vehicle_type,
+            "engine": f"{rng.choice(['1.5L', '2.0L', '3.0L'])} Turbo",
+            "fuel": rng.choice(SYNTHETIC_FUELS),
+            "transmission": rng.choice(["6-speed Manual", "8-speed Automatic"]),
+            "mileage": "0 km (new vehicle)" if mileage == 0 else f"{mileage:,} km",
+            "power": f"{power} HP ({int(power * 0.7355)} kW)",
+            "consumption": f"{rng.uniform(4.5, 13.0):.1f}L/100km",
+            "emissions": f"{rng.randint(110, 300)} g/km CO2",
+            "drivetrain": rng.choice(["Front-wheel drive", "Rear-wheel drive", "All-wheel drive"]),
+            "features": rng.sample(SYNTHETIC_FEATURES, 4),
+            "dimensions": "4.70m x 1.85m x 1.45m",
+            "trunk_capacity": f"{rng.randint(300, 650)} liters",
+            "warranty": f"{rng.randint(1, 3)}-year warranty",
+            "image": ""
+        })
+    return vehicles
+
+
+def write_inventory_files(vehicles: List[Dict[str, Any]], directory: str) -> Dict[str, str]:
+    """Escribe el inventario en JSON, CSV y SQLite; devuelve {formato: ruta}"""
+    import csv
+    import sqlite3
+    fields = list(vehicles[0].keys())
+    paths = {fmt: os.path.join(directory, f"inventory.{fmt}") for fmt in ("json", "csv", "sqlite")}
+
+    with open(paths["json"], "w", encoding="utf-8") as f:
+        json.dump({"vehicles": vehicles}, f, ensure_ascii=False)
+
+    with open(paths["csv"], "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for vehicle in vehicles:
+            writer.writerow(dict(vehicle, features="|".join(vehicle["features"])))
+
+    connection = sqlite3.connect(paths["sqlite"])
+    connection.execute(f"CREATE TABLE vehicles ({', '.join(fields)})")
+    connection.executemany(
+        f"INSERT INTO vehicles VALUES ({', '.join('?' for _ in fields)})",
+        [[json.dumps(v[f]) if f == "features" else v[f] for f in fields] for v in vehicles]
+    )
+    connection.commit()
+    connection.close()
+    return paths
+
+
+@benchmark("history")
+def bench_history_tokens():
+    """Tokens de prompt en los turnos GENERAL_CHAT: historial de 19 mensajes vs presupuesto de tokens"""
+    agent = make_offline_agent()
+    budget = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+    print(f"📉 Tokens de prompt por turno GENERAL_CHAT (presupuesto: {budget} tokens)")
+
+    total_legacy = total_budgeted = 0
+    for conversation in load_recorded_conversations():
+        legacy_history: List[Dict[str, str]] = []
+        memory = ConversationMemory(token_budget=budget)
+        legacy_tokens = budgeted_tokens = 0
+
+        for turn in conversation["turns"]:
+            legacy_history.append({"role": "user", "content": turn["user"]})
+            if len(legacy_history) > 20:
+                legacy_history = legacy_history[-19:]
+            memory.add("replay", "user", turn["user"])
+            memory.flush()
+
+            if turn["intent"] == "GENERAL_CHAT":
+                legacy_tokens += estimate_messages_tokens([agent.system_message] + legacy_history)
+                budgeted_tokens += estimate_messages_tokens([agent.system_message] + memory.get_messages("replay"))
+
+            text, tool_name = replay_tool_output(agent, turn)
+            legacy_history.append({"role": "assistant", "content": text})
+            if len(legacy_history) > 20:
+                legacy_history = legacy_history[-19:]
+            memory.add("replay", "assistant", text, tool_name=tool_name)
+            memory.flush()
+
+        saved = 100.0 * (legacy_tokens - budgeted_tokens) / legacy_tokens if legacy_tokens else 0.0
+        print(f"   {conversation['id']:<24} antes: {legacy_tokens:>6}  después: {budgeted_tokens:>6}  (-{saved:.1f}%)")
+        total_legacy += legacy_tokens
+        total_budgeted += budgeted_tokens
+
+    saved = 100.0 * (total_legacy - total_budgeted) / total_legacy if total_legacy else 0.0
+    print(f"   {'TOTAL':<24} antes: {total_legacy:>6}  después: {total_budgeted:>6}  (-{saved:.1f}%)")
+
+
+class SimulatedCompletions:
+    """Backend simulado con cola de latencia: la mayoría rápidas, algunas muy lentas"""
+
+    def __init__(self, fast: float = 0.01, slow: float = 0.3, slow_ratio: float = 0.05, seed: int = 7):
+        import random
+        self._random = random.Random(seed)
+        self.fast = fast
+        self.slow = slow
+        self.slow_ratio = slow_ratio
+
+    async def create(self, model: str, messages: List[Dict[str, str]], **params):
+        import asyncio
+        from types import SimpleNamespace
+        delay = self.slow if self._random.random() < self.slow_ratio else self.fast
+        await asyncio.sleep(delay)
+        message = SimpleNamespace(content="ok")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@benchmark("hedging")
+def bench_hedging():
+    """Latencia p50/p99 con y sin peticiones cubiertas sobre un backend con cola lenta"""
+    import asyncio
+    from types import SimpleNamespace
+    from agent_metrics import AgentMetrics
+    from llm_client import LLMClient
+
+    async def run_batch(client: LLMClient, requests: int) -> List[float]:
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            await client.acomplete("bench", model="simulated", messages=[{"role": "user", "content": "hi"}])
+            latencies.append(time.perf_counter() - start)
+        return sorted(latencies)
+
+    for hedging in (False, True):
+        bench_metrics = AgentMetrics()
+        client = LLMClient(api_key="offline", hedging=hedging, hedge_delay=0.05,
+                           hedge_budget=0.1, metrics=bench_metrics)
+        client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+            create=SimulatedCompletions().create)))
+        latencies = asyncio.run(run_batch(client, 200))
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(0.99 * (len(latencies) - 1))] * 1000
+        label = "con hedging" if hedging else "sin hedging"
+        print(f"   {label:<12} p50: {p50:6.1f} ms  p99: {p99:6.1f} ms  "
+              f"duplicados: {bench_metrics.get_counter('llm.hedges_fired')} "
+              f"(ganados: {bench_metrics.get_counter('llm.hedges_won')})")
+
+
+@benchmark("speculation")
+def bench_speculation():
+    """Conversaciones grabadas con y sin GENERAL_CHAT especulativo (backend simulado)"""
+    import asyncio
+    from types import SimpleNamespace
+    from agent_metrics import AgentMetrics
+    from speculation import SpeculationGuard
+
+    intent_latency, chat_latency = 0.03, 0.06
+    state = {"intent": "GENERAL_CHAT"}
+
+    async def create(model, messages, **params):
+        is_intent = messages[0]["content"].startswith("You are an assistant specialized in determining user intent")
+        await asyncio.sleep(intent_latency if is_intent else chat_latency)
+        content = state["intent"] if is_intent else "Simulated answer from the dealership assistant."
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    for enabled in (False, True):
+        agent = make_offline_agent()
+        agent.llm.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        agent.speculation = SpeculationGuard(enabled=enabled, max_rate=1.0, metrics=AgentMetrics())
+
+        async def replay():
+            elapsed = 0.0
+            for conversation in load_recorded_conversations():
+                for turn in conversation["turns"]:
+                    state["intent"] = turn["intent"]
+                    start = time.perf_counter()
+                    await agent.aget_response(turn["user"], conversation["id"])
+                    elapsed += time.perf_counter() - start
+            return elapsed
+
+        import contextlib
+        import io
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed = asyncio.run(replay())
+        report = agent.speculation.report()
+        label = "especulativo" if enabled else "en serie"
+        print(f"   {label:<13} tiempo total: {elapsed * 1000:7.1f} ms  aciertos: {report['hits']:>2}  "
+              f"cancelados: {report['cancelled']:>2}  ahorro: {report['latency_saved_s'] * 1000:6.1f} ms  "
+              f"tokens extra: {report['extra_prompt_tokens'] + report['extra_completion_tokens']}")
+
+
+def measure_call(func, repeat: int = 2000):
+    """(µs por llamada, bytes asignados por llamada) de una función sin argumentos"""
+    import tracemalloc
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    per_call_us = (time.perf_counter() - start) / repeat * 1e6
+
+    tracemalloc.start()
+    func()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_call_us, max(0, peak - baseline)
+
+
+@benchmark("catalog")
+def bench_catalog():
+    """Coste por llamada: reconstruir los literales del inventario vs consultar el catálogo"""
+    from vehicle_catalog import get_catalog, DEFAULT_CATALOG_PATH
+    agent = make_offline_agent()
+    catalog = get_catalog()
+
+    with open(DEFAULT_CATALOG_PATH, encoding="utf-8") as f:
+        raw = json.load(f)
+    cars_dict = {v["id"]: {k: val for k, val in v.items() if k != "id"} for v in raw["vehicles"]}
+    keyword_dict = dict(raw["keywords"])
+    # Mismas estructuras que antes se escribían como literales dentro de cada método
+    legacy_details = eval("lambda: " + repr(cars_dict))
+    legacy_search = eval("lambda: " + repr(raw["vehicles"]))
+    legacy_keywords = eval("lambda: " + repr(keyword_dict))
+
+    rows = [
+        ("literal get_vehicle_details (antes)", legacy_details),
+        ("catalog.get (después)", lambda: catalog.get("AUDI_A4_2022_WHT")),
+        ("literal search_inventory (antes)", legacy_search),
+        ("list(catalog.vehicles) (después)", lambda: list(catalog.vehicles)),
+        ("literal detect_specific_vehicle (antes)", legacy_keywords),
+        ("catalog.keywords (después)", lambda: catalog.keywords),
+        ("get_vehicle_details() completo", lambda: agent.get_vehicle_details("AUDI_A4_2022_WHT")),
+        ("search_inventory() completo", lambda: agent.search_inventory("blue sedan")),
+        ("detect_specific_vehicle() completo", lambda: agent.detect_specific_vehicle("tell me about the bmw")),
+    ]
+    for label, func in rows:
+        per_call_us, allocated = measure_call(func)
+        print(f"   {label:<40} {per_call_us:8.2f} µs/llamada  {allocated:>7} B asignados")
+
+
+@benchmark("inventory_reload")
+def bench_inventory_reload():
+    """Tiempo de recarga de un inventario de 50.000 vehículos por formato de fuente"""
+    import tempfile
+    from inventory_loader import InventoryWatcher
+    from vehicle_catalog import get_catalog, set_catalog
+    vehicles = synthetic_vehicles(50_000)
+    # La recarga publica el inventario sintético: se restaura el real para las secciones siguientes
+    previous = get_catalog()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_inventory_files(vehicles, directory)
+            for fmt, path in paths.items():
+                size_mb = os.path.getsize(path) / 1e6
+                watcher = InventoryWatcher(path)
+                watcher.reload(force=True)
+                print(f"   {fmt:<7} {size_mb:6.1f} MB  recarga: {watcher.last_reload_seconds * 1000:8.1f} ms  "
+                      f"versión: {watcher.last_version}")
+    finally:
+        set_catalog(previous)
+
+
+@benchmark("facets")
+def bench_facets():
+    """Filtrado de 100.000 vehículos: barrido lineal por atributo vs índices invertidos"""
+    from vehicle_catalog import VehicleCatalog
+    from inventory_query import parse_inventory_query
+    vehicles = synthetic_vehicles(100_000)
+    start = time.perf_counter()
+    catalog = VehicleCatalog(vehicles, version="bench")
+    print(f"   catálogo + índices de 100k vehículos: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def linear_scan(facets):
+        # Mismo criterio que los filtros encadenados anteriores, con varios valores por atributo
+        cars = list(catalog.vehicles)
+        for facet, values in facets.items():
+            cars = [car for car in cars if any(value in str(car.get(facet, "")).lower() for value in values)]
+        return cars
+
+    queries = ["blue or red suv", "electric bmw", "white mercedes sedan", "hybrid hatchback in black",
+               "audi"]
+    for query in queries:
+        facets = parse_inventory_query(query, catalog).facets
+        scan_us, _ = measure_call(lambda: linear_scan(facets), repeat=5)
+        index_us, _ = measure_call(lambda: catalog.filter(facets), repeat=50)
+        assert len(linear_scan(facets)) == len(catalog.filter(facets))
+        print(f"   {query:<28} {len(catalog.filter(facets)):>6} resultados  barrido: {scan_us / 1000:7.2f} ms  "
+              f"índices: {index_us / 1000:6.2f} ms  ({scan_us / index_us:5.1f}x)")
+
+
+def scan_list_of_dicts(vehicles, search, page_size: int = 5):
+    """
+    Búsqueda sobre la lista de diccionarios, como antes de los índices: comparar
+    el texto y convertir los números de cada vehículo en cada consulta
+    """
+    from vehicle_catalog import parse_number
+    cars = list(vehicles)
+    for facet, values in search.facets.items():
+        cars = [car for car in cars if any(value in str(car.get(facet, "")).lower() for value in values)]
+    for field, numeric_range in search.ranges.items():
+        kept = []
+        for car in cars:
+            value = parse_number(car.get(field))
+            if value is None:
+                continue
+            if numeric_range.minimum is not None and (value < numeric_range.minimum or
+                                                      (value == numeric_range.minimum and not numeric_range.min_inclusive)):
+                continue
+            if numeric_range.maximum is not None and (value > numeric_range.maximum or
+                                                      (value == numeric_range.maximum and not numeric_range.max_inclusive)):
+                continue
+            kept.append(car)
+        cars = kept
+    if search.sort:
+        cars = sorted(cars, key=lambda car: parse_number(car.get(search.sort)) or 0, reverse=search.descending)
+    return len(cars), tuple(cars[:page_size])
+
+
+@benchmark("ranges")
+def bench_ranges():
+    """Intervalos, orden y top-k sobre 100.000 vehículos: parseo + barrido vs índices ordenados"""
+    from vehicle_catalog import VehicleCatalog
+    from inventory_query import parse_inventory_query
+    catalog = VehicleCatalog(synthetic_vehicles(100_000), version="bench", columnar=False)
+
+    linear_scan = lambda search: scan_list_of_dicts(catalog.vehicles, search)
+
+    queries = ["suv under €40k", "over 180 hp newest first", "top 5 cheapest", "less than 20,000 km from 2021",
+               "blue sedan between 20k and 30k most powerful"]
+    for query in queries:
+        search = parse_inventory_query(query, catalog)
+        indexed = lambda: catalog.search(search.facets, search.ranges, sort=search.sort,
+                                         descending=search.descending, limit=5)
+        scan_us, _ = measure_call(lambda: linear_scan(search), repeat=3)
+        index_us, _ = measure_call(indexed, repeat=20)
+        assert linear_scan(search)[0] == indexed()[0]
+        print(f"   {query:<46} {indexed()[0]:>6} resultados  barrido: {scan_us / 1000:7.1f} ms  "
+              f"índices: {index_us / 1000:6.2f} ms  ({scan_us / index_us:6.1f}x)")
+
+
+@benchmark("columnar")
+def bench_columnar():
+    """Lista de diccionarios vs índices en Python vs máscara NumPy, a 1k, 10k y 100k vehículos"""
+    from vehicle_catalog import VehicleCatalog
+    from inventory_columns import ColumnarInventory
+    from inventory_query import parse_inventory_query
+    if not ColumnarInventory.available:
+        print("   ⚠️ NumPy no está instalado: se omite")
+        return
+
+    queries = ["blue or red suv under €40k", "over 180 hp newest first", "top 5 cheapest",
+               "hybrid hatchback less than 50,000 km from 2020 most powerful"]
+    for size in (1_000, 10_000, 100_000):
+        vehicles = synthetic_vehicles(size)
+        start = time.perf_counter()
+        indexed = VehicleCatalog(vehicles, version="bench", columnar=False)
+        indexed_build = time.perf_counter() - start
+        start = time.perf_counter()
+        columnar = VehicleCatalog(vehicles, version="bench", columnar=True)
+        columnar_build = time.perf_counter() - start
+        print(f"   {size:>7,} vehículos  carga: índices {indexed_build * 1000:.0f} ms, "
+              f"índices + NumPy {columnar_build * 1000:.0f} ms")
+
+        repeat = max(3, 200_000 // size)
+        for query in queries:
+            search = parse_inventory_query(query, indexed)
+            args = (search.facets, search.ranges, search.sort, search.descending, 0, 5)
+            scan_us, _ = measure_call(lambda: scan_list_of_dicts(vehicles, search), repeat=max(2, repeat // 10))
+            index_us, _ = measure_call(lambda: indexed.search(*args), repeat=repeat)
+            numpy_us, _ = measure_call(lambda: columnar.search(*args), repeat=repeat)
+            assert indexed.search(*args)[0] == columnar.search(*args)[0] == scan_list_of_dicts(vehicles, search)[0]
+            print(f"      {query:<62} lista: {scan_us / 1000:8.2f} ms  índices: {index_us / 1000:7.2f} ms  "
+                  f"numpy: {numpy_us / 1000:6.2f} ms")
+
+
+@benchmark("matcher")
+def bench_matcher():
+    """Bucles de subcadenas vs matcher compilado en mensajes largos, con y sin palabras clave"""
+    from vehicle_catalog import get_catalog
+    from chat_agent_python import LANGUAGE_HINTS, LANGUAGE_HINT_MATCHER
+    from response_actions import RESPONSE_SIGNALS, ResponseAnalyzer
+    catalog = get_catalog()
+    turns = [turn["user"] for conversation in load_recorded_conversations() for turn in conversation["turns"]]
+    with_keywords = " ".join(turns) + " I would also like to know about the blue bmw series 3 and its warranty. "
+    without_keywords = ("Thanks for the quick answer yesterday, my partner and I talked it over during dinner "
+                        "and we still have a few questions about delivery times and paperwork. ")
+
+    def legacy_detect(keywords):
+        def detect(text):
+            lower = text.lower()
+            for keyword, vehicle_id in keywords:
+                if keyword in lower:
+                    return vehicle_id
+            return None
+        return detect
+
+    def legacy_language(text):
+        lower = text.lower()
+        for language, words in LANGUAGE_HINTS:
+            if any(word in lower for word in words):
+                return language
+        return "english"
+
+    def legacy_signals(text):
+        lower = text.lower()
+        found = {brand for brand in LEGACY_RESPONSE_BRANDS if brand.lower() in lower}
+        found.update(signal for signal, words in RESPONSE_SIGNALS.items() if any(word in lower for word in words))
+        return found
+
+    rows = [
+        ("detect_specific_vehicle", legacy_detect(catalog.keywords), catalog.keyword_matcher.best),
+        ("detect_user_language (fallback)", legacy_language, LANGUAGE_HINT_MATCHER.values),
+        ("_analyze_response (señales)", legacy_signals, ResponseAnalyzer().matcher().values),
+    ]
+    # Un mensaje de WhatsApp tiene como máximo 4096 caracteres
+    for size in (200, 1_000, 4_096):
+        for label_text, paragraph in (("con palabras clave", with_keywords), ("sin palabras clave", without_keywords)):
+            text = (paragraph * (size // len(paragraph) + 1))[:size]
+            print(f"   mensaje de {size:,} caracteres {label_text}")
+            for label, legacy, compiled in rows:
+                legacy_us, _ = measure_call(lambda: legacy(text), repeat=500)
+                compiled_us, _ = measure_call(lambda: compiled(text), repeat=500)
+                print(f"      {label:<34} subcadenas: {legacy_us:8.1f} µs  matcher: {compiled_us:8.1f} µs")
+
+    # Un grupo de concesionarios con miles de modelos y versiones como palabras clave
+    from keyword_matcher import KeywordMatcher
+    many = [(f"{brand.lower()} {model.lower()} v{version}", f"{brand}_{model}_{version}")
+            for brand, model, _ in SYNTHETIC_MODELS for version in range(200)]
+    many_matcher = KeywordMatcher(many)
+    text = (without_keywords * 8)[:1_000] + " what about the audi q5 v150?"
+    legacy_us, _ = measure_call(lambda: legacy_detect(many)(text), repeat=50)
+    compiled_us, _ = measure_call(lambda: many_matcher.best(text), repeat=500)
+    print(f"   {len(many):,} palabras clave, mensaje de 1,000 caracteres: "
+          f"subcadenas {legacy_us:8.1f} µs  matcher {compiled_us:6.1f} µs")
+
+    for query in ("blue bmw series 3", "something affordable from ford", "seats for seven"):
+        print(f"   '{query}' → antes {legacy_detect(catalog.keywords)(query) or catalog.default_vehicle_id}, "
+              f"ahora {(catalog.keyword_matcher.best(query) or (0, 0, '', catalog.default_vehicle_id))[3]}")
+
+
+@benchmark("cards")
+def bench_cards():
+    """Ficha y listado: concatenación en cada petición vs textos cacheados por versión del inventario"""
+    from vehicle_catalog import VehicleCatalog, set_catalog, get_catalog
+    from vehicle_cards import VehicleCardCache, render_vehicle_card, render_listing_fragment
+    catalog = VehicleCatalog(synthetic_vehicles(10_000), version="bench-1")
+    cache = VehicleCardCache(max_entries=4096)
+    ids = [car["id"] for car in catalog.vehicles[:2000]]
+    page = catalog.vehicles[:5]
+
+    def legacy_card():
+        # Ficha como se construía antes en get_vehicle_details, con += en cada petición
+        for vehicle_id in ids[:100]:
+            car = catalog.get(vehicle_id)
+            result = f"🚗 {car['brand']} {car['model']} ({car['year']})\n"
+            result += "═══════════════════════════════\n\n"
+            result += f"💰 Price: {car['price']}\n"
+            result += f"🎨 Color: {car['color']}\n"
+            result += f"📊 Mileage: {car['mileage']}\n"
+            result += f"🚙 Type: {car['type']}\n\n"
+            result += "🔧 TECHNICAL SPECIFICATIONS\n"
+            result += "───────────────────────────────\n"
+            result += f"⚡ Engine: {car['engine']}\n"
+            result += f"🏎️ Power: {car['power']}\n"
+            result += f"⚙️ Transmission: {car['transmission']}\n"
+            result += f"🚗 Drivetrain: {car['drivetrain']}\n"
+            result += f"⛽ Consumption: {car['consumption']}\n"
+            result += f"🌱 Emissions: {car['emissions']}\n\n"
+            result += "📏 DIMENSIONS\n"
+            result += "───────────────────────────────\n"
+            result += f"📐 Exterior: {car['dimensions']}\n"
+            result += f"🧳 Trunk: {car['trunk_capacity']}\n\n"
+            result += "✨ FEATURED CHARACTERISTICS\n"
+            result += "───────────────────────────────\n"
+            for feature in car['features']:
+                result += f"🔹 {feature}\n"
+            result += f"\n🛡️ WARRANTY\n"
+            result += "───────────────────────────────\n"
+            result += f"📋 {car['warranty']}\n\n"
+            result += "🏢 Would you like to schedule an appointment to see it at our dealership?\n"
+            result += "📞 We're ready to help you!"
+
+    start = time.perf_counter()
+    rendered = cache.prerender(catalog)
+    print(f"   pre-render de {rendered:,} textos (10k vehículos, límite 4096): "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+    rows = [
+        ("ficha: concatenación (x100)", legacy_card),
+        ("ficha: render_vehicle_card (x100)", lambda: [render_vehicle_card(catalog.get(i)) for i in ids[:100]]),
+        ("ficha: caché (x100)", lambda: [cache.card(i, catalog=catalog) for i in ids[:100]]),
+        ("listado 5 vehículos: render", lambda: "".join(f"{n}. {render_listing_fragment(car)}"
+                                                       for n, car in enumerate(page, 1))),
+        ("listado 5 vehículos: caché", lambda: "".join(f"{n}. {cache.listing_fragment(car, catalog.version)}"
+                                                      for n, car in enumerate(page, 1))),
+    ]
+    for label, func in rows:
+        per_call_us, allocated = measure_call(func, repeat=200)
+        print(f"   {label:<36} {per_call_us:9.1f} µs  {allocated:>8} B asignados")
+    print(f"   caché: {cache.stats()}")
+
+    # Una recarga del inventario vacía la caché global
+    from vehicle_cards import vehicle_cards
+    previous = get_catalog()
+    vehicle_cards.card(previous.default_vehicle_id)
+    set_catalog(VehicleCatalog(list(previous.vehicles), version="bench-reload"))
+    print(f"   entradas tras recargar el inventario: {vehicle_cards.stats()['entries']}")
+    set_catalog(previous)
+
+@benchmark("features")
+def bench_features():
+    """Búsqueda por equipamiento en 100.000 vehículos: barrido de subcadenas vs índice BM25"""
+    from feature_search import FeatureIndex
+    vehicles = synthetic_vehicles(100_000)
+    start = time.perf_counter()
+    index = FeatureIndex(vehicles, excluded_terms=("seat",))
+    print(f"   índice BM25 de 100k vehículos: {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{len(index)} términos")
+
+    def linear_scan(phrase):
+        # Lo que haría falta sin índice: buscar la frase en el texto de cada vehículo
+        phrase = phrase.lower()
+        return [vehicle for vehicle in vehicles
+                if any(phrase in text.lower() for text in vehicle["features"])
+                or phrase in vehicle["drivetrain"].lower()]
+
+    for query, phrase in (("anything with Harman Kardon?", "harman kardon"),
+                          ("wireless charging", "wireless"), ("leather seats and AWD", "leather"),
+                          ("panoramic sunroof", "panoramic")):
+        scan_us, _ = measure_call(lambda: linear_scan(phrase), repeat=3)
+        top_us, _ = measure_call(lambda: index.search(query, limit=5), repeat=200)
+        all_us, _ = measure_call(lambda: index.search(query), repeat=5)
+        print(f"   {query:<30} {len(index.search(query)):>6} resultados  barrido: {scan_us / 1000:7.1f} ms  "
+              f"BM25 top-5: {top_us / 1000:6.2f} ms  BM25 completo: {all_us / 1000:6.1f} ms")
+
+    small = FeatureIndex(synthetic_vehicles(500))
+    for query in ("anything with Harman Kardon?", "leather seats and AWD"):
+        per_call_us, _ = measure_call(lambda: small.search(query, limit=5), repeat=2000)
+        print(f"   500 vehículos, {query:<30} {per_call_us:7.1f} µs")
+
+@benchmark("similarity")
+def bench_similarity():
+    """Vecinos más cercanos en 100.000 vehículos: bucle en Python vs matriz NumPy"""
+    from vehicle_catalog import VehicleCatalog, NumericRange
+    from vehicle_similarity import SimilarityIndex
+    catalog = VehicleCatalog(synthetic_vehicles(100_000), version="bench")
+    start = time.perf_counter()
+    index = SimilarityIndex(catalog.vehicles, catalog._columns)
+    print(f"   vectores de 100k vehículos ({index.dimensions} dimensiones): "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+    matrix = index._matrix
+    vector_us, _ = measure_call(lambda: index.nearest(1234, k=5), repeat=50)
+    index._matrix = None
+    loop_us, _ = measure_call(lambda: index.nearest(1234, k=5), repeat=3)
+    python_result = index.nearest(1234, k=5)
+    index._matrix = matrix
+    assert [p for p, _ in python_result] == [p for p, _ in index.nearest(1234, k=5)]
+    print(f"   top-5 de un vehículo: Python {loop_us / 1000:8.1f} ms   NumPy {vector_us / 1000:6.2f} ms  "
+          f"({loop_us / vector_us:5.1f}x)")
+
+    facets, ranges = {"type": {"suv"}}, {"price": NumericRange(maximum=15000)}
+    query_us, _ = measure_call(lambda: catalog.closest_to(facets, ranges, k=3), repeat=50)
+    print(f"   alternativas 'suv under 15k': {query_us / 1000:6.2f} ms")
+    filtered_us, _ = measure_call(lambda: catalog.similar("SYN_001234", k=5, facets={"fuel": {"hybrid"}}), repeat=50)
+    print(f"   top-5 parecidos entre los híbridos: {filtered_us / 1000:6.2f} ms")
+
+FAQ_VARIANTS = [
+    ("do you offer financing?", ["Do you have financing options?", "is financing available?", "financing?"]),
+    ("can I test drive?", ["is it possible to test drive a car?", "can I do a test drive", "test drive possible?"]),
+    ("is there a warranty?", ["do your cars come with warranty?", "what warranty do you offer?", "warranty?"]),
+    ("do you accept trade-ins?", ["do you accept trade ins", "can I trade in my old car?", "trade-in possible?"]),
+    ("where are you located?", ["where is the dealership located?", "what's your location?", "location?"]),
+    ("what are your opening hours?", ["when are you open?", "opening hours?", "what hours are you open?"]),
+]
+FAQ_DISTINCT = ["do you offer leasing?", "do you offer insurance?", "do you deliver to Valencia?",
+                "what are your closing hours on sunday?", "can I pay in cash?", "do you buy cars?"]
+
+
+@benchmark("answer_cache")
+def bench_answer_cache():
+    """Caché semántica de FAQ: aciertos con paráfrasis, falsos aciertos y coste por consulta"""
+    from answer_cache import SemanticAnswerCache
+    cache = SemanticAnswerCache(enabled=True, threshold=0.8, ttl=3600, max_entries=1000)
+    for question, _ in FAQ_VARIANTS:
+        cache.store(question, f"answer to: {question}")
+
+    hits = 0
+    for question, variants in FAQ_VARIANTS:
+        for variant in variants:
+            found = cache.lookup(variant)
+            correct = found is not None and found[0] == f"answer to: {question}"
+            hits += correct
+            print(f"   {'✅' if correct else '·'} {variant:<38} → {found[1] if found else 0:.2f}")
+    total = sum(len(variants) for _, variants in FAQ_VARIANTS)
+    false_hits = [question for question in FAQ_DISTINCT if cache.lookup(question) is not None]
+    print(f"   paráfrasis respondidas desde la caché: {hits}/{total}; falsos aciertos: {len(false_hits)}/{len(FAQ_DISTINCT)} "
+          f"{false_hits or ''}")
+
+    # Coste de una consulta con la caché llena (1.000 preguntas distintas)
+    import random
+    rng = random.Random(3)
+    words = ["financing", "warranty", "delivery", "insurance", "leasing", "parking", "payment", "trade",
+             "service", "hours", "location", "documents", "discount", "reservation", "extras", "tires"]
+    for index in range(1000):
+        cache.store(f"do you have {' '.join(rng.sample(words, 3))} number{chr(97 + index % 26)}?", f"answer {index}")
+    lookup_us, _ = measure_call(lambda: cache.lookup("Do you have financing options?"), repeat=2000)
+    miss_us, _ = measure_call(lambda: cache.lookup("can I bring my dog to the showroom?"), repeat=2000)
+    print(f"   consulta con 1.000 entradas: acierto {lookup_us:6.1f} µs   fallo {miss_us:6.1f} µs "
+          f"(frente a ~1-2 s de intención + gpt-4o-mini)")
+
+    # Conversaciones grabadas: los turnos de chat general sobre un vehículo nunca usan la caché
+    agent = make_offline_agent()
+    skipped = used = 0
+    for conversation in load_recorded_conversations():
+        history: List[Dict[str, str]] = []
+        for turn in conversation["turns"]:
+            history.append({"role": "user", "content": turn["user"]})
+            if turn["intent"] == "GENERAL_CHAT":
+                if agent.has_vehicle_context(turn["user"], history):
+                    skipped += 1
+                else:
+                    used += 1
+            text, tool_name = replay_tool_output(agent, turn)
+            content = f"[{tool_name} shown to the customer: ...]" if tool_name else text
+            history.append({"role": "assistant", "content": content})
+    print(f"   conversaciones grabadas: {skipped} turnos GENERAL_CHAT con vehículo en contexto (sin caché), "
+          f"{used} sin vehículo")
+
+
+@benchmark("memory")
+def bench_memory():
+    """Memoria del historial con 100.000 usuarios: dos copias en listas de dicts vs almacén único"""
+    import tracemalloc
+    from conversation_store import ConversationStore
+    users, turns = 100_000, 6
+    # Textos creados antes de medir: solo cuenta la estructura que los guarda
+    contents = [f"message {index} about the BMW X5 financing" for index in range(turns)]
+    roles = ["user", "assistant"]
+
+    def legacy():
+        # ConversationMemory (dict con tokens) + user_conversations del adaptador de WhatsApp
+        histories: Dict[str, List[Dict[str, Any]]] = {}
+        conversations: Dict[str, List[Dict[str, str]]] = {}
+        for user in range(users):
+            phone = f"+3460000{user:07d}"
+            histories[phone] = [{"role": roles[t % 2], "content": contents[t], "tokens": 12} for t in range(turns)]
+            conversations[phone] = [{"role": roles[t % 2], "content": contents[t]} for t in range(turns)]
+        return histories, conversations
+
+    def unified():
+        store = ConversationStore(capacity=50)
+        for user in range(users):
+            phone = f"+3460000{user:07d}"
+            for t in range(turns):
+                store.append(phone, roles[t % 2], contents[t], tokens=12)
+        return store
+
+    results = {}
+    for label, build in (("legacy", legacy), ("unified", unified)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        kept = build()
+        elapsed = time.perf_counter() - start
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[label] = current
+        print(f"   {label:<8} {current / 1e6:7.1f} MB  ({current / users:6.0f} B/usuario)  construir: {elapsed:5.2f}s")
+        del kept
+    print(f"   reducción: {results['legacy'] / results['unified']:.1f}x")
+
+    # Añadir un mensaje con el historial lleno (50): append + copia de la lista vs buffer circular
+    conversation = [{"role": "user", "content": contents[0]} for _ in range(50)]
+
+    def legacy_append():
+        nonlocal conversation
+        conversation.append({"role": "user", "content": contents[1]})
+        if len(conversation) > 50:
+            conversation = conversation[-50:]
+
+    store = ConversationStore(capacity=50)
+    for _ in range(50):
+        store.append("full", "user", contents[0])
+    legacy_us, _ = measure_call(legacy_append, repeat=20000)
+    unified_us, _ = measure_call(lambda: store.append("full", "user", contents[1]), repeat=20000)
+    print(f"   añadir con 50 mensajes: lista + slice {legacy_us:5.2f} µs   buffer circular {unified_us:5.2f} µs")
+
+
+@benchmark("sessions")
+def bench_sessions():
+    """Historial persistido: solo memoria vs SQLite con commit por mensaje vs SQLite WAL con escritura diferida"""
+    import sqlite3
+    import tempfile
+    from conversation_store import ConversationStore
+    from session_backend import SQLiteSessionBackend
+    users, messages = 2_000, 10
+    contents = [f"message {index} about the BMW X5 financing" for index in range(messages)]
+
+    def run(label: str, store: ConversationStore, finish=lambda: None):
+        latencies = []
+        start = time.perf_counter()
+        for turn in range(messages):
+            for user in range(users):
+                begin = time.perf_counter()
+                store.append(f"+34{user:09d}", "user", contents[turn], tokens=12, token_budget=1500)
+                latencies.append(time.perf_counter() - begin)
+        finish()
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1e6
+        p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+        print(f"   {label:<22} {len(latencies) / elapsed:9.0f} mensajes/s   p50 {p50:7.1f} µs   p99 {p99:8.1f} µs")
+
+    class SynchronousBackend:
+        """Referencia: una transacción por mensaje, en el hilo que atiende la petición"""
+        def __init__(self, path: str):
+            self.connection = sqlite3.connect(path)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY, user_id TEXT, role TEXT, "
+                                    "content TEXT, tokens INTEGER)")
+
+        def load_session(self, user_id: str, limit: int):
+            return None
+
+        shared = False
+
+        def append_message(self, user_id: str, role: str, content: str, tokens: int, evicted: int = 0):
+            with self.connection:
+                self.connection.execute("INSERT INTO messages (user_id, role, content, tokens) VALUES (?, ?, ?, ?)",
+                                        (user_id, role, content, tokens))
+
+    with tempfile.TemporaryDirectory() as directory:
+        run("solo memoria", ConversationStore(capacity=50, max_resident=users))
+        run("SQLite síncrono", ConversationStore(capacity=50, max_resident=users, backend=SynchronousBackend(
+            os.path.join(directory, "sync.db"))))
+        backend = SQLiteSessionBackend(os.path.join(directory, "sessions.db"), flush_interval=0.5)
+        run("SQLite escritura difer.", ConversationStore(capacity=50, max_resident=users, backend=backend),
+            finish=backend.flush)
+        stats = backend.stats()
+        print(f"   escritura diferida: {stats['operations']} operaciones en {stats['batches']} lotes, "
+              f"lote más lento {stats['flush_ms_max']:.1f} ms")
+
+        # Arranque: la memoria está vacía y cada usuario se restaura al llegar su primer mensaje
+        restored = ConversationStore(capacity=50, backend=backend, max_resident=users)
+        start = time.perf_counter()
+        for user in range(users):
+            restored.messages(f"+34{user:09d}")
+        per_user = (time.perf_counter() - start) / users * 1e6
+        print(f"   restauración perezosa: {per_user:.0f} µs por usuario ({restored.user_count()} usuarios, "
+              f"{restored.message_count('+34000000000')} mensajes cada uno)")
+        backend.close()
+
+
+@benchmark("eviction")
+def bench_eviction():
+    """50.000 usuarios de paso con 5.000 sesiones residentes: memoria, nivel frío y rehidratación"""
+    import tempfile
+    import tracemalloc
+    from agent_metrics import AgentMetrics
+    from conversation_store import ConversationStore
+    from session_cache import ColdSessionTier
+    users, turns, resident = 50_000, 6, 5_000
+    contents = [f"message {index} about the BMW X5 financing and a test drive on saturday" for index in range(turns)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = {}
+        for label, store in (
+            ("sin límite", ConversationStore(capacity=50, max_resident=users + 1, metrics=AgentMetrics())),
+            ("acotado", ConversationStore(capacity=50, max_resident=resident, metrics=AgentMetrics(),
+                                          cold_tier=ColdSessionTier(os.path.join(directory, "cold")))),
+        ):
+            tracemalloc.start()
+            start = time.perf_counter()
+            for user in range(users):
+                phone = f"+34{user:09d}"
+                for turn in range(turns):
+                    store.append(phone, "user" if turn % 2 == 0 else "assistant", f"{contents[turn]} #{user}", tokens=16)
+                store.set_state(phone, {"status": "active", "appointment_data": {}})
+            elapsed = time.perf_counter() - start
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[label] = store
+            stats = store.stats()
+            print(f"   {label:<11} residentes: {stats['resident']:>6}  memoria: {current / 1e6:6.1f} MB  "
+                  f"expulsadas: {stats['evicted_lru']:>6}  tiempo: {elapsed:5.2f}s")
+
+        cold = results["acotado"].cold_tier
+        files = [os.path.join(cold.directory, name) for name in os.listdir(cold.directory) if name.endswith(".z")]
+        disk = sum(os.path.getsize(path) for path in files)
+        raw = len(json.dumps(results["sin límite"]._conversations["+34000000000"].to_record()))
+        print(f"   nivel frío: {len(files)} sesiones, {disk / 1e6:.1f} MB en disco "
+              f"({disk / len(files):.0f} B/sesión frente a {raw} B sin comprimir)")
+
+        # Los primeros usuarios vuelven: se rehidratan del nivel frío con su siguiente mensaje
+        bounded = results["acotado"]
+        for user in range(2_000):
+            bounded.append(f"+34{user:09d}", "user", "I'm back, is the appointment still on?", tokens=12)
+        stats = bounded.stats()
+        print(f"   rehidratadas: {stats['rehydrated_cold']}  p50 {stats['rehydrate_ms_p50']:.3f} ms   "
+              f"p99 {stats['rehydrate_ms_p99']:.3f} ms   "
+              f"historial intacto: {bounded.message_count('+34000000000') == turns + 1}")
+
+        # Disco lento (10 ms por escritura fría): la expulsión no debe frenar a los usuarios residentes
+        import threading
+
+        class SlowColdTier(ColdSessionTier):
+            def write(self, user_id, session):
+                time.sleep(0.01)
+                return super().write(user_id, session)
+
+        store = ConversationStore(capacity=50, max_resident=100, metrics=AgentMetrics(),
+                                  cold_tier=SlowColdTier(os.path.join(directory, "slow")))
+        store.append("resident", "user", "hello")
+        done = threading.Event()
+
+        def newcomers():
+            user = 0
+            while not done.is_set():
+                store.append(f"+35{user:09d}", "user", contents[0])
+                user += 1
+
+        writer = threading.Thread(target=newcomers)
+        writer.start()
+        latencies = []
+        for _ in range(200):
+            begin = time.perf_counter()
+            store.append("resident", "user", contents[1])
+            latencies.append(time.perf_counter() - begin)
+            time.sleep(0.001)
+        done.set()
+        writer.join()
+        latencies.sort()
+        print(f"   usuario residente mientras se expulsan sesiones a un disco lento: "
+              f"p50 {latencies[100] * 1e6:7.1f} µs   p99 {latencies[198] * 1e6:8.1f} µs")
+
+
+@benchmark("backends")
+def bench_backends():
+    """Mensaje + estado por usuario: dict en memoria vs SQLite (escritura diferida) vs Redis (servidor en proceso)"""
+    import tempfile
+    from agent_metrics import AgentMetrics
+    from conversation_store import ConversationStore
+    from redis_backend import RedisSessionBackend, RespClient
+    from resp_server import RespStandInServer
+    from session_backend import SQLiteSessionBackend
+    users, messages = 500, 10
+
+    def run(label: str, stores: List[ConversationStore]):
+        latencies = []
+        start = time.perf_counter()
+        for turn in range(messages):
+            for user in range(users):
+                # Con dos nodos, los mensajes de un usuario llegan alternando de instancia
+                store = stores[(turn + user) % len(stores)]
+                phone = f"+34{user:09d}"
+                begin = time.perf_counter()
+                store.append(phone, "user", f"message {turn} about the BMW X5", tokens=12, token_budget=1500)
+                store.update_state(phone, {"status": "active", "last_interaction": turn})
+                latencies.append(time.perf_counter() - begin)
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1e6
+        p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+        print(f"   {label:<24} {len(latencies) / elapsed:8.0f} mensajes/s   p50 {p50:7.1f} µs   p99 {p99:8.1f} µs")
+
+    run("dict (memoria)", [ConversationStore(capacity=50, metrics=AgentMetrics())])
+    with tempfile.TemporaryDirectory() as directory:
+        backend = SQLiteSessionBackend(os.path.join(directory, "sessions.db"))
+        run("SQLite WAL", [ConversationStore(capacity=50, backend=backend, metrics=AgentMetrics())])
+        backend.close()
+    with RespStandInServer() as server:
+        backend = RedisSessionBackend(RespClient(*server.address))
+        run("Redis, 1 nodo", [ConversationStore(capacity=50, backend=backend, metrics=AgentMetrics())])
+        stats = backend.stats()
+        print(f"   {'':<24} {stats['round_trips'] / (users * messages):.1f} viajes y "
+              f"{stats['commands'] / (users * messages):.1f} comandos por mensaje")
+        server.keyspace.values.clear()
+        nodes = [ConversationStore(capacity=50, backend=RedisSessionBackend(RespClient(*server.address)),
+                                   metrics=AgentMetrics()) for _ in range(2)]
+        run("Redis, 2 nodos", nodes)
+        reloads = sum(node.stats()["reloaded_stale"] for node in nodes)
+        consistent = all(nodes[0].message_count(f"+34{user:09d}") == messages for user in range(users))
+        print(f"   {'':<24} recargas por cambio en el otro nodo: {reloads}; historial completo en ambos: {consistent}")
+
+        # Un viaje lento (20 ms) de un usuario no debe frenar las operaciones de los demás en el mismo nodo
+        import threading
+
+        class SlowBackend(RedisSessionBackend):
+            def append_message(self, user_id, *args, **kwargs):
+                if user_id == "slow":
+                    time.sleep(0.02)
+                return super().append_message(user_id, *args, **kwargs)
+
+        store = ConversationStore(capacity=50, backend=SlowBackend(RespClient(*server.address)),
+                                  metrics=AgentMetrics())
+        store.append("fast", "user", "hello")
+        done = threading.Event()
+
+        def slow_user():
+            while not done.is_set():
+                store.append("slow", "user", "message about the BMW X5")
+
+        writer = threading.Thread(target=slow_user)
+        writer.start()
+        latencies = []
+        for _ in range(200):
+            begin = time.perf_counter()
+            store.messages("fast")
+            latencies.append(time.perf_counter() - begin)
+            time.sleep(0.001)
+        done.set()
+        writer.join()
+        latencies.sort()
+        print(f"   lecturas de otro usuario durante escrituras de 20 ms: p50 {latencies[100] * 1e6:7.1f} µs   "
+              f"p99 {latencies[198] * 1e6:8.1f} µs")
+
+
+@benchmark("concurrency")
+def bench_concurrency():
+    """Mensajes simultáneos en una sola instancia: imagen en un atributo compartido (antes) vs resultado por petición"""
+    import asyncio
+    import contextlib
+    import io
+    import random
+    from types import SimpleNamespace
+    from vehicle_catalog import get_catalog
+
+    vehicles = get_catalog().vehicles
+    rng = random.Random(7)
+
+    async def create(model, messages, **params):
+        is_intent = messages[0]["content"].startswith("You are an assistant specialized in determining user intent")
+        await asyncio.sleep(rng.uniform(0.001, 0.02))
+        if is_intent:
+            content = "VEHICLE_DETAILS" if messages[-1]["content"].startswith("Tell me about") else "GENERAL_CHAT"
+        else:
+            content = "Simulated answer from the dealership assistant."
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    requests = []
+    for user in range(400):
+        if user % 2:
+            car = vehicles[user % len(vehicles)]
+            requests.append((f"+34{user:09d}", f"Tell me about the {car['brand']} {car['model']}", car["image"]))
+        else:
+            requests.append((f"+34{user:09d}", "Do you offer financing for young drivers?", None))
+
+    for shared in (True, False):
+        agent = make_offline_agent()
+        agent.llm.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        agent.answer_cache.enabled = False
+        last_image = {"path": None}
+        if shared:
+            route = agent._route_intent
+
+            async def legacy_route(user_message, messages, deadline=None):
+                # Como hacía _last_vehicle_image: se limpia al empezar y lo lee quien llegue después
+                last_image["path"] = None
+                result = await route(user_message, messages, deadline)
+                if result.image_path:
+                    last_image["path"] = result.image_path
+                return result
+            agent._route_intent = legacy_route
+
+        async def handle(phone, message):
+            result = await agent.aprocess_message(message, phone)
+            return last_image["path"] if shared else result["image_path"], result
+
+        async def replay():
+            return await asyncio.gather(*(handle(phone, message) for phone, message, _ in requests))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            outcomes = asyncio.run(replay())
+            elapsed = time.perf_counter() - start
+        wrong = sum(image != expected for (image, _), (_, _, expected) in zip(outcomes, requests))
+        totals = sorted(result["timings_ms"].get("total", 0.0) for _, result in outcomes)
+        label = "atributo compartido" if shared else "AgentResult"
+        print(f"   {label:<20} {len(requests) / elapsed:7.0f} mensajes/s   imágenes equivocadas: {wrong:>3}/{len(requests)}   "
+              f"total p50 {totals[len(totals) // 2]:6.1f} ms   p99 {totals[int(len(totals) * 0.99)]:6.1f} ms")
+
+
+@benchmark("interactive")
+def bench_interactive():
+    """Botones y filas de listas: frase en español por el LLM (antes) vs tabla de despacho por id"""
+    import asyncio
+    import contextlib
+    import io
+    from types import SimpleNamespace
+    from agent_metrics import AgentMetrics
+    from interactive_routes import InteractiveRouter
+
+    calls = {"count": 0}
+    # Frase que se enviaba antes al agente por cada botón y la intención que devolvía el clasificador
+    taps = [
+        ("see_details", "Ver detalles", "Quiero ver más detalles de los autos", "SEARCH_INVENTORY"),
+        ("compare_cars", "Comparar", "Quiero comparar los autos", "GENERAL_CHAT"),
+        ("schedule_test", "Prueba de manejo", "Quiero agendar una prueba de manejo", "SCHEDULE_APPOINTMENT"),
+        ("car_type_economic", "🏷️ Económico", "Busco un auto económico", "SEARCH_INVENTORY"),
+        ("car_type_family", "Familiar", "Busco un auto familiar", "SEARCH_INVENTORY"),
+        ("test_drive", "🚗 Prueba de manejo", "Quiero agendar una prueba de manejo", "SCHEDULE_APPOINTMENT"),
+        ("vehicle:BMW_X3_2023_BLU", "BMW X3 (2023)", "Me interesa: BMW X3 (2023)", "VEHICLE_DETAILS"),
+        ("vehicle:AUDI_A4_2022_WHT", "Audi A4 (2022)", "Me interesa: Audi A4 (2022)", "VEHICLE_DETAILS"),
+    ]
+    state = {"intent": "GENERAL_CHAT"}
+
+    async def create(model, messages, **params):
+        calls["count"] += 1
+        is_intent = messages[0]["content"].startswith("You are an assistant specialized in determining user intent")
+        await asyncio.sleep(0.03 if is_intent else 0.06)
+        content = state["intent"] if is_intent else "Simulated answer from the dealership assistant."
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    agent = make_offline_agent()
+    agent.llm.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    agent.answer_cache.enabled = False
+
+    async def replay_llm():
+        for _, _, sentence, intent in taps:
+            state["intent"] = intent
+            await agent.aget_response(sentence, "+34600000000")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        asyncio.run(replay_llm())
+        elapsed = time.perf_counter() - start
+    print(f"   {'frase por el LLM':<18} {elapsed / len(taps) * 1000:8.2f} ms por toque   llamadas a OpenAI: {calls['count']}")
+
+    calls["count"] = 0
+    bench_metrics = AgentMetrics()
+    router = InteractiveRouter(agent, metrics=bench_metrics)
+    rounds = 200
+    start = time.perf_counter()
+    for round_number in range(rounds):
+        for interactive_id, title, _, _ in taps:
+            router.dispatch(f"+34{round_number:09d}", interactive_id, title)
+    elapsed = time.perf_counter() - start
+    print(f"   {'tabla de despacho':<18} {elapsed / (rounds * len(taps)) * 1000:8.2f} ms por toque   llamadas a OpenAI: {calls['count']}")
+    latencies = bench_metrics.snapshot()["latencies"]
+    for name in sorted(latencies):
+        route_p99 = bench_metrics.latency_percentile(name, 99) * 1000
+        print(f"   {name:<30} p50 {latencies[name]['p50_ms']:6.2f} ms   p99 {route_p99:6.2f} ms")
+
+
+@benchmark("lists")
+def bench_lists():
+    """Listado del inventario: texto + selección en texto libre por el LLM vs lista de WhatsApp con filas precalculadas"""
+    import asyncio
+    import contextlib
+    import io
+    from types import SimpleNamespace
+    from vehicle_catalog import VehicleCatalog
+    from inventory_lists import InventoryLists, render_list_row, next_page_row
+
+    catalog = VehicleCatalog(synthetic_vehicles(10_000), version="bench-lists")
+    lists = InventoryLists()
+    _, page = catalog.search({"type": {"suv"}}, limit=5)
+    total = len(catalog.match_positions({"type": {"suv"}}))
+
+    start = time.perf_counter()
+    lists.list_message(page, 0, total, 5, "suv", catalog)
+    print(f"   filas de 10.000 vehículos precalculadas en {(time.perf_counter() - start) * 1000:.0f} ms (una vez por versión)")
+
+    def per_request():
+        # Filas renderizadas en cada petición
+        rows = [render_list_row(car) for car in page]
+        return [{"title": "Page 1", "rows": rows},
+                {"title": "More results", "rows": [next_page_row("suv", 2, 6, 10, total)]}]
+
+    for label, func in (("filas por petición", per_request),
+                        ("filas precalculadas", lambda: lists.list_message(page, 0, total, 5, "suv", catalog)),
+                        ("inventario completo", lambda: lists.list_message(catalog.vehicles[:5], 0, len(catalog), 5, "", catalog))):
+        per_call_us, allocated = measure_call(func, repeat=20000)
+        print(f"   {label:<22} {per_call_us:7.2f} µs/lista   {allocated:6d} B asignados")
+
+    # Flujo de navegación: listado y elegir un coche
+    calls = {"count": 0}
+    state = {"intent": "SEARCH_INVENTORY"}
+
+    async def create(model, messages, **params):
+        calls["count"] += 1
+        await asyncio.sleep(0.03)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=state["intent"]))], usage=None)
+
+    agent = make_offline_agent()
+    agent.llm.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    agent.answer_cache.enabled = False
+    users = 20
+
+    async def free_text():
+        for user in range(users):
+            state["intent"] = "SEARCH_INVENTORY"
+            await agent.aget_response("show me your suvs", f"+34{user:09d}")
+            state["intent"] = "VEHICLE_DETAILS"
+            await agent.aget_response("tell me more about the bmw x3", f"+34{user:09d}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        asyncio.run(free_text())
+        elapsed = time.perf_counter() - start
+    print(f"   {'texto libre':<22} {elapsed / users * 1000:7.1f} ms por navegación   llamadas a OpenAI: {calls['count'] / users:.0f} por navegación")
+
+    calls["count"] = 0
+    start = time.perf_counter()
+    for user in range(users):
+        listed = agent.interactive.dispatch(f"+35{user:09d}", "car_type_family", "Familiar")
+        row = listed.list_message["sections"][0]["rows"][0]
+        agent.interactive.dispatch(f"+35{user:09d}", row["id"], row["title"])
+    elapsed = time.perf_counter() - start
+    print(f"   {'lista + toque':<22} {elapsed / users * 1000:7.1f} ms por navegación   llamadas a OpenAI: {calls['count'] / users:.0f} por navegación")
+
+
+@benchmark("slots")
+def bench_slots():
+    """Preguntas de atributo tras una ficha: GENERAL_CHAT con todo el historial vs respuesta desde el catálogo"""
+    import asyncio
+    import contextlib
+    import io
+    from types import SimpleNamespace
+    from slot_questions import SlotQuestionResolver
+
+    calls = {"count": 0}
+    state = {"intent": "GENERAL_CHAT"}
+
+    async def create(model, messages, **params):
+        calls["count"] += 1
+        is_intent = messages[0]["content"].startswith("You are an assistant specialized in determining user intent")
+        await asyncio.sleep(0.03 if is_intent else 0.06)
+        content = state["intent"] if is_intent else "Simulated answer from the dealership assistant."
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    conversations = load_recorded_conversations()
+    general_turns = sum(turn["intent"] == "GENERAL_CHAT" for c in conversations for turn in c["turns"])
+    answered = []
+    for enabled in (False, True):
+        agent = make_offline_agent()
+        agent.llm.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        agent.answer_cache.enabled = False
+        agent.slot_questions = SlotQuestionResolver() if enabled else None
+        calls["count"] = 0
+
+        async def replay():
+            for conversation in conversations:
+                for turn in conversation["turns"]:
+                    state["intent"] = turn["intent"]
+                    result = await agent.aget_response(turn["user"], conversation["id"])
+                    if enabled and result.intent == "VEHICLE_QUESTION":
+                        answered.append((turn, result))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            asyncio.run(replay())
+            elapsed = time.perf_counter() - start
+        label = "resolutor local" if enabled else "solo LLM"
+        print(f"   {label:<16} tiempo total {elapsed * 1000:7.1f} ms   llamadas a OpenAI: {calls['count']}")
+
+    wrong_intent = [turn["user"] for turn, _ in answered if turn["intent"] != "GENERAL_CHAT"]
+    print(f"   cobertura: {len(answered)}/{general_turns} turnos GENERAL_CHAT respondidos desde el catálogo"
+          f"{'; fuera de GENERAL_CHAT: ' + ', '.join(wrong_intent) if wrong_intent else ''}")
+    for turn, result in answered:
+        print(f"     {turn['user']!r:<32} → {result.text.splitlines()[0]}")
+
+    resolver = SlotQuestionResolver()
+    for label, question in (("respondida", "What is the price?"), ("al LLM", "Which one has the bigger trunk?")):
+        per_call_us, _ = measure_call(lambda: resolver.answer(question, "BMW_X3_2023_BLU"), repeat=20000)
+        print(f"   latencia del resolutor ({label}): {per_call_us:.1f} µs")
+
+
+@benchmark("analysis")
+def bench_analysis():
+    """Análisis de respuestas largas: dicts por mensaje vs acciones tipadas vs modo perezoso"""
+    from vehicle_catalog import get_catalog
+    from response_actions import RESPONSE_SIGNALS, ResponseAnalyzer
+
+    def legacy_analyze(response):
+        lower = response.lower()
+        mentions = [brand for brand in LEGACY_RESPONSE_BRANDS if brand.lower() in lower]
+        actions, suggestions = [], []
+        if mentions:
+            actions.append({"type": "buttons", "data": {"header": "🚗 Autos encontrados", "body": "",
+                            "buttons": [{"id": "see_details", "title": "Ver detalles"},
+                                        {"id": "compare_cars", "title": "Comparar"},
+                                        {"id": "schedule_test", "title": "Agendar prueba"}]}})
+        for signal, words in RESPONSE_SIGNALS.items():
+            if any(word in lower for word in words):
+                suggestions.append({"type": "buttons", "data": {"signal": signal, "buttons": [
+                    {"id": f"{signal}_{n}", "title": signal} for n in range(3)]}})
+        return {"type": "text", "actions": actions, "suggestions": suggestions, "car_mentions": mentions}
+
+    agent = make_offline_agent()
+    cards = [agent.get_vehicle_details(car["id"]) for car in get_catalog()]
+    analyzer = ResponseAnalyzer()
+    lazy_off = {"type": "text", "actions": [], "suggestions": []}
+    variants = (
+        ("dicts por mensaje (antes)", legacy_analyze),
+        ("WHATSAPP_RESPONSE_ACTIONS=0", lambda card: lazy_off),
+        ("WHATSAPP_RESPONSE_ACTIONS=1", lambda card: analyzer.analyze(card).to_dict()),
+    )
+    print(f"   {len(cards)} fichas, {sum(map(len, cards)) // len(cards):,} caracteres de media")
+    for label, analyze in variants:
+        per_call_us, _ = measure_call(lambda: [analyze(card) for card in cards], repeat=500)
+        print(f"      {label:<30} {per_call_us / len(cards):7.1f} µs por respuesta")
+    differing = [card.splitlines()[0] for card in cards
+                 if set(legacy_analyze(card)["car_mentions"]) != set(analyzer.analyze(card).brands)]
+    print(f"   marcas distintas a la lista fija en {len(differing)}/{len(cards)} fichas"
+          f"{': ' + ', '.join(differing[:3]) if differing else ''}")
+
+
+@benchmark("topics")
+def bench_topics():
+    """Resumen de conversación: recorrer el historial en cada llamada vs contadores incrementales"""
+    from agent_metrics import AgentMetrics
+    from conversation_store import ConversationStore
+    from conversation_topics import TopicTracker
+    from car_dealership_agent import CarDealershipWhatsAppAgent
+
+    def legacy_summary(store, user):
+        # get_conversation_summary anterior: copia del historial, une los 10 últimos y los recorre
+        conversation = [message.to_dict() for message in store.messages(user)]
+        if not conversation:
+            return "Sin conversación previa"
+        user_messages = len([msg for msg in conversation if msg["role"] == "user"])
+        recent_content = " ".join([msg["content"] for msg in conversation[-10:]])
+        topics = []
+        if any(brand in recent_content.lower() for brand in ["bmw", "toyota", "tesla", "honda", "ford", "audi"]):
+            topics.append("búsqueda de autos")
+        if any(word in recent_content.lower() for word in ["cita", "agendar", "appointment", "schedule"]):
+            topics.append("appointment")
+        if any(word in recent_content.lower() for word in ["precio", "financiamiento", "$", "price", "financing"]):
+            topics.append("pricing/financing")
+        return f"Conversation: {len(conversation)} messages ({user_messages} from user). Topics: {', '.join(topics)}."
+
+    agent = make_offline_agent()
+    turns = [(turn["user"], replay_tool_output(agent, {"assistant": "Happy to help with that!", **turn})[0])
+             for conversation in load_recorded_conversations() for turn in conversation["turns"]]
+    users = 2_000
+    stores = {}
+    for label, tracker in (("sin contadores", None), ("con contadores", TopicTracker())):
+        store = stores[label] = ConversationStore(capacity=50, max_resident=users, metrics=AgentMetrics(),
+                                                  tracker=tracker)
+        start = time.perf_counter()
+        for index in range(users * 25):
+            question, answer = turns[index % len(turns)]
+            user = f"+3460000{index % users:07d}"
+            store.append(user, "user", question)
+            store.append(user, "assistant", answer)
+        elapsed = time.perf_counter() - start
+        print(f"   {label:<15} añadir {users * 50:,} mensajes: {elapsed * 1e6 / (users * 50):5.1f} µs/mensaje")
+
+    plain, tracked = stores["sin contadores"], stores["con contadores"]
+    user = "+34600000000042"
+    legacy_us, _ = measure_call(lambda: legacy_summary(plain, user), repeat=5000)
+    tracked_us, _ = measure_call(lambda: tracked.tracked(user)["summary"], repeat=5000)
+    print(f"   un usuario (50 mensajes): recorrer {legacy_us:6.1f} µs   contadores {tracked_us:5.1f} µs")
+
+    start = time.perf_counter()
+    for phone in list(plain.users()):
+        legacy_summary(plain, phone)
+    legacy_all = time.perf_counter() - start
+    start = time.perf_counter()
+    summaries = tracked.tracked_sessions()
+    tracked_all = time.perf_counter() - start
+    print(f"   los {len(summaries):,} usuarios activos (/admin/conversations): recorrer {legacy_all * 1000:6.1f} ms   "
+          f"contadores {tracked_all * 1000:5.1f} ms")
+
+    whatsapp_agent = CarDealershipWhatsAppAgent.__new__(CarDealershipWhatsAppAgent)
+    whatsapp_agent.conversations = tracked
+    print(f"   antes: {legacy_summary(plain, user)}")
+    print(f"   ahora: {summaries[user]['summary']}")
+    print(f"   usuarios activos por tema: {whatsapp_agent.get_topic_counts()['topics']}")
+
+
+def main():
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        print(f"❌ Benchmarks desconocidos: {', '.join(unknown)}")
+        print(f"   Disponibles: {', '.join(BENCHMARKS)}")
+        sys.exit(1)
+
+    for name in selected:
+        print(f"\n⏱️  {name}")
+        print("-" * 60)
+        start = time.perf_counter()
+        BENCHMARKS[name]()
+        print(f"   ({time.perf_counter() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
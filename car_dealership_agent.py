@@ -2,6 +2,7 @@ import os
 from typing import Dict, List, Any, Optional
 from dotenv import load_dotenv
 from chat_agent_python import CarDealershipChatAgent
+from response_actions import ResponseAnalyzer
 
 load_dotenv()
 
@@ -14,110 +15,73 @@ class CarDealershipWhatsAppAgent:
         # Usar nuestro agente real de chat
         self.chat_agent = CarDealershipChatAgent()
         
-        # Almacenamiento temporal de conversaciones por usuario
-        # (después será reemplazado por Firestore)
-        self.user_conversations: Dict[str, List[Dict[str, str]]] = {}
+        # Sesión por usuario (historial y estado): el mismo almacén que usa la memoria del
+        # agente de chat, con las sesiones inactivas fuera de memoria y persistidas
+        self.conversations = self.chat_agent.memory.store
         
-        # Estado de cada usuario
-        self.user_states: Dict[str, Dict[str, Any]] = {}
+        # Botones y sugerencias según el contenido de la respuesta: solo se calculan si se van a
+        # enviar (WHATSAPP_RESPONSE_ACTIONS=1); si no, cada respuesta sale como texto sin analizar
+        self.response_actions = os.getenv('WHATSAPP_RESPONSE_ACTIONS', '0').lower() in ('1', 'true', 'yes')
+        self.response_analyzer = ResponseAnalyzer()
     
     def get_user_history(self, user_phone: str) -> List[Dict[str, str]]:
         """
         Obtiene el historial de conversación de un usuario
         """
-        if user_phone not in self.user_conversations:
-            self.user_conversations[user_phone] = []
-        
-        return self.user_conversations[user_phone]
+        return [message.to_dict() for message in self.conversations.messages(user_phone)]
     
     def get_user_state(self, user_phone: str) -> Dict[str, Any]:
         """
         Obtiene el estado actual del usuario
         """
-        if user_phone not in self.user_states:
-            self.user_states[user_phone] = {
+        state = self.conversations.get_state(user_phone)
+        if state is None or "status" not in state:
+            # El agente de chat puede haber guardado ya el vehículo en foco
+            state = {
                 "status": "new",
                 "last_interaction": None,
                 "selected_cars": [],
                 "appointment_data": {},
-                "preferences": {}
+                "preferences": {},
+                **(state or {})
             }
+            self.conversations.set_state(user_phone, state)
         
-        return self.user_states[user_phone]
+        return state
     
     def update_user_state(self, user_phone: str, state_updates: Dict[str, Any]):
         """
         Actualiza el estado del usuario
         """
-        current_state = self.get_user_state(user_phone)
-        current_state.update(state_updates)
-        self.user_states[user_phone] = current_state
+        self.get_user_state(user_phone)  # crea el estado inicial si es un usuario nuevo
+        self.conversations.update_state(user_phone, state_updates)
     
     def add_to_conversation(self, user_phone: str, role: str, content: str):
         """
         Añade un mensaje al historial de conversación
+        (el almacén conserva como máximo HISTORY_MAX_MESSAGES por usuario y
+        actualiza al añadirlo los contadores de mensajes, temas y marcas)
         """
-        conversation = self.get_user_history(user_phone)
-        conversation.append({
-            "role": role,
-            "content": content
-        })
-        
-        # Mantener solo los últimos 50 mensajes para evitar tokens excesivos
-        if len(conversation) > 50:
-            conversation = conversation[-50:]
-        
-        self.user_conversations[user_phone] = conversation
+        self.chat_agent.add_to_history(user_phone, role, content)
     
     def process_message(self, user_phone: str, user_name: Optional[str], 
                              message: str, message_type: str = "text") -> Dict[str, Any]:
         """
         Procesa un mensaje del usuario y devuelve la respuesta
         """
+        return self.chat_agent.llm.run(self.aprocess_message(user_phone, user_name, message, message_type))
+    
+    async def aprocess_message(self, user_phone: str, user_name: Optional[str],
+                               message: str, message_type: str = "text") -> Dict[str, Any]:
+        """
+        Versión asíncrona de process_message (no bloquea el bucle de eventos del llamador)
+        """
         try:
-            # Añadir mensaje del usuario al historial
-            self.add_to_conversation(user_phone, "user", message)
-            
             # Procesar con el agente de chat usando la nueva interfaz
-            agent_result = self.chat_agent.process_message(message, user_phone)
-            
-            if agent_result.get("error"):
-                # Si hay error, devolver mensaje de error amigable
-                response = agent_result.get("response", "Lo siento, hubo un problema. ¿Podrías intentarlo de nuevo?")
-            else:
-                response = agent_result.get("response", "")
-            
-            # Añadir respuesta del agente al historial
-            self.add_to_conversation(user_phone, "assistant", response)
-            
-            # Verificar si hay una imagen para enviar (cuando se solicitan detalles de vehículo)
-            vehicle_image = self.chat_agent.get_last_vehicle_image()
-            
-            # Actualizar estado del usuario
-            self.update_user_state(user_phone, {
-                "last_interaction": message,
-                "status": "active"
-            })
-            
-            # Determinar tipo de respuesta y acciones adicionales
-            response_data = self._analyze_response(response, user_phone)
-            
-            result = {
-                "success": True,
-                "response": response,
-                "response_type": response_data["type"],
-                "actions": response_data["actions"],
-                "suggestions": response_data["suggestions"]
-            }
-            
-            # Agregar información de imagen si está disponible
-            if vehicle_image:
-                result["image_path"] = vehicle_image
-                result["has_image"] = True
-            else:
-                result["has_image"] = False
+            # (el agente guarda el mensaje y la respuesta en el historial compartido)
+            agent_result = await self.chat_agent.aprocess_message(message, user_phone)
             
-            return result
+            return self._whatsapp_result(user_phone, message, agent_result)
             
         except Exception as e:
             print(f"❌ Error processing message from {user_phone}: {str(e)}")
@@ -130,112 +94,69 @@ class CarDealershipWhatsAppAgent:
                 "has_image": False
             }
     
+    def process_interactive(self, user_phone: str, user_name: Optional[str],
+                            interactive_id: str, title: str) -> Optional[Dict[str, Any]]:
+        """
+        Botón o fila de lista resuelto por su id (sin OpenAI). None si el id no
+        tiene ruta y hay que procesarlo como texto con process_message.
+        """
+        agent_result = self.chat_agent.interactive.dispatch(user_phone, interactive_id, title)
+        if agent_result is None:
+            return None
+        result = self._whatsapp_result(user_phone, title, agent_result.to_dict())
+        result["route"] = interactive_id
+        return result
+    
+    def _whatsapp_result(self, user_phone: str, message: str, agent_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Respuesta del agente de chat con el formato de WhatsApp (tipo, acciones, imagen)"""
+        if agent_result.get("error"):
+            # Si hay error, devolver mensaje de error amigable
+            response = agent_result.get("response", "Lo siento, hubo un problema. ¿Podrías intentarlo de nuevo?")
+        else:
+            response = agent_result.get("response", "")
+        
+        # Imagen de esta petición (cuando se solicitan detalles de vehículo)
+        vehicle_image = agent_result.get("image_path")
+        
+        # Actualizar estado del usuario
+        self.update_user_state(user_phone, {
+            "last_interaction": message,
+            "status": "active"
+        })
+        
+        # Determinar tipo de respuesta y acciones adicionales (solo si se van a enviar)
+        if self.response_actions:
+            response_data = self._analyze_response(response, user_phone)
+        else:
+            response_data = {"type": "text", "actions": [], "suggestions": []}
+        
+        result = {
+            "success": True,
+            "response": response,
+            "response_type": response_data["type"],
+            "actions": response_data["actions"],
+            "suggestions": response_data["suggestions"],
+            "intent": agent_result.get("intent"),
+            "timings_ms": agent_result.get("timings_ms", {}),
+            # Resultados del inventario como lista de WhatsApp (filas con el id del vehículo)
+            "list": agent_result.get("list")
+        }
+        
+        # Agregar información de imagen si está disponible
+        if vehicle_image:
+            result["image_path"] = vehicle_image
+            result["has_image"] = True
+        else:
+            result["has_image"] = False
+        
+        return result
+    
     def _analyze_response(self, response: str, user_phone: str) -> Dict[str, Any]:
         """
         Analiza la respuesta del agente para determinar acciones de WhatsApp
+        (una pasada del texto; marcas del inventario actual)
         """
-        response_lower = response.lower()
-        
-        # Detectar si se mencionan autos específicos
-        car_mentions = []
-        if "bmw" in response_lower:
-            car_mentions.append("BMW")
-        if "toyota" in response_lower:
-            car_mentions.append("Toyota")
-        if "tesla" in response_lower:
-            car_mentions.append("Tesla")
-        if "honda" in response_lower:
-            car_mentions.append("Honda")
-        if "ford" in response_lower:
-            car_mentions.append("Ford")
-        if "audi" in response_lower:
-            car_mentions.append("Audi")
-        
-        actions = []
-        suggestions = []
-        response_type = "text"
-        
-        # Si menciona autos, ofrecer botones para ver más
-        if car_mentions:
-            response_type = "cars_mentioned"
-            actions.append({
-                "type": "buttons",
-                "data": {
-                    "header": "🚗 Autos encontrados",
-                    "body": "¿Te gustaría ver más detalles de alguno?",
-                    "buttons": [
-                        {"id": "see_details", "title": "Ver detalles"},
-                        {"id": "compare_cars", "title": "Comparar"},
-                        {"id": "schedule_test", "title": "Agendar prueba"}
-                    ]
-                }
-            })
-        
-        # Si menciona precios, ofrecer financiamiento
-        if "$" in response or "precio" in response_lower or "cuesta" in response_lower:
-            response_type = "price_mentioned"
-            suggestions.append({
-                "type": "buttons",
-                "data": {
-                    "header": "💰 Opciones de pago",
-                    "body": "¿Te interesa información sobre financiamiento?",
-                    "buttons": [
-                        {"id": "financing_options", "title": "Ver financiamiento"},
-                        {"id": "calculate_payment", "title": "Calcular pago"},
-                        {"id": "trade_in", "title": "Valor de cambio"}
-                    ]
-                }
-            })
-        
-        # Si menciona citas o horarios
-        if any(word in response_lower for word in ["cita", "horarios", "agendar", "appointment"]):
-            response_type = "appointment_mentioned"
-            actions.append({
-                "type": "buttons",
-                "data": {
-                    "header": "📅 Agendar cita",
-                    "body": "¿Qué tipo de cita necesitas?",
-                    "buttons": [
-                        {"id": "test_drive", "title": "Prueba de manejo"},
-                        {"id": "consultation", "title": "Consulta"},
-                        {"id": "inspection", "title": "Inspección"}
-                    ]
-                }
-            })
-        
-        # Si menciona contacto o ubicación
-        if any(word in response_lower for word in ["contacto", "ubicación", "dirección", "teléfono"]):
-            response_type = "contact_mentioned"
-            actions.append({
-                "type": "contact_info",
-                "data": {
-                    "send_location": True,
-                    "send_contact": True
-                }
-            })
-        
-        # Si no hay autos disponibles
-        if "no hay" in response_lower or "no tengo" in response_lower:
-            response_type = "no_results"
-            suggestions.append({
-                "type": "buttons",
-                "data": {
-                    "header": "🔍 Otras opciones",
-                    "body": "¿Te gustaría intentar otra búsqueda?",
-                    "buttons": [
-                        {"id": "broaden_search", "title": "Ampliar búsqueda"},
-                        {"id": "notify_arrival", "title": "Notificar llegada"},
-                        {"id": "see_all_cars", "title": "Ver todo"}
-                    ]
-                }
-            })
-        
-        return {
-            "type": response_type,
-            "actions": actions,
-            "suggestions": suggestions,
-            "car_mentions": car_mentions
-        }
+        return self.response_analyzer.analyze(response).to_dict()
     
     def get_welcome_message(self, user_name: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -263,45 +184,44 @@ class CarDealershipWhatsAppAgent:
     
     def get_conversation_summary(self, user_phone: str) -> str:
         """
-        Genera un resumen de la conversación del usuario
+        Resumen de la conversación del usuario: mensajes y temas de los
+        últimos mensajes, leídos de los contadores de la sesión
         """
-        conversation = self.get_user_history(user_phone)
-        
-        if not conversation:
+        tracked = self.conversations.tracked(user_phone)
+        if not tracked or not tracked["messages"]:
             return "Sin conversación previa"
-        
-        # Contar mensajes
-        total_messages = len(conversation)
-        user_messages = len([msg for msg in conversation if msg["role"] == "user"])
-        
-        # Obtener últimos temas mencionados
-        recent_messages = conversation[-10:] if len(conversation) > 10 else conversation
-        recent_content = " ".join([msg["content"] for msg in recent_messages])
-        
-        # Detectar temas principales
-        topics = []
-        if any(brand in recent_content.lower() for brand in ["bmw", "toyota", "tesla", "honda", "ford", "audi"]):
-            topics.append("búsqueda de autos")
-        if any(word in recent_content.lower() for word in ["cita", "agendar", "appointment", "schedule"]):
-            topics.append("appointment")
-        if any(word in recent_content.lower() for word in ["precio", "financiamiento", "$", "price", "financing"]):
-            topics.append("pricing/financing")
-        
-        return f"Conversation: {total_messages} messages ({user_messages} from user). Topics: {', '.join(topics) if topics else 'general conversation'}."
+        return tracked["summary"]
+    
+    def get_conversation_summaries(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Mensajes, temas, marcas y resumen de cada usuario activo (sesiones residentes)
+        """
+        return {user_phone: tracked for user_phone, tracked in self.conversations.tracked_sessions().items()
+                if tracked["messages"]}
+    
+    def get_topic_counts(self) -> Dict[str, Dict[str, int]]:
+        """
+        Usuarios activos por tema y por marca mencionada (sin datos personales, para /status)
+        """
+        topics: Dict[str, int] = {}
+        brands: Dict[str, int] = {}
+        for tracked in self.get_conversation_summaries().values():
+            for topic in tracked["topics"]:
+                topics[topic] = topics.get(topic, 0) + 1
+            for brand in tracked["brands"]:
+                brands[brand] = brands.get(brand, 0) + 1
+        return {"topics": topics, "brands": brands}
     
     def reset_user_session(self, user_phone: str):
         """
         Reset a user's session
         """
-        if user_phone in self.user_conversations:
-            del self.user_conversations[user_phone]
-        if user_phone in self.user_states:
-            del self.user_states[user_phone]
+        self.chat_agent.memory.clear(user_phone)
         
         print(f"🔄 Sesión reiniciada para {user_phone}")
     
     def get_active_users_count(self) -> int:
         """
-        Obtiene el número de usuarios activos
+        Obtiene el número de usuarios activos (sesiones residentes en memoria)
         """
-        return len(self.user_conversations)
+        return self.conversations.user_count()
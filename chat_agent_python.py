@@ -5,8 +5,52 @@ Agente de Chat Python nativo para AutoMax Concesionario
 
 import os
 import json
-from typing import Dict, Any, Optional, List
-from openai import OpenAI
+import time
+import asyncio
+from typing import Dict, Any, Optional, List, Tuple
+from conversation_memory import ConversationMemory
+from prompt_builder import (chat_prompt, intent_prompt, language_detection_prompt,
+                            translation_prompt, conversation_context_message)
+from llm_client import LLMClient, Deadline, DeadlineExceeded
+from conversation_memory import estimate_messages_tokens, estimate_tokens
+from speculation import SpeculationGuard
+from vehicle_catalog import get_catalog
+from inventory_query import parse_inventory_query, without_page
+from inventory_lists import inventory_lists
+from feature_search import matched_features
+from keyword_matcher import KeywordMatcher
+from vehicle_cards import vehicle_cards
+from answer_cache import SemanticAnswerCache
+from agent_result import AgentResult, Attachment
+from interactive_routes import InteractiveRouter
+from slot_questions import SlotQuestionResolver
+from conversation_store import ConversationStore
+from conversation_topics import TopicTracker
+from session_backend import get_session_backend
+from session_cache import get_cold_tier
+
+# Palabras típicas por idioma para detectar el idioma sin OpenAI, en orden de prioridad
+LANGUAGE_HINTS = (
+    ("español", ("hola", "tengo", "quiero", "necesito", "gracias", "coches", "vehículos")),
+    ("français", ("bonjour", "salut", "voiture", "merci", "voudrais")),
+    ("deutsch", ("hallo", "guten", "auto", "danke", "möchte")),
+    ("italiano", ("ciao", "buongiorno", "auto", "grazie", "vorrei")),
+    ("português", ("olá", "oi", "carro", "obrigado", "quero")),
+)
+LANGUAGE_HINT_MATCHER = KeywordMatcher(
+    (word, language) for language, words in LANGUAGE_HINTS for word in words
+)
+
+# Salidas de herramientas (compactadas en el historial) que dejan un vehículo en contexto
+VEHICLE_CONTEXT_TOOLS = ("Vehicle details card", "Inventory search results", "Feature search results")
+_VEHICLE_CONTEXT_PREFIXES = tuple(f"[{tool}" for tool in VEHICLE_CONTEXT_TOOLS)
+# Turnos del asistente en los que una ficha o listado sigue contando como contexto
+VEHICLE_CONTEXT_TURNS = 3
+# "is it manual?", "can I test drive it?": se refieren al último vehículo mostrado
+REFERRING_WORDS = KeywordMatcher((word, True) for word in (
+    "it", "its", "it's", "this one", "that one", "these", "those", "them", "they", "both",
+    "este", "ese", "esta", "esa", "estos", "esos", "lo", "la", "los", "las"
+))
 
 class CarDealershipChatAgent:
     """
@@ -17,154 +61,91 @@ class CarDealershipChatAgent:
         from dotenv import load_dotenv
         load_dotenv()  # Cargar variables de entorno desde .env
         
-        try:
-            self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        except Exception as e:
-            print(f"⚠️  Warning: Error inicializando OpenAI client: {e}")
-            # Fallback para compatibilidad
-            import openai
-            openai.api_key = os.getenv('OPENAI_API_KEY')
-            self.client = None
+        # Cliente asíncrono con timeout por petición y hedging opcional
+        self.llm = LLMClient()
         
-        self.conversation_histories = {}  # Historial por usuario
+        # Plazo total para responder a un mensaje (todas las llamadas a OpenAI incluidas)
+        self.message_deadline = float(os.getenv('OPENAI_MESSAGE_DEADLINE', '25'))
+        # Vehículos por mensaje en los listados del inventario
+        self.inventory_page_size = max(1, int(os.getenv('INVENTORY_PAGE_SIZE', '5')))
+        # Alternativas parecidas en la ficha y cuando una búsqueda no da resultados (0 = desactivado)
+        self.similar_vehicles = max(0, int(os.getenv('SIMILAR_VEHICLES_COUNT', '3')))
         
-        # Sistema de mensajes multiidioma con detección automática
-        self.system_message = {
-            "role": "system",
-            "content": """You are a virtual assistant for AutoMax, a premium car dealership. Your job is to help customers with vehicle information and in-person appointments.
-
-ALWAYS respond in ENGLISH ONLY. This is an English-only system.
-
-AVAILABLE SERVICES:
-1. Vehicle Consultation: Show available cars with detailed specifications
-2. Detailed Vehicle Information: Complete details for each specific vehicle
-3. In-Person Appointments: Schedule visits to the dealership (NOT test drives)
-4. Company Information: Details about AutoMax dealership
-
-INVENTORY INFORMATION:
-- New and used vehicles available
-- Brands: BMW, Mercedes-Benz, Audi, Volkswagen, SEAT, Ford
-- Types: sedans, SUVs, hatchbacks, sports cars
-- Price range: €15,000 to €80,000
-- All vehicles come with warranty and after-sales service
-
-COMPANY INFO - AutoMax:
-- Premium car dealership established in 2010
-- Located in Madrid, Spain
-- Specializes in European luxury and reliable vehicles
-- Expert sales team with 10+ years experience
-- Full after-sales service and maintenance
-- Customer satisfaction guarantee
-- Operating hours: Mon-Fri 9:00-18:00, Sat 9:00-14:00
-
-WHAT YOU CAN DO:
-✅ Search vehicles by brand, type, color, price range
-✅ Provide complete vehicle specifications and features
-✅ Schedule in-person appointments to visit the dealership
-✅ Share company information and services
-✅ Answer questions about vehicle availability
-
-WHAT YOU CANNOT DO:
-❌ NO financing or budget calculations
-❌ NO test drive scheduling (only in-person visits)
-❌ NO price negotiations or quotes
-❌ NO loan or payment plans
-
-INSTRUCTIONS:
-- Always greet warmly in the customer's language
-- Focus on vehicle consultation and appointment scheduling
-- Provide detailed, accurate vehicle information
-- Be enthusiastic about our car selection
-- Guide customers toward scheduling in-person visits
-- Use emojis appropriately (🚗, �, 🏢, etc.)
-- Keep responses focused on the 4 main services
-
-LANGUAGE EXAMPLES:
-- Spanish: "hola, tenéis BMW disponibles?" → Respond in Spanish
-- English: "hello, do you have BMW cars?" → Respond in English
-
-Always be helpful and guide customers to visit our dealership for personalized service."""
-        }
+        # Modo especulativo opcional: GENERAL_CHAT en paralelo con la clasificación de intención
+        self.speculation = SpeculationGuard()
+        
+        # Respuestas de preguntas frecuentes reutilizadas sin llamar a OpenAI (SEMANTIC_CACHE=0 la desactiva)
+        self.answer_cache = SemanticAnswerCache()
+        
+        # Preguntas de atributo sobre el vehículo en foco respondidas con el catálogo (SLOT_QUESTIONS=0 lo desactiva)
+        self.slot_questions = (SlotQuestionResolver()
+                               if os.getenv('SLOT_QUESTIONS', '1').lower() in ('1', 'true', 'yes') else None)
+        
+        # Historial por usuario limitado por tokens; los turnos antiguos se resumen en segundo plano.
+        # Persistido en SQLite con escritura diferida (SESSION_BACKEND=memory lo desactiva);
+        # las sesiones inactivas salen de memoria a un nivel frío comprimido en disco.
+        # Temas y marcas de cada sesión se cuentan al añadir turnos (resúmenes sin recorrer el historial)
+        self.memory = ConversationMemory(
+            token_budget=int(os.getenv('HISTORY_TOKEN_BUDGET', '1500')),
+            summarizer=self._summarize_turns,
+            store=ConversationStore(backend=get_session_backend(), cold_tier=get_cold_tier(),
+                                    tracker=TopicTracker())
+        )
+        
+        # Mensaje de sistema prearmado una vez por proceso (prefijo cacheable)
+        self.system_message = chat_prompt().system_message
+        
+        # Botones y filas de listas resueltos por id, sin pasar por OpenAI
+        self.interactive = InteractiveRouter(self)
     
     def get_conversation_history(self, user_id: str) -> List[Dict[str, str]]:
-        """Obtiene el historial de conversación para un usuario específico"""
-        return self.conversation_histories.get(user_id, [])
+        """Obtiene el historial de conversación (resumen + turnos recientes) para un usuario"""
+        return self.memory.get_messages(user_id)
     
-    def add_to_history(self, user_id: str, role: str, content: str):
-        """Añade un mensaje al historial de conversación"""
-        if user_id not in self.conversation_histories:
-            self.conversation_histories[user_id] = []
-        
-        self.conversation_histories[user_id].append({
-            "role": role,
-            "content": content
-        })
+    def add_to_history(self, user_id: str, role: str, content: str, tool_name: Optional[str] = None):
+        """Añade un mensaje al historial; las salidas de herramientas se guardan como referencia"""
+        self.memory.add(user_id, role, content, tool_name=tool_name)
+    
+    def _summarize_turns(self, previous_summary: str, turns: List[Dict[str, str]]) -> Optional[str]:
+        """Resume turnos antiguos con GPT (se ejecuta en el hilo de fondo de la memoria)"""
+        if not self.llm.available:
+            return None
         
-        # Limitar historial a 20 mensajes
-        if len(self.conversation_histories[user_id]) > 20:
-            # Mantener el mensaje del sistema y los últimos 19 mensajes
-            self.conversation_histories[user_id] = self.conversation_histories[user_id][-19:]
+        transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+        response = self.llm.complete(
+            "history_summary",
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "Update the running summary of a car dealership chat. Keep vehicles, preferences, appointment details and open questions. Max 80 words. Reply with the summary only."},
+                {"role": "user", "content": f"Current summary: {previous_summary or '(none)'}\n\nNew turns:\n{transcript}"}
+            ],
+            max_tokens=150,
+            temperature=0
+        )
+        return response.choices[0].message.content.strip()
     
     def detect_user_language(self, user_message: str) -> str:
         """Detecta el idioma del mensaje del usuario usando GPT - Soporta múltiples idiomas"""
+        return self.llm.run(self.adetect_user_language(user_message))
+    
+    async def adetect_user_language(self, user_message: str, deadline: Optional[Deadline] = None) -> str:
+        """Versión asíncrona de detect_user_language, sujeta al plazo del mensaje"""
         try:
-            if not self.client:
-                # Fallback básico para idiomas principales
-                spanish_words = ["hola", "tengo", "quiero", "necesito", "gracias", "coches", "vehículos"]
-                french_words = ["bonjour", "salut", "voiture", "merci", "voudrais"]
-                german_words = ["hallo", "guten", "auto", "danke", "möchte"]
-                italian_words = ["ciao", "buongiorno", "auto", "grazie", "vorrei"]
-                portuguese_words = ["olá", "oi", "carro", "obrigado", "quero"]
-                
-                message_lower = user_message.lower()
-                if any(word in message_lower for word in spanish_words):
-                    return "español"
-                elif any(word in message_lower for word in french_words):
-                    return "français"
-                elif any(word in message_lower for word in german_words):
-                    return "deutsch"
-                elif any(word in message_lower for word in italian_words):
-                    return "italiano"
-                elif any(word in message_lower for word in portuguese_words):
-                    return "português"
+            if not self.llm.available:
+                # Fallback básico para idiomas principales (una pasada; "auto" cuenta como alemán)
+                found = LANGUAGE_HINT_MATCHER.values(user_message)
+                for language, _ in LANGUAGE_HINTS:
+                    if language in found:
+                        return language
                 return "english"
             
-            detection_prompt = {
-                "role": "system",
-                "content": """Detect the language of the user message and respond with ONLY the language name in its native form.
-
-Supported languages and how to respond:
-- Spanish: respond "español"
-- English: respond "english" 
-- French: respond "français"
-- German: respond "deutsch"
-- Italian: respond "italiano"
-- Portuguese: respond "português"
-- Dutch: respond "nederlands"
-- Russian: respond "русский"
-- Chinese: respond "中文"
-- Japanese: respond "日本語"
-- Korean: respond "한국어"
-- Arabic: respond "العربية"
-
-Examples:
-- "hola, tenéis coches azules?" -> español
-- "hello, do you have blue cars?" -> english
-- "bonjour, avez-vous des voitures?" -> français
-- "hallo, haben Sie Autos?" -> deutsch
-- "ciao, avete auto?" -> italiano
-- "olá, têm carros?" -> português
-
-If you cannot determine the language clearly, default to "english".
-Respond with just the language name, nothing else."""
-            }
-            
-            response = self.client.chat.completions.create(
+            response = await self.llm.acomplete(
+                "language_detection",
                 model="gpt-3.5-turbo",
-                messages=[
-                    detection_prompt,
-                    {"role": "user", "content": user_message}
-                ],
+                messages=language_detection_prompt().build(
+                    dynamic=[{"role": "user", "content": user_message}]
+                ),
+                deadline=deadline,
                 max_tokens=15,
                 temperature=0
             )
@@ -185,8 +166,13 @@ Respond with just the language name, nothing else."""
     
     def translate_response(self, response_text: str, target_language: str) -> str:
         """Traduce la respuesta al idioma objetivo usando GPT - Soporta múltiples idiomas"""
+        return self.llm.run(self.atranslate_response(response_text, target_language))
+    
+    async def atranslate_response(self, response_text: str, target_language: str,
+                                  deadline: Optional[Deadline] = None) -> str:
+        """Versión asíncrona de translate_response, sujeta al plazo del mensaje"""
         try:
-            if not self.client:
+            if not self.llm.available:
                 return response_text  # Sin traducción si no hay cliente
                 
             # Mapeo de nombres de idioma a códigos para verificación rápida
@@ -223,25 +209,14 @@ Respond with just the language name, nothing else."""
             
             target_lang_english = language_names.get(target_language, "English")
             
-            translation_prompt = f"""Translate the following car dealership response to {target_lang_english} ({target_language}).
-
-CRITICAL TRANSLATION RULES:
-1. Maintain ALL emojis and formatting exactly as they appear
-2. Preserve technical specifications and numbers exactly (€45,000, 184 CV, 2.0L, etc.)
-3. Keep brand names unchanged (BMW, Mercedes-Benz, Audi, Ford, etc.)
-4. Translate car-related terms appropriately for the automotive industry
-5. Keep contact information as-is (phone numbers, emails, addresses)
-6. Preserve line breaks, bullet points, and special characters
-7. Return ONLY a JSON object with this exact format: {{"translated_response": "your translation here"}}
-
-Text to translate:
-{response_text}
-
-Remember: Respond with ONLY the JSON object containing the translated text, no additional text or explanations."""
-
-            response = self.client.chat.completions.create(
+            response = await self.llm.acomplete(
+                "translation",
                 model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": translation_prompt}],
+                messages=translation_prompt().build(dynamic=[{
+                    "role": "user",
+                    "content": f"Target language: {target_lang_english} ({target_language})\n\nText to translate:\n{response_text}"
+                }]),
+                deadline=deadline,
                 max_tokens=1200,  # Aumentado para idiomas que requieren más caracteres
                 temperature=0.1   # Muy baja para traducciones consistentes
             )
@@ -302,253 +277,68 @@ Remember: Respond with ONLY the JSON object containing the translated text, no a
     
     def detect_specific_vehicle(self, query: str) -> str:
         """Detect which specific vehicle the user wants - ENGLISH VERSION"""
-        query_lower = query.lower()
+        catalog = get_catalog()
         
-        # Mapping of keywords to vehicle IDs
-        vehicle_mapping = {
-            # By specific model
-            "x3": "BMW_X3_2023_BLU",
-            "bmw x3": "BMW_X3_2023_BLU",
-            "serie 3": "BMW_3_2023_BLU", 
-            "series 3": "BMW_3_2023_BLU",
-            "bmw serie 3": "BMW_3_2023_BLU",
-            "bmw series 3": "BMW_3_2023_BLU",
-            "c-class": "MERCEDES_C_2023_BLK",
-            "c class": "MERCEDES_C_2023_BLK",
-            "mercedes": "MERCEDES_C_2023_BLK",
-            "mercedes-benz": "MERCEDES_C_2023_BLK",
-            "a4": "AUDI_A4_2022_WHT",
-            "audi": "AUDI_A4_2022_WHT",
-            "audi a4": "AUDI_A4_2022_WHT",
-            "león": "SEAT_LEON_2023_BLU",
-            "leon": "SEAT_LEON_2023_BLU",
-            "seat": "SEAT_LEON_2023_BLU",
-            "seat leon": "SEAT_LEON_2023_BLU",
-            "mustang": "FORD_MUSTANG_2023_RED",
-            "ford": "FORD_MUSTANG_2023_RED",
-            "ford mustang": "FORD_MUSTANG_2023_RED",
-            
-            # By special characteristics
-            "cheapest": "SEAT_LEON_2023_BLU",
-            "cheap": "SEAT_LEON_2023_BLU",
-            "affordable": "SEAT_LEON_2023_BLU",
-            "budget": "SEAT_LEON_2023_BLU",
-            "most expensive": "FORD_MUSTANG_2023_RED",
-            "expensive": "FORD_MUSTANG_2023_RED",
-            "premium": "FORD_MUSTANG_2023_RED",
-            "luxury": "MERCEDES_C_2023_BLK",
-            
-            # By color
-            "blue": "BMW_X3_2023_BLU",
-            "metallic blue": "BMW_X3_2023_BLU",
-            "storm bay blue": "BMW_3_2023_BLU",
-            "black": "MERCEDES_C_2023_BLK",
-            "obsidian black": "MERCEDES_C_2023_BLK",
-            "white": "AUDI_A4_2022_WHT",
-            "glacier white": "AUDI_A4_2022_WHT",
-            "red": "FORD_MUSTANG_2023_RED",
-            "racing red": "FORD_MUSTANG_2023_RED",
-            "desire blue": "SEAT_LEON_2023_BLU",
-            
-            # By type
-            "suv": "BMW_X3_2023_BLU",
-            "sedan": "MERCEDES_C_2023_BLK",
-            "sports car": "FORD_MUSTANG_2023_RED",
-            "sport": "FORD_MUSTANG_2023_RED",
-            
-            # By brand (default to most popular model)
-            "bmw": "BMW_X3_2023_BLU"
-        }
+        # "cheapest", "most expensive", "newest"...: se resuelve con el índice ordenado,
+        # respetando marca, color, tipo e intervalos mencionados
+        search = parse_inventory_query(query, catalog)
+        if search.sort:
+            _, best = catalog.search(search.facets, search.ranges, sort=search.sort,
+                                     descending=search.descending, limit=1)
+            if best:
+                return best[0]["id"]
         
-        # Search for matches
-        for keyword, vehicle_id in vehicle_mapping.items():
-            if keyword in query_lower:
-                return vehicle_id
+        # Palabras clave del catálogo: gana la coincidencia más larga ("bmw series 3" antes que "bmw")
+        match = catalog.keyword_matcher.best(query)
+        if match is not None:
+            return match[3]
         
         # If no specific vehicle detected, return default
-        return "BMW_X3_2023_BLU"
+        return catalog.default_vehicle_id
 
-    def get_vehicle_details(self, vehicle_id: str) -> str:
+    def focused_vehicle(self, user_id: str) -> Optional[str]:
+        """Vehículo del que se habla en la sesión (la última ficha o pregunta sobre un modelo)"""
+        state = self.memory.store.get_state(user_id)
+        return state.get("focused_vehicle") if state else None
+    
+    def focus_vehicle(self, user_id: str, vehicle_id: Optional[str]):
+        """Guarda el vehículo en foco en el estado de la sesión (solo se escribe si cambia)"""
+        if vehicle_id and self.focused_vehicle(user_id) != vehicle_id:
+            self.memory.store.update_state(user_id, {"focused_vehicle": vehicle_id})
+    
+    def answer_slot_question(self, user_message: str, user_id: str) -> Optional[AgentResult]:
+        """Pregunta de atributo (precio, potencia, cambio...) respondida con el catálogo, o None"""
+        if self.slot_questions is None:
+            return None
+        started = time.perf_counter()
+        answered = self.slot_questions.answer(user_message, self.focused_vehicle(user_id))
+        if answered is None:
+            return None
+        result = AgentResult(answered[0], "VEHICLE_QUESTION", vehicle_id=answered[1])
+        result.timings["answer"] = time.perf_counter() - started
+        self.llm.metrics.increment("slot_questions.answered")
+        self.llm.metrics.observe_latency("slot_questions", result.timings["answer"])
+        return result
+    
+    def get_vehicle_details(self, vehicle_id: str, language: str = "english") -> str:
         """Get complete information for a specific vehicle - ENGLISH VERSION"""
-        cars = {
-            "BMW_X3_2023_BLU": {
-                "brand": "BMW", "model": "X3", "year": 2023, 
-                "price": "€45,000", "color": "metallic blue", "type": "SUV",
-                "engine": "2.0L TwinPower Turbo 4-cylinder",
-                "fuel": "Gasoline", "transmission": "8-speed Steptronic Automatic",
-                "mileage": "0 km (new vehicle)", "power": "184 HP (135 kW)",
-                "consumption": "7.2L/100km (combined)", "emissions": "164 g/km CO2",
-                "drivetrain": "xDrive All-Wheel Drive",
-                "features": [
-                    "BMW Live Cockpit Professional navigation system",
-                    "Dakota leather heated seats",
-                    "Front and rear parking sensors",
-                    "3-zone automatic air conditioning",
-                    "Adaptive LED headlights",
-                    "Electric tailgate"
-                ],
-                "dimensions": "4.71m x 1.89m x 1.68m",
-                "trunk_capacity": "550 liters",
-                "warranty": "2-year factory warranty + 3-year BMW Service Inclusive",
-                "image": "images/bmw_x3.png"
-            },
-            "BMW_3_2023_BLU": {
-                "brand": "BMW", "model": "Serie 3", "year": 2023,
-                "price": "€40,000", "color": "storm bay blue", "type": "sedan",
-                "engine": "2.0L TwinPower Turbo 4-cylinder",
-                "fuel": "Gasoline", "transmission": "Steptronic Automatic",
-                "mileage": "0 km (new vehicle)", "power": "184 HP",
-                "consumption": "6.9L/100km", "emissions": "158 g/km CO2",
-                "drivetrain": "Rear-wheel drive",
-                "features": [
-                    "iDrive 7.0 system with touchscreen",
-                    "Harman Kardon premium sound system",
-                    "Sport seats with electric adjustment",
-                    "BMW ConnectedDrive connectivity",
-                    "Adaptive cruise control"
-                ],
-                "dimensions": "4.71m x 1.83m x 1.44m",
-                "trunk_capacity": "480 liters",
-                "warranty": "2-year factory warranty + 3-year BMW Service Inclusive",
-                "image": "images/bmw_serie_3.webp"
-            },
-            "SEAT_LEON_2023_BLU": {
-                "brand": "SEAT", "model": "León", "year": 2023,
-                "price": "€25,000", "color": "Desire blue", "type": "hatchback",
-                "engine": "1.5L TSI 4-cylinder",
-                "fuel": "Gasoline", "transmission": "6-speed Manual",
-                "mileage": "0 km (new vehicle)", "power": "130 HP",
-                "consumption": "5.8L/100km", "emissions": "132 g/km CO2",
-                "drivetrain": "Front-wheel drive",
-                "features": [
-                    "SEAT Connect with full connectivity",
-                    "Full LED headlights standard",
-                    "Wireless smartphone charger",
-                    "Cruise control",
-                    "8.25-inch infotainment system"
-                ],
-                "dimensions": "4.37m x 1.80m x 1.46m",
-                "trunk_capacity": "380 liters",
-                "warranty": "2-year factory warranty",
-                "image": "images/seat_leon.webp"
-            },
-            "MERCEDES_C_2023_BLK": {
-                "brand": "Mercedes-Benz", "model": "C-Class", "year": 2023,
-                "price": "€42,000", "color": "obsidian black", "type": "sedan", 
-                "engine": "1.5L Turbo 4-cylinder",
-                "fuel": "Gasoline", "transmission": "9G-TRONIC Automatic",
-                "mileage": "0 km (new vehicle)", "power": "170 HP",
-                "consumption": "6.8L/100km", "emissions": "155 g/km CO2",
-                "drivetrain": "Rear-wheel drive",
-                "features": [
-                    "MBUX with artificial intelligence",
-                    "AMG sport seats",
-                    "LED High Performance lights", 
-                    "Burmester sound system",
-                    "64-color ambient lighting"
-                ],
-                "dimensions": "4.75m x 1.82m x 1.44m",
-                "trunk_capacity": "455 liters",
-                "warranty": "2-year Mercedes-Benz warranty",
-                "image": "images/mercedes_c_class.png"
-            },
-            "AUDI_A4_2022_WHT": {
-                "brand": "Audi", "model": "A4", "year": 2022,
-                "price": "€38,000", "color": "glacier white", "type": "sedan",
-                "engine": "2.0L TFSI 4-cylinder",
-                "fuel": "Gasoline", "transmission": "S tronic 7-speed",
-                "mileage": "15,000 km", "power": "190 HP",
-                "consumption": "6.5L/100km", "emissions": "148 g/km CO2",
-                "drivetrain": "quattro all-wheel drive",
-                "features": [
-                    "Virtual Cockpit Plus",
-                    "quattro all-wheel drive",
-                    "Bang & Olufsen Premium Sound",
-                    "MMI Navigation plus",
-                    "Sport seats"
-                ],
-                "dimensions": "4.76m x 1.84m x 1.43m",
-                "trunk_capacity": "460 liters",
-                "warranty": "1 year remaining warranty",
-                "image": "images/audi_a4.png"
-            },
-            "FORD_MUSTANG_2023_RED": {
-                "brand": "Ford", "model": "Mustang", "year": 2023,
-                "price": "€55,000", "color": "racing red", "type": "sports car",
-                "engine": "5.0L V8",
-                "fuel": "Gasoline", "transmission": "6-speed Manual",
-                "mileage": "0 km (new vehicle)", "power": "450 HP",
-                "consumption": "12.5L/100km", "emissions": "290 g/km CO2",
-                "drivetrain": "Rear-wheel drive",
-                "features": [
-                    "SYNC 3 infotainment system",
-                    "Track Apps performance data",
-                    "Selectable drive modes",
-                    "Performance Package",
-                    "Recaro sport seats"
-                ],
-                "dimensions": "4.79m x 1.92m x 1.38m",
-                "trunk_capacity": "382 liters",
-                "warranty": "3-year Ford warranty",
-                "image": "images/ford_mustang.png"
-            }
-        }
+        return self.vehicle_details(vehicle_id, language)[0]
+
+    def vehicle_details(self, vehicle_id: str, language: str = "english") -> Tuple[str, Optional[str]]:
+        """Ficha del vehículo y ruta de su imagen (None si no existe), sin estado compartido"""
+        # Una sola instantánea del inventario para la ficha y la imagen
+        catalog = get_catalog()
+        car = catalog.get(vehicle_id)
         
-        if vehicle_id in cars:
-            car = cars[vehicle_id]
-            
-            # Formato visual mejorado sin asteriscos - EN INGLÉS
-            result = f"🚗 {car['brand']} {car['model']} ({car['year']})\n"
-            result += "═══════════════════════════════\n\n"
-            
-            # Información básica con diseño limpio
-            result += f"💰 Price: {car['price']}\n"
-            result += f"🎨 Color: {car['color']}\n"
-            result += f"📊 Mileage: {car['mileage']}\n"
-            result += f"🚙 Type: {car['type']}\n\n"
-            
-            # Especificaciones técnicas con emojis organizados
-            result += "🔧 TECHNICAL SPECIFICATIONS\n"
-            result += "───────────────────────────────\n"
-            result += f"⚡ Engine: {car['engine']}\n"
-            result += f"🏎️ Power: {car['power']}\n"
-            result += f"⚙️ Transmission: {car['transmission']}\n"
-            result += f"🚗 Drivetrain: {car['drivetrain']}\n"
-            result += f"⛽ Consumption: {car['consumption']}\n"
-            result += f"🌱 Emissions: {car['emissions']}\n\n"
-            
-            # Dimensiones con presentación clara
-            result += "📏 DIMENSIONS\n"
-            result += "───────────────────────────────\n"
-            result += f"📐 Exterior: {car['dimensions']}\n"
-            result += f"🧳 Trunk: {car['trunk_capacity']}\n\n"
-            
-            # Características con formato atractivo
-            result += "✨ FEATURED CHARACTERISTICS\n"
-            result += "───────────────────────────────\n"
-            for i, feature in enumerate(car['features'], 1):
-                result += f"🔹 {feature}\n"
-            
-            # Garantía con formato especial
-            result += f"\n🛡️ WARRANTY\n"
-            result += "───────────────────────────────\n"
-            result += f"📋 {car['warranty']}\n\n"
-            
-            # Call to action final
-            result += "🏢 Would you like to schedule an appointment to see it at our dealership?\n"
-            result += "📞 We're ready to help you!"
-            
-            # Almacenar la ruta de la imagen para uso posterior
-            self._last_vehicle_image = car.get("image")
-            
-            return result
+        if car is not None:
+            # Ficha pre-renderizada por (vehículo, versión del inventario, idioma)
+            result = vehicle_cards.card(vehicle_id, language, catalog)
+            similar = catalog.similar(vehicle_id, self.similar_vehicles)
+            if similar:
+                result += "\n\n" + self._alternatives_section("🔁 Similar vehicles you may like:", similar)
+            return result, car.get("image")
         else:
-            self._last_vehicle_image = None
-            return "I couldn't find that specific vehicle. Can you tell me which model interests you? I have detailed information on all our vehicles."
-
-    def get_last_vehicle_image(self) -> str:
-        """Get the path of the last vehicle image consulted"""
-        return getattr(self, '_last_vehicle_image', None)
+            return "I couldn't find that specific vehicle. Can you tell me which model interests you? I have detailed information on all our vehicles.", None
         result += "• WhatsApp: Este mismo número\n\n"
         
         result += "💡 **Información para tu cita:**\n"
@@ -611,128 +401,145 @@ Remember: Respond with ONLY the JSON object containing the translated text, no a
 
     def search_inventory(self, query: str) -> str:
         """Smart inventory search with detailed information - ENGLISH VERSION"""
-        query_lower = query.lower()
-        
-        # Simplified inventory for English system
-        cars = [
-            {
-                "id": "BMW_X3_2023_BLU", "brand": "BMW", "model": "X3", "year": 2023, 
-                "price": "€45,000", "color": "metallic blue", "type": "SUV",
-                "engine": "2.0L TwinPower Turbo", "fuel": "Gasoline", 
-                "transmission": "8-speed Automatic", "mileage": "0 km (new)",
-                "power": "184 HP", "consumption": "7.2L/100km", 
-                "features": ["BMW Navigation", "Leather seats", "xDrive AWD"]
-            },
-            {
-                "id": "BMW_3_2023_BLU", "brand": "BMW", "model": "Serie 3", "year": 2023,
-                "price": "€40,000", "color": "storm bay blue", "type": "sedan",
-                "engine": "2.0L TwinPower", "fuel": "Gasoline",
-                "transmission": "Steptronic Automatic", "mileage": "0 km (new)",
-                "power": "184 HP", "consumption": "6.9L/100km",
-                "features": ["iDrive 7.0", "Harman Kardon", "Sport seats"]
-            },
-            {
-                "id": "MERCEDES_C_2023_BLK", "brand": "Mercedes-Benz", "model": "C-Class", "year": 2023,
-                "price": "€42,000", "color": "obsidian black", "type": "sedan", 
-                "engine": "1.5L Turbo", "fuel": "Gasoline", 
-                "transmission": "9G-TRONIC Automatic", "mileage": "0 km (new)",
-                "power": "170 HP", "consumption": "6.8L/100km",
-                "features": ["MBUX", "Sport seats", "LED High Performance"]
-            },
-            {
-                "id": "AUDI_A4_2022_WHT", "brand": "Audi", "model": "A4", "year": 2022,
-                "price": "€38,000", "color": "glacier white", "type": "sedan",
-                "engine": "2.0L TFSI", "fuel": "Gasoline",
-                "transmission": "S tronic 7-speed", "mileage": "15,000 km",
-                "power": "190 HP", "consumption": "6.5L/100km", 
-                "features": ["Virtual Cockpit", "quattro", "Bang & Olufsen"]
-            },
-            {
-                "id": "SEAT_LEON_2023_BLU", "brand": "SEAT", "model": "León", "year": 2023,
-                "price": "€25,000", "color": "Desire blue", "type": "hatchback",
-                "engine": "1.5L TSI", "fuel": "Gasoline",
-                "transmission": "6-speed Manual", "mileage": "0 km (new)",
-                "power": "130 HP", "consumption": "5.8L/100km",
-                "features": ["SEAT Connect", "Full LED", "Wireless Charger"]
-            },
-            {
-                "id": "FORD_MUSTANG_2023_RED", "brand": "Ford", "model": "Mustang", "year": 2023,
-                "price": "€55,000", "color": "racing red", "type": "sports car",
-                "engine": "5.0L V8", "fuel": "Gasoline",
-                "transmission": "6-speed Manual", "mileage": "0 km (new)",
-                "power": "450 HP", "consumption": "12.4L/100km",
-                "features": ["SYNC 3", "Brembo brakes", "Recaro seats"]
-            }
-        ]
-        
-        # Simple filtering for English system
-        filtered_cars = cars.copy()
+        return self.inventory_search(query)[0]
+    
+    def inventory_result(self, query: str, intent: str = "SEARCH_INVENTORY",
+                         tool_name: str = "Inventory search results") -> AgentResult:
+        """Búsqueda en el inventario como resultado de la petición, con la lista interactiva adjunta"""
+        text, listing = self.inventory_search(query)
+        result = AgentResult(text, intent, tool_name)
+        if listing is not None:
+            result.attachments.append(Attachment("list", data=listing))
+        return result
+    
+    def inventory_search(self, query: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Listado de texto y mensaje de lista de WhatsApp (filas con el id de cada
+        vehículo y "next page"); la lista es None si no hay vehículos que mostrar
+        o si es una búsqueda por equipamiento (el texto dice qué coincide)
+        """
+        # Inventario canónico compartido; los filtros salen de sus índices por atributo
+        catalog = get_catalog()
+        search = parse_inventory_query(query, catalog)
         
         # CRITICAL: Filter by fuel type first (electric, hybrid, gasoline)
-        fuel_keywords = {
-            "electric": "Electric",
-            "hybrid": "Hybrid", 
-            "gasoline": "Gasoline",
-            "petrol": "Gasoline",
-            "gas": "Gasoline"
-        }
-        
-        for fuel_key, fuel_value in fuel_keywords.items():
-            if fuel_key in query_lower:
-                original_count = len(filtered_cars)
-                filtered_cars = [car for car in filtered_cars if car["fuel"] == fuel_value]
-                # If no cars match this fuel type, return specific message
-                if len(filtered_cars) == 0:
-                    if fuel_value == "Electric":
-                        return "❌ Sorry, we currently don't have any electric vehicles in our inventory.\n\n🚗 Our current inventory consists of gasoline vehicles from premium brands like BMW, Mercedes-Benz, Audi, SEAT, and Ford.\n\n⚡ Would you like me to notify you when electric vehicles become available? Or would you like to see our efficient gasoline options?"
-                    elif fuel_value == "Hybrid":
-                        return "❌ Sorry, we currently don't have any hybrid vehicles in our inventory.\n\n🚗 Our current inventory consists of gasoline vehicles from premium brands like BMW, Mercedes-Benz, Audi, SEAT, and Ford.\n\n🌱 Would you like me to notify you when hybrid vehicles become available? Or would you like to see our fuel-efficient gasoline options?"
-                break
-        
-        # Filter by brand
-        if any(brand in query_lower for brand in ["bmw", "mercedes", "audi", "seat", "ford"]):
-            for brand in ["bmw", "mercedes", "audi", "seat", "ford"]:
-                if brand in query_lower:
-                    brand_map = {"bmw": "BMW", "mercedes": "Mercedes-Benz", "audi": "Audi", "seat": "SEAT", "ford": "Ford"}
-                    filtered_cars = [car for car in filtered_cars if car["brand"] == brand_map[brand]]
-                    break
-        
-        # Filter by color
-        if any(color in query_lower for color in ["blue", "black", "white", "red"]):
-            for color in ["blue", "black", "white", "red"]:
-                if color in query_lower:
-                    filtered_cars = [car for car in filtered_cars if color in car["color"].lower()]
-                    break
+        fuels = search.facets.get("fuel")
+        if fuels and not catalog.match_positions({"fuel": fuels}):
+            if fuels == {"electric"}:
+                return "❌ Sorry, we currently don't have any electric vehicles in our inventory.\n\n🚗 Our current inventory consists of gasoline vehicles from premium brands like BMW, Mercedes-Benz, Audi, SEAT, and Ford.\n\n⚡ Would you like me to notify you when electric vehicles become available? Or would you like to see our efficient gasoline options?", None
+            elif fuels == {"hybrid"}:
+                return "❌ Sorry, we currently don't have any hybrid vehicles in our inventory.\n\n🚗 Our current inventory consists of gasoline vehicles from premium brands like BMW, Mercedes-Benz, Audi, SEAT, and Ford.\n\n🌱 Would you like me to notify you when hybrid vehicles become available? Or would you like to see our fuel-efficient gasoline options?", None
         
-        # Filter by type
-        if any(vtype in query_lower for vtype in ["suv", "sedan", "sports", "hatchback"]):
-            for vtype in ["suv", "sedan", "sports", "hatchback"]:
-                if vtype in query_lower:
-                    filtered_cars = [car for car in filtered_cars if vtype in car["type"].lower()]
-                    break
+        # Fuel, brand, color and type: OR within an attribute, AND across attributes;
+        # price/power/mileage/year ranges, sorting and top-k come from the sorted indexes
+        page_size = self.inventory_page_size
+        offset = (search.page - 1) * page_size
+        if search.limit is not None:
+            page_size = max(0, min(page_size, search.limit - offset))
+        # "leather seats", "harman kardon", "awd": ranking BM25 sobre el equipamiento
+        feature_terms = ()
+        if catalog.feature_index.is_feature_query(search.text):
+            feature_terms = catalog.feature_index.distinctive_terms(search.text)
+            total_matches, page = catalog.feature_search(search.text, search.facets, search.ranges,
+                                                         sort=search.sort, descending=search.descending,
+                                                         offset=offset, limit=page_size)
+        else:
+            total_matches, page = catalog.search(search.facets, search.ranges, sort=search.sort,
+                                                 descending=search.descending,
+                                                 offset=offset, limit=page_size)
+        total_vehicles = min(total_matches, search.limit) if search.limit is not None else total_matches
         
         # Generate response
-        if filtered_cars:
-            result = "🚗 Available vehicles:\n\n"
-            
-            for i, car in enumerate(filtered_cars, 1):
-                result += f"{i}. {car['brand']} {car['model']} ({car['year']})\n"
-                result += f"   💰 Price: {car['price']}\n"
-                result += f"   🎨 Color: {car['color']}\n"
-                result += f"   ⚡ Engine: {car['engine']} - {car['power']}\n"
-                result += f"   📊 Mileage: {car['mileage']}\n\n"
+        if page:
+            # Bloques por vehículo cacheados; solo se numeran y se unen aquí
+            result = "🚗 Available vehicles:\n\n" + "".join(
+                f"{i}. {self._listing_entry(car, catalog.version, feature_terms)}"
+                for i, car in enumerate(page, offset + 1)
+            )
             
-            total_vehicles = len(filtered_cars)
             if total_vehicles == 1:
                 result += f"✅ This is the only vehicle that matches your search.\n\n"
+            elif total_vehicles < total_matches:
+                result += f"✅ Top {total_vehicles} of {total_matches} vehicles matching your search.\n\n"
             else:
                 result += f"✅ Total: {total_vehicles} vehicles matching your search.\n\n"
             
+            shown_until = offset + len(page)
+            if shown_until < total_vehicles:
+                result += (f"📄 Showing {offset + 1}-{shown_until} of {total_vehicles}. "
+                           f"Ask for \"page {search.page + 1}\" to see more.\n\n")
+            
             result += "💡 For complete information about any vehicle, ask me about the specific model.\n"
             result += "📅 Would you like to schedule an appointment to see them in person?"
-            return result
+            
+            # Lista interactiva con las filas precalculadas de esta versión del inventario
+            listing = None
+            if not feature_terms:
+                listing = inventory_lists.list_message(page, offset, total_vehicles, self.inventory_page_size,
+                                                       without_page(query), catalog)
+            return result, listing
+        elif total_vehicles:
+            pages = -(-total_vehicles // self.inventory_page_size)
+            return f"📄 There are only {pages} page(s) of results ({total_vehicles} vehicles). Ask for \"page 1\" to start again.", None
         else:
-            return "❌ Sorry, we currently don't have vehicles matching your search criteria.\n\n🚗 Our current inventory includes gasoline vehicles from brands like BMW, Mercedes-Benz, Audi, SEAT, and Ford.\n\nWould you like to see any of these available options? Or would you prefer that I notify you when we have vehicles that match your search?"
+            # Alternativas más cercanas al tipo y a los intervalos pedidos
+            alternatives = catalog.closest_to(search.facets, search.ranges, self.similar_vehicles)
+            if alternatives:
+                return ("❌ Sorry, we currently don't have vehicles matching your search criteria.\n\n"
+                        + self._alternatives_section("🔁 These are the closest options we have:", alternatives)
+                        + "\n\n💡 Ask me about any of them for the complete details, or tell me what you'd like to change in your search."), None
+            return "❌ Sorry, we currently don't have vehicles matching your search criteria.\n\n🚗 Our current inventory includes gasoline vehicles from brands like BMW, Mercedes-Benz, Audi, SEAT, and Ford.\n\nWould you like to see any of these available options? Or would you prefer that I notify you when we have vehicles that match your search?", None
+    
+    def compare_vehicles(self) -> str:
+        """Side-by-side key specs of the vehicles on the first inventory page, cheapest first"""
+        catalog = get_catalog()
+        _, page = catalog.search(sort="price", limit=self.inventory_page_size)
+        if not page:
+            return "❌ Sorry, there are no vehicles in our inventory to compare right now."
+        result = "⚖️ Vehicle comparison:\n"
+        for car in page:
+            result += (f"\n🚗 {car['brand']} {car['model']} ({car['year']}) - {car['price']}\n"
+                       f"   ⚡ {car['power']} | ⛽ {car['consumption']}\n"
+                       f"   ⚙️ {car['transmission']} | 🧳 {car['trunk_capacity']}\n")
+        result += "\n💡 Tap a vehicle or ask me about a specific model for the complete details."
+        return result
+    
+    @staticmethod
+    def _alternatives_section(title: str, vehicles) -> str:
+        """Lista corta de vehículos alternativos (una línea por vehículo)"""
+        return title + "".join(f"\n• {car['brand']} {car['model']} ({car['year']}) - {car['price']}"
+                               for car in vehicles)
+    
+    @staticmethod
+    def _listing_entry(car, version: str, feature_terms) -> str:
+        """Bloque del listado; en búsquedas por equipamiento añade lo que coincide"""
+        fragment = vehicle_cards.listing_fragment(car, version)
+        matched = matched_features(car, feature_terms) if feature_terms else None
+        if not matched:
+            return fragment
+        return f"{fragment.rstrip()}\n   ✨ {', '.join(matched)}\n\n"
+    
+    def is_feature_question(self, query: str) -> bool:
+        """Pregunta por equipamiento que se puede responder con el índice local"""
+        catalog = get_catalog()
+        return catalog.feature_index.is_feature_query(parse_inventory_query(query, catalog).text)
+    
+    def has_vehicle_context(self, user_message: str, messages: List[Dict[str, str]]) -> bool:
+        """
+        True si la respuesta puede depender de un vehículo concreto: el mensaje
+        nombra uno o pregunta por equipamiento, uno de los últimos turnos del
+        asistente fue una ficha o un listado, o el mensaje se refiere ("it",
+        "this one") a un vehículo mostrado antes en la conversación
+        """
+        if get_catalog().keyword_matcher.best(user_message) is not None:
+            return True
+        if self.is_feature_question(user_message):
+            return True
+        shown = [m["content"].startswith(_VEHICLE_CONTEXT_PREFIXES)
+                 for m in messages if m["role"] == "assistant"]
+        if any(shown[-VEHICLE_CONTEXT_TURNS:]):
+            return True
+        return any(shown) and bool(REFERRING_WORDS.find_all(user_message))
     
     def schedule_appointment(self, details: str) -> str:
         """Schedule in-person appointment at the dealership - ENGLISH VERSION"""
@@ -758,157 +565,209 @@ Phone: +34 91 XXX XX XX"""
         """
         Usa GPT para interpretar la intención del usuario y llamar la función apropiada
         """
+        return self.llm.run(self.ainterpret_user_intent(user_message, messages))
+    
+    async def ainterpret_user_intent(self, user_message: str, messages: List[Dict[str, str]],
+                                     deadline: Optional[Deadline] = None) -> str:
+        """Versión asíncrona de interpret_user_intent, sujeta al plazo del mensaje"""
+        return (await self._route_intent(user_message, messages, deadline)).text
+    
+    async def _general_chat(self, messages: List[Dict[str, str]], deadline: Optional[Deadline]) -> str:
+        """Conversación normal con GPT sobre el historial completo"""
+        response = await self.llm.acomplete(
+            "general_chat",
+            model="gpt-4o-mini",
+            messages=messages,
+            deadline=deadline,
+            max_tokens=500,
+            temperature=0.7
+        )
+        return response.choices[0].message.content.strip()
+    
+    async def _speculative_chat(self, messages: List[Dict[str, str]], deadline: Optional[Deadline]) -> Tuple[str, float]:
+        """GENERAL_CHAT lanzado antes de conocer la intención; devuelve (texto, instante de fin)"""
+        text = await self._general_chat(messages, deadline)
+        return text, time.perf_counter()
+    
+    async def _use_speculation(self, speculative: "asyncio.Future", started: float, intent_done: float) -> str:
+        """Espera la respuesta especulada y registra la latencia ahorrada frente a la ejecución en serie"""
+        text, chat_done = await speculative
+        finished = time.perf_counter()
+        serial = (intent_done - started) + (chat_done - started)
+        self.speculation.record_hit(serial - (finished - started))
+        return text
+    
+    def _discard_speculation(self, speculative: Optional["asyncio.Future"], messages: List[Dict[str, str]]):
+        """Cancela una especulación que no se va a usar y contabiliza su coste estimado"""
+        if speculative is None:
+            return
+        completion_tokens = 0
+        if speculative.done() and not speculative.cancelled() and speculative.exception() is None:
+            completion_tokens = estimate_tokens(speculative.result()[0])
+        else:
+            speculative.cancel()
+        self.speculation.record_waste(estimate_messages_tokens(messages), completion_tokens)
+    
+    async def _route_intent(self, user_message: str, messages: List[Dict[str, str]],
+                            deadline: Optional[Deadline] = None) -> AgentResult:
+        """
+        Igual que interpret_user_intent, pero devuelve el resultado completo de
+        la petición: texto, intención, herramienta usada, adjuntos y tiempos
+        """
+        speculative = None
         try:
-            # Crear prompt para determinar la intención con contexto
-            context_history = ""
-            if len(messages) > 1:
-                # Obtener últimos 3 intercambios de conversación para contexto
-                recent_messages = messages[-6:] if len(messages) >= 6 else messages[:-1]
-                for msg in recent_messages:
-                    context_history += f"{msg['role']}: {msg['content'][:100]}...\n"
-            
-            intent_prompt = {
-                "role": "system",
-                "content": f"""You are an assistant specialized in determining user intent at a car dealership.
-
-CONVERSATION CONTEXT:
-{context_history}
-
-Analyze the user's message and determine which of these 5 actions should be executed:
-
-1. SEARCH_INVENTORY - General vehicle search (by brand, color, type, price, availability)
-   Examples: "what cars do you have?", "blue cars", "available BMW", "something cheap"
-
-2. VEHICLE_DETAILS - Specific and detailed information about ONE particular vehicle
-   Examples: "more information about the BMW X3", "Serie 3 specifications", "complete details of the Mercedes"
-
-3. SCHEDULE_APPOINTMENT - Schedule appointment to visit the dealership (NO test drives)
-   Examples: "I want to make an appointment", "visit the dealership", "see the cars in person", "schedule a visit"
-   ONLY use this for NEW appointment requests, NOT for providing appointment details
-
-4. COMPANY_INFO - Information about AutoMax (hours, location, contact)
-   Examples: "where are you located", "your hours", "AutoMax phone number"
-
-5. GENERAL_CHAT - General conversation, greetings, or queries that don't require specific function
-   Examples: "hello", "thanks", "how are you", questions about financing/test drives (which we don't offer)
-   ALSO use for simple questions about price/specific features when context shows a specific car was recently discussed
-   ALSO use for providing appointment details after appointment scheduling was already initiated (names, phones, times, etc.)
-
-Respond ONLY with one of these options: SEARCH_INVENTORY, VEHICLE_DETAILS, SCHEDULE_APPOINTMENT, COMPANY_INFO, or GENERAL_CHAT
-
-SPECIAL RULES:
-- If user asks "What is the price?" or "How much?" or "What does it cost?" and context shows a specific car was just discussed, use GENERAL_CHAT
-- If the user asks for specific information about a concrete model (like "more information about the BMW X3"), it's VEHICLE_DETAILS
-- If they search for general options (like "what BMW do you have?"), it's SEARCH_INVENTORY
-- If user provides appointment details (name, phone, time, date) after already asking for an appointment, use GENERAL_CHAT
-- If context shows appointment scheduling was already initiated and user provides information, use GENERAL_CHAT
-- SCHEDULE_APPOINTMENT is ONLY for initial requests, not for follow-up information"""
-            }
-            
-            if self.client:
+            if self.llm.available:
+                # Pregunta frecuente ya respondida: ni clasificación de intención ni gpt-4o-mini
+                use_answer_cache = self.answer_cache.enabled and not self.has_vehicle_context(user_message, messages)
+                if use_answer_cache:
+                    cached = self.answer_cache.lookup(user_message)
+                    if cached is not None:
+                        print(f"⚡ Respuesta desde la caché semántica (similitud {cached[1]:.2f})")
+                        result = AgentResult(cached[0], intent="GENERAL_CHAT")
+                        result.cached = True
+                        return result
+                
+                started = time.perf_counter()
+                if self.speculation.should_speculate():
+                    speculative = asyncio.ensure_future(self._speculative_chat(messages, deadline))
+                
                 # Determinar intención
-                intent_response = self.client.chat.completions.create(
+                intent_response = await self.llm.acomplete(
+                    "intent",
                     model="gpt-3.5-turbo",
-                    messages=[
-                        intent_prompt,
-                        {"role": "user", "content": user_message}
-                    ],
+                    messages=intent_prompt().build(
+                        semi_static=conversation_context_message(messages),
+                        dynamic=[{"role": "user", "content": user_message}]
+                    ),
+                    deadline=deadline,
                     max_tokens=20,
                     temperature=0
                 )
                 
                 intent = intent_response.choices[0].message.content.strip()
+                intent_done = time.perf_counter()
                 print(f"🎯 Intención detectada: {intent}")
                 
+                if intent in ("SEARCH_INVENTORY", "VEHICLE_DETAILS", "SCHEDULE_APPOINTMENT", "COMPANY_INFO"):
+                    self._discard_speculation(speculative, messages)
+                
                 # Ejecutar la función apropiada basándose en la intención
                 if intent == "SEARCH_INVENTORY":
-                    self._last_vehicle_image = None  # Limpiar imagen anterior
-                    return self.search_inventory(user_message)
+                    result = self.inventory_result(user_message)
                 elif intent == "VEHICLE_DETAILS":
                     vehicle_id = self.detect_specific_vehicle(user_message)
-                    return self.get_vehicle_details(vehicle_id)  # La imagen se almacena internamente
+                    text, image = self.vehicle_details(vehicle_id)
+                    result = AgentResult(text, intent, "Vehicle details card", vehicle_id=vehicle_id)
+                    if image:
+                        result.attachments.append(Attachment("image", image, vehicle_id))
                 elif intent == "SCHEDULE_APPOINTMENT":
-                    self._last_vehicle_image = None  # Limpiar imagen anterior
-                    return self.schedule_appointment(user_message)
+                    result = AgentResult(self.schedule_appointment(user_message), intent)
                 elif intent == "COMPANY_INFO":
-                    self._last_vehicle_image = None  # Limpiar imagen anterior
-                    return self.get_company_info(user_message)
+                    result = AgentResult(self.get_company_info(user_message), intent)
                 else:  # GENERAL_CHAT
-                    self._last_vehicle_image = None  # Limpiar imagen anterior
-                    # Usar conversación normal con GPT
-                    response = self.client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=messages,
-                        max_tokens=500,
-                        temperature=0.7
-                    )
-                    return response.choices[0].message.content.strip()
+                    # Preguntas de equipamiento ("anything with Harman Kardon?"): índice local, sin gpt-4o-mini
+                    if self.is_feature_question(user_message):
+                        self._discard_speculation(speculative, messages)
+                        result = self.inventory_result(user_message, "GENERAL_CHAT", "Feature search results")
+                    else:
+                        if speculative is not None:
+                            text = await self._use_speculation(speculative, started, intent_done)
+                        else:
+                            text = await self._general_chat(messages, deadline)
+                        if use_answer_cache:
+                            self.answer_cache.store(user_message, text)
+                        result = AgentResult(text, "GENERAL_CHAT")
+                result.timings["intent"] = intent_done - started
+                result.timings["answer"] = time.perf_counter() - intent_done
+                return result
             else:
                 # Fallback sin cliente
-                return "Hello! 👋 Welcome to AutoMax. How can I help you today?"
+                return AgentResult("Hello! 👋 Welcome to AutoMax. How can I help you today?")
+        
+        except DeadlineExceeded as e:
+            print(f"⏰ Plazo agotado: {e}")
+            self._discard_speculation(speculative, messages)
+            return AgentResult("Sorry, I'm taking longer than usual to answer. Could you please send your message again? 🙏")
                 
         except Exception as e:
             print(f"❌ Error interpretando intención: {e}")
-            # Fallback a conversación general
+            # Fallback a conversación general (reutilizando la especulación si ya estaba en marcha y no falló)
             try:
-                if self.client:
-                    response = self.client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=messages,
-                        max_tokens=500,
-                        temperature=0.7
-                    )
-                    return response.choices[0].message.content.strip()
+                if speculative is not None and not speculative.cancelled() and (
+                        not speculative.done() or speculative.exception() is None):
+                    try:
+                        return AgentResult((await speculative)[0], "GENERAL_CHAT")
+                    except Exception as speculation_error:
+                        print(f"❌ La especulación también falló: {speculation_error}")
+                if self.llm.available:
+                    return AgentResult(await self._general_chat(messages, deadline), "GENERAL_CHAT")
                 else:
-                    return "Hello! 👋 Welcome to AutoMax. How can I help you today?"
-            except:
-                return "Hello! 👋 Welcome to AutoMax. How can I help you today?"
+                    return AgentResult("Hello! 👋 Welcome to AutoMax. How can I help you today?")
+            except Exception:
+                return AgentResult("Hello! 👋 Welcome to AutoMax. How can I help you today?")
     
-    def get_response(self, user_message: str, user_id: str = "default") -> str:
+    def get_response(self, user_message: str, user_id: str = "default") -> AgentResult:
         """
         Genera una respuesta del agente de chat en inglés únicamente
+        (str(resultado) es el texto de la respuesta)
         """
+        return self.llm.run(self.aget_response(user_message, user_id))
+    
+    async def aget_response(self, user_message: str, user_id: str = "default") -> AgentResult:
+        """
+        Versión asíncrona de get_response: todas las llamadas comparten el plazo del mensaje.
+        Cada petición tiene su propio AgentResult, así que una instancia puede
+        atender varios mensajes a la vez sin mezclar imágenes ni intenciones.
+        """
+        started = time.perf_counter()
         try:
+            deadline = Deadline(self.message_deadline)
+            
             # Añadir mensaje del usuario al historial
             self.add_to_history(user_id, "user", user_message)
             
-            # Preparar mensajes para OpenAI
-            messages = [self.system_message]
-            
-            # Añadir historial de conversación
-            history = self.get_conversation_history(user_id)
-            messages.extend(history)
-            
-            # Usar GPT para determinar la intención del usuario e invocar la función apropiada
-            response_text = self.interpret_user_intent(user_message, messages)
-            
-            # Añadir respuesta al historial
-            self.add_to_history(user_id, "assistant", response_text)
+            # "what's the price?", "is it automatic?": dato del vehículo en foco, sin OpenAI
+            result = self.answer_slot_question(user_message, user_id)
+            if result is None:
+                # Preparar mensajes para OpenAI: prefijo estático + resumen + turnos recientes
+                messages = chat_prompt().build(dynamic=self.get_conversation_history(user_id))
+                
+                # Usar GPT para determinar la intención del usuario e invocar la función apropiada
+                result = await self._route_intent(user_message, messages, deadline)
             
-            return response_text
+            # Añadir respuesta al historial (las fichas y listados se guardan como referencia)
+            self.add_to_history(user_id, "assistant", result.text, tool_name=result.tool_name)
+            self.focus_vehicle(user_id, result.vehicle_id)
             
         except Exception as e:
             print(f"❌ Error en get_response: {e}")
-            return "Sorry, there was a problem processing your message. Could you please try again?"
+            result = AgentResult("Sorry, there was a problem processing your message. Could you please try again?",
+                                 error=str(e))
+        result.timings["total"] = time.perf_counter() - started
+        return result
 
     def process_message(self, user_message: str, user_id: str = "default") -> Dict[str, Any]:
         """
         Procesa un mensaje y devuelve respuesta estructurada
         """
+        return self.llm.run(self.aprocess_message(user_message, user_id))
+    
+    async def aprocess_message(self, user_message: str, user_id: str = "default") -> Dict[str, Any]:
+        """
+        Versión asíncrona de process_message: el AgentResult de la petición
+        como diccionario (respuesta, intención, adjuntos y tiempos en ms)
+        """
         try:
-            response = self.get_response(user_message, user_id)
-            
-            return {
-                "success": True,
-                "response": response,
-                "type": "text"
-            }
+            result = await self.aget_response(user_message, user_id)
+            return result.to_dict()
         except Exception as e:
             print(f"❌ Error procesando mensaje: {e}")
             return {
                 "success": False,
                 "response": "Lo siento, hubo un problema procesando tu mensaje. ¿Podrías intentarlo de nuevo?",
                 "type": "text",
+                "attachments": [],
+                "image_path": None,
                 "error": str(e)
             }
 
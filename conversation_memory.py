@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Memoria de conversación con presupuesto de tokens para el agente AutoMax
+"""
+
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, List, Callable
+
+from conversation_store import ConversationStore, Message
+
+# Palabras, números o signos sueltos: aproximación barata a los tokens de BPE
+_TOKEN_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]", re.UNICODE)
+
+# Tokens fijos que la API añade por cada mensaje (rol, separadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estima los tokens de un texto sin llamar a ningún tokenizador externo.
+    Las palabras largas cuentan como varios tokens (~4 caracteres por token).
+    """
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        tokens += 1 + (len(piece) - 1) // 4
+    return tokens
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estima los tokens de prompt de una lista de mensajes de chat"""
+    return sum(estimate_tokens(msg.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for msg in messages)
+
+
+def compact_tool_output(tool_name: str, text: str, max_chars: int = 200) -> str:
+    """
+    Convierte la salida de una herramienta (ficha de vehículo, listado...) en una
+    referencia corta para el historial. El cliente ya vio el texto completo.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    highlights = lines[:1]
+    for line in lines[1:]:
+        if re.match(r"^\d+\.\s", line) or "Price:" in line:
+            highlights.append(line)
+    summary = " | ".join(highlights)
+    if len(summary) > max_chars:
+        summary = summary[:max_chars - 3].rstrip() + "..."
+    return f"[{tool_name} shown to the customer: {summary}]"
+
+
+class ConversationMemory:
+    """
+    Historial por usuario limitado por presupuesto de tokens.
+
+    Los turnos recientes se envían íntegros; los antiguos se compactan en un
+    resumen acumulado que se genera en segundo plano, fuera del camino crítico.
+    Turnos y resúmenes viven en un ConversationStore, que el adaptador de
+    WhatsApp consulta directamente en lugar de guardar su propia copia.
+    """
+
+    def __init__(self, token_budget: int = 1500, min_recent_turns: int = 4,
+                 summarizer: Optional[Callable[[str, List[Dict[str, str]]], str]] = None,
+                 summary_max_chars: int = 800, store: Optional[ConversationStore] = None):
+        self.token_budget = token_budget
+        self.min_recent_turns = min_recent_turns
+        self.summarizer = summarizer
+        self.summary_max_chars = summary_max_chars
+        self.store = store if store is not None else ConversationStore()
+
+        self._pending: Dict[str, List[Message]] = {}
+        self._compacting: set = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+
+    def add(self, user_id: str, role: str, content: str, tool_name: Optional[str] = None):
+        """Añade un turno; las salidas de herramientas se guardan como referencia compacta"""
+        if tool_name:
+            content = compact_tool_output(tool_name, content)
+
+        # El almacén saca los turnos más antiguos hasta volver al presupuesto
+        evicted = self.store.append(user_id, role, content,
+                                    tokens=estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS,
+                                    token_budget=self.token_budget, min_recent=self.min_recent_turns)
+
+        schedule = False
+        with self._lock:
+            if evicted:
+                self._pending.setdefault(user_id, []).extend(evicted)
+                if user_id not in self._compacting:
+                    self._compacting.add(user_id)
+                    schedule = True
+
+        if schedule:
+            self._executor.submit(self._compact, user_id)
+
+    def get_messages(self, user_id: str) -> List[Dict[str, str]]:
+        """Devuelve el resumen (si existe) seguido de los turnos recientes"""
+        summary = self.store.summary(user_id)
+        turns = self.store.messages(user_id)
+
+        messages = []
+        if summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {summary}"
+            })
+        messages.extend(turn.to_dict() for turn in turns)
+        return messages
+
+    def get_summary(self, user_id: str) -> Optional[str]:
+        """Resumen acumulado del usuario, si ya se ha generado"""
+        return self.store.summary(user_id)
+
+    def clear(self, user_id: str):
+        """Elimina todo el historial de un usuario"""
+        self.store.clear(user_id)
+        with self._lock:
+            self._pending.pop(user_id, None)
+
+    def flush(self, timeout: Optional[float] = None):
+        """Espera a que terminen las compactaciones en curso (útil en pruebas y benchmarks)"""
+        self._executor.submit(lambda: None).result(timeout=timeout)
+
+    def _compact(self, user_id: str):
+        """Integra los turnos expulsados en el resumen del usuario (hilo de fondo)"""
+        while True:
+            with self._lock:
+                batch = self._pending.pop(user_id, [])
+                if not batch:
+                    self._compacting.discard(user_id)
+                    return
+            previous = self.store.summary(user_id) or ""
+
+            plain_turns = [turn.to_dict() for turn in batch]
+            summary = None
+            if self.summarizer:
+                try:
+                    summary = self.summarizer(previous, plain_turns)
+                except Exception as e:
+                    print(f"⚠️ Error resumiendo historial de {user_id}: {e}")
+            if not summary:
+                summary = self._local_summary(previous, plain_turns)
+
+            # Si el usuario se reinició mientras resumíamos, el almacén lo descarta
+            self.store.set_summary(user_id, summary[-self.summary_max_chars:])
+
+    def _local_summary(self, previous: str, turns: List[Dict[str, str]]) -> str:
+        """Resumen extractivo sin LLM: primera línea de cada turno, recortada"""
+        parts = [previous] if previous else []
+        for turn in turns:
+            first_line = turn["content"].strip().split("\n", 1)[0]
+            parts.append(f"{turn['role']}: {first_line[:80]}")
+        return " / ".join(parts)
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Almacén único de sesiones por usuario (historial, resumen y estado),
+compartido por el agente de chat y el adaptador de WhatsApp
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Any, Optional, List, Iterator, Tuple
+
+from agent_metrics import metrics as default_metrics
+
+# Locks por usuario, repartidos en franjas por hash del id (memoria acotada con millones de usuarios)
+LOCK_STRIPES = 1024
+
+
+class SessionConflict(Exception):
+    """Otro nodo modificó la sesión desde la versión esperada (concurrencia optimista)"""
+
+
+class Message:
+    """Un turno de conversación (sin __dict__: ~3 veces menos memoria que un dict)"""
+
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: str, content: str, tokens: int = 0):
+        # Rol internado: todos los mensajes comparten los mismos objetos str
+        self.role = sys.intern(role)
+        self.content = content
+        self.tokens = tokens
+
+    def to_dict(self) -> Dict[str, str]:
+        """Formato de mensaje de la API de chat"""
+        return {"role": self.role, "content": self.content}
+
+    def __repr__(self) -> str:
+        return f"Message({self.role!r}, {self.content[:40]!r}, tokens={self.tokens})"
+
+
+class Conversation:
+    """
+    Sesión de un usuario: turnos en un buffer circular con el total de tokens,
+    resumen acumulado, estado del adaptador, último acceso, versión en el
+    backend compartido (-1: la copia local está desfasada y se recarga) y
+    contadores del tracker (no se guardan: se reconstruyen de los turnos)
+    """
+
+    __slots__ = ("turns", "tokens", "summary", "state", "touched", "version", "tracked")
+
+    def __init__(self, capacity: int):
+        self.turns: deque = deque(maxlen=capacity)
+        self.tokens = 0
+        self.summary: Optional[str] = None
+        self.state: Optional[Dict[str, Any]] = None
+        self.touched = 0.0
+        self.version = 0
+        self.tracked = None
+
+    def to_record(self) -> Dict[str, Any]:
+        """Formato serializable (nivel frío y backends)"""
+        return {
+            "turns": [[turn.role, turn.content, turn.tokens] for turn in self.turns],
+            "summary": self.summary,
+            "state": self.state,
+            "version": self.version
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any], capacity: int) -> "Conversation":
+        conversation = cls(capacity)
+        for role, content, tokens in record.get("turns") or ():
+            conversation.turns.append(Message(role, content, tokens))
+        # Solo los que caben en el buffer (la capacidad pudo cambiar desde que se guardó)
+        conversation.tokens = sum(turn.tokens for turn in conversation.turns)
+        conversation.summary = record.get("summary")
+        conversation.state = record.get("state")
+        conversation.version = record.get("version") or 0
+        return conversation
+
+
+class ConversationStore:
+    """
+    Historial por usuario en buffers circulares de capacidad fija
+    (HISTORY_MAX_MESSAGES): añadir un turno es O(1) y nunca copia la lista.
+    El total de tokens se mantiene al añadir y expulsar, sin volver a sumar.
+
+    Es la única copia de cada sesión: ConversationMemory la usa para el
+    contexto del LLM y CarDealershipWhatsAppAgent para el estado, consultas y
+    resúmenes.
+
+    La memoria es una caché acotada: como mucho SESSION_MAX_RESIDENT sesiones
+    residentes, y las que llevan SESSION_IDLE_TTL segundos sin actividad salen
+    de memoria (LRU). Una sesión expulsada se guarda comprimida en el nivel
+    frío (ColdSessionTier) y se rehidrata sin que se note con el siguiente
+    mensaje; si no está allí, se restaura del backend persistente
+    (SQLiteSessionBackend), que recibe cada cambio con escritura diferida.
+
+    Con un backend compartido entre nodos (RedisSessionBackend, shared=True)
+    la memoria solo es válida mientras coincide la versión: cada acceso la
+    compara con la del backend y recarga la sesión si otro nodo la cambió.
+    En ese caso no se usa el nivel frío, que es local a cada nodo.
+
+    Dos niveles de lock: el de cada usuario serializa sus operaciones
+    (incluida la E/S con el backend y el nivel frío, en el orden de la
+    memoria) y el global solo protege el diccionario de sesiones y los
+    campos de cada una durante lecturas y cambios en memoria. Un viaje a
+    Redis o una rehidratación de un usuario no frena a los demás. Una
+    sesión con una operación en curso nunca se expulsa.
+
+    Con un tracker (TopicTracker) cada sesión lleva contadores que se
+    actualizan al añadir y expulsar turnos; `tracked` los lee sin recorrer
+    el historial.
+    """
+
+    def __init__(self, capacity: Optional[int] = None, backend=None, cold_tier=None,
+                 max_resident: Optional[int] = None, idle_ttl: Optional[float] = None,
+                 metrics=None, clock=time.monotonic, tracker=None):
+        if capacity is None:
+            capacity = int(os.getenv('HISTORY_MAX_MESSAGES', '50'))
+        if max_resident is None:
+            max_resident = int(os.getenv('SESSION_MAX_RESIDENT', '10000'))
+        if idle_ttl is None:
+            idle_ttl = float(os.getenv('SESSION_IDLE_TTL', '3600'))
+        self.capacity = max(1, capacity)
+        self.max_resident = max(1, max_resident)
+        self.idle_ttl = idle_ttl
+        self.backend = backend
+        self.cold_tier = cold_tier
+        self.tracker = tracker
+        self.metrics = metrics or default_metrics
+        self._clock = clock
+        # Orden LRU: cada acceso mueve la sesión al final, así que las más inactivas están al principio
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._user_locks = tuple(threading.Lock() for _ in range(LOCK_STRIPES))
+        self._stats = {"evicted_lru": 0, "evicted_idle": 0, "rehydrated": 0, "rehydrated_cold": 0,
+                       "reloaded_stale": 0, "conflicts": 0}
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        return self._user_locks[hash(user_id) % LOCK_STRIPES]
+
+    def _session(self, user_id: str, create: bool, validate: bool = True) -> Optional[Conversation]:
+        """
+        Sesión residente (marcada como usada) o rehidratada del nivel frío o
+        del backend; con create=True se crea vacía si no existe. Se llama con
+        el lock del usuario tomado (dos mensajes simultáneos nunca rehidratan
+        dos copias) y sin el global: la E/S se hace fuera de él.
+        validate=False omite la comprobación de versión cuando la escritura
+        posterior ya la hace (WATCH).
+        """
+        now = self._clock()
+        shared = self.backend is not None and self.backend.shared
+        evicted = None
+        with self._lock:
+            conversation = self._conversations.get(user_id)
+            if conversation is not None:
+                self._conversations.move_to_end(user_id)
+                conversation.touched = now
+                if not (shared and (validate or conversation.version < 0)):
+                    evicted = self._evict(now)
+        if evicted is not None:
+            self._store_evicted(evicted)
+            return conversation
+        if conversation is not None and self.backend.version(user_id) != conversation.version:
+            with self._lock:
+                # Nadie más la quita mientras tenemos el lock del usuario (la expulsión lo respeta)
+                del self._conversations[user_id]
+                self._stats["reloaded_stale"] += 1
+            conversation = None
+
+        if conversation is None:
+            start = time.perf_counter()
+            record = self.cold_tier.take(user_id) if self.cold_tier is not None and not shared else None
+            from_cold = record is not None
+            if record is None and self.backend is not None:
+                record = self.backend.load_session(user_id, self.capacity)
+            if record is None and not create:
+                return None
+            if record is not None:
+                conversation = Conversation.from_record(record, self.capacity)
+                self.metrics.observe_latency("session.rehydrate", time.perf_counter() - start)
+            else:
+                conversation = Conversation(self.capacity)
+            conversation.touched = now
+            with self._lock:
+                self._conversations[user_id] = conversation
+                if record is not None:
+                    self._stats["rehydrated"] += 1
+                    self._stats["rehydrated_cold"] += from_cold
+
+        with self._lock:
+            evicted = self._evict(now)
+        self._store_evicted(evicted)
+        return conversation
+
+    def _evict(self, now: float) -> List[Tuple[str, Conversation, threading.Lock]]:
+        """
+        Saca de memoria las sesiones inactivas y las que exceden el máximo
+        residente, empezando por las menos usadas. Se llama con el lock global
+        tomado; las sesiones cuyo lock de usuario está ocupado (operación en
+        curso) se saltan. Devuelve las expulsadas con su lock de usuario tomado.
+        """
+        limit = now - self.idle_ttl
+        excess = len(self._conversations) - self.max_resident
+        if excess <= 0 and (not self._conversations
+                            or next(iter(self._conversations.values())).touched >= limit):
+            return []
+        evicted = []
+        for user_id, conversation in self._conversations.items():
+            if excess <= 0 and conversation.touched >= limit:
+                break
+            user_lock = self._user_lock(user_id)
+            if not user_lock.acquire(blocking=False):
+                continue
+            reason = "evicted_lru" if excess > 0 else "evicted_idle"
+            evicted.append((user_id, conversation, user_lock, reason))
+            excess -= 1
+        for user_id, _, _, reason in evicted:
+            del self._conversations[user_id]
+            self._stats[reason] += 1
+            self.metrics.increment(f"session.{reason}")
+        return [(user_id, conversation, user_lock) for user_id, conversation, user_lock, _ in evicted]
+
+    def _store_evicted(self, evicted: List[Tuple[str, Conversation, threading.Lock]]):
+        """
+        Guarda las sesiones expulsadas en el nivel frío (serializar, comprimir
+        y escribir, sin el lock global) y libera sus locks de usuario: un
+        mensaje de ese usuario espera a que el fichero esté escrito antes de
+        rehidratarlo
+        """
+        keep_cold = self.cold_tier is not None and not (self.backend is not None and self.backend.shared)
+        for user_id, conversation, user_lock in evicted:
+            try:
+                if keep_cold:
+                    self.cold_tier.write(user_id, conversation.to_record())
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar la sesión fría de {user_id}: {e}")
+            finally:
+                user_lock.release()
+
+    @staticmethod
+    def _written(conversation: Conversation, version: Optional[int]):
+        """
+        Registra la versión devuelta por un backend compartido: si no es la
+        siguiente a la local, otro nodo escribió entre medias y la copia se
+        recargará en el próximo acceso
+        """
+        if version is not None:
+            conversation.version = version if version == conversation.version + 1 else -1
+
+    def append(self, user_id: str, role: str, content: str, tokens: int = 0,
+               token_budget: Optional[int] = None, min_recent: int = 0) -> List[Message]:
+        """
+        Añade un turno y devuelve los expulsados (los más antiguos): por
+        capacidad del buffer o, con token_budget, hasta volver al presupuesto
+        conservando al menos min_recent turnos
+        """
+        message = Message(role, content, tokens)
+        evicted: List[Message] = []
+        # El análisis del mensaje, fuera de los locks
+        detected = self.tracker.detect(content) if self.tracker is not None else None
+        with self._user_lock(user_id):
+            conversation = self._session(user_id, create=True)
+            with self._lock:
+                turns = conversation.turns
+                if len(turns) == self.capacity:
+                    evicted.append(turns.popleft())
+                    conversation.tokens -= evicted[-1].tokens
+                turns.append(message)
+                conversation.tokens += tokens
+                if token_budget is not None:
+                    while conversation.tokens > token_budget and len(turns) > min_recent:
+                        oldest = turns.popleft()
+                        conversation.tokens -= oldest.tokens
+                        evicted.append(oldest)
+                if self.tracker is not None:
+                    if conversation.tracked is None:
+                        conversation.tracked = self.tracker.start(turns)
+                    else:
+                        self.tracker.add(conversation.tracked, message.role, detected, evicted, len(turns))
+            if self.backend is not None:
+                # Con el lock del usuario para que el orden en el backend sea el de la memoria
+                version = self.backend.append_message(user_id, message.role, content, tokens,
+                                                      evicted=len(evicted))
+                with self._lock:
+                    self._written(conversation, version)
+        return evicted
+
+    def messages(self, user_id: str) -> List[Message]:
+        """Copia de los turnos del usuario, del más antiguo al más reciente"""
+        with self._user_lock(user_id):
+            conversation = self._session(user_id, create=False)
+            if conversation is None:
+                return []
+            with self._lock:
+                return list(conversation.turns)
+
+    def summary(self, user_id: str) -> Optional[str]:
+        """Resumen acumulado de los turnos ya expulsados"""
+        with self._user_lock(user_id):
+            conversation = self._session(user_id, create=False)
+            return conversation.summary if conversation is not None else None
+
+    def set_summary(self, user_id: str, summary: str) -> bool:
+        """Guarda el resumen; False si el usuario ya no existe (se reinició la sesión)"""
+        with self._user_lock(user_id):
+            conversation = self._session(user_id, create=False)
+            if conversation is None:
+                return False
+            with self._lock:
+                conversation.summary = summary
+            if self.backend is not None:
+                version = self.backend.save_summary(user_id, summary)
+                with self._lock:
+                    self._written(conversation, version)
+            return True
+
+    def get_state(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Estado del adaptador de WhatsApp para el usuario (el mismo objeto, no una copia)"""
+        with self._user_lock(user_id):
+            conversation = self._session(user_id, create=False)
+            return conversation.state if conversation is not None else None
+
+    def set_state(self, user_id: str, state: Dict[str, Any]):
+        """Reemplaza el estado del usuario"""
+        with self._user_lock(user_id):
+            conversation = self._session(user_id, create=True)
+            with self._lock:
+                conversation.state = state
+            if self.backend is not None:
+                version = self.backend.save_state(user_id, state)
+                with self._lock:
+                    self._written(conversation, version)
+
+    def update_state(self, user_id: str, updates: Dict[str, Any], attempts: int = 5) -> Dict[str, Any]:
+        """
+        Aplica `updates` sobre el estado actual. Con un backend compartido la
+        escritura solo se acepta si nadie cambió la sesión desde la versión
+        leída (WATCH); si hubo conflicto se recarga la sesión y se reintenta.
+        """
+        with self._user_lock(user_id):
+            for _ in range(attempts):
+                conversation = self._session(user_id, create=True, validate=False)
+                with self._lock:
+                    state = dict(conversation.state or {})
+                    expected_version = conversation.version
+                state.update(updates)
+                try:
+                    if self.backend is not None:
+                        version = self.backend.save_state(user_id, state, expected_version=expected_version)
+                        with self._lock:
+                            self._written(conversation, version)
+                except SessionConflict:
+                    with self._lock:
+                        self._stats["conflicts"] += 1
+                        conversation.version = -1
+                    self.metrics.increment("session.conflicts")
+                    continue
+                with self._lock:
+                    conversation.state = state
+                return state
+        raise SessionConflict(f"No se pudo actualizar el estado de {user_id} tras {attempts} intentos")
+
+    def clear(self, user_id: str):
+        """Elimina la sesión del usuario (historial, resumen y estado) en todos los niveles"""
+        with self._user_lock(user_id):
+            with self._lock:
+                self._conversations.pop(user_id, None)
+            if self.cold_tier is not None:
+                self.cold_tier.discard(user_id)
+            if self.backend is not None:
+                self.backend.clear_session(user_id)
+
+    def _tracked(self, conversation: Conversation):
+        if conversation.tracked is None:
+            conversation.tracked = self.tracker.start(conversation.turns)
+        return conversation.tracked
+
+    def tracked(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Informe del tracker para el usuario (None sin tracker o sin sesión)"""
+        if self.tracker is None:
+            return None
+        with self._user_lock(user_id):
+            conversation = self._session(user_id, create=False)
+            if conversation is None:
+                return None
+            with self._lock:
+                return self.tracker.report(self._tracked(conversation))
+
+    def tracked_sessions(self) -> Dict[str, Dict[str, Any]]:
+        """Informes de las sesiones residentes, sin alterar el orden LRU ni rehidratar"""
+        if self.tracker is None:
+            return {}
+        with self._lock:
+            return {user_id: self.tracker.report(self._tracked(conversation))
+                    for user_id, conversation in self._conversations.items()}
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._conversations
+
+    def message_count(self, user_id: str) -> int:
+        with self._user_lock(user_id):
+            conversation = self._session(user_id, create=False)
+            return len(conversation.turns) if conversation is not None else 0
+
+    def user_count(self) -> int:
+        """Sesiones residentes en memoria (usuarios activos recientemente)"""
+        return len(self._conversations)
+
+    def users(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._conversations))
+
+    def stats(self) -> Dict[str, Any]:
+        """Sesiones residentes, mensajes, expulsiones y rehidrataciones (para /status)"""
+        with self._lock:
+            messages = sum(len(conversation.turns) for conversation in self._conversations.values())
+            stats = {
+                "resident": len(self._conversations),
+                "max_resident": self.max_resident,
+                "idle_ttl_s": self.idle_ttl,
+                "messages": messages,
+                "capacity_per_user": self.capacity
+            }
+            stats.update(self._stats)
+        rehydrate_p50 = self.metrics.latency_percentile("session.rehydrate", 50)
+        rehydrate_p99 = self.metrics.latency_percentile("session.rehydrate", 99)
+        stats["rehydrate_ms_p50"] = round(rehydrate_p50 * 1000, 3) if rehydrate_p50 is not None else None
+        stats["rehydrate_ms_p99"] = round(rehydrate_p99 * 1000, 3) if rehydrate_p99 is not None else None
+        if self.backend is not None:
+            stats["persistence"] = self.backend.stats()
+        return stats
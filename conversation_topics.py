@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Temas y marcas de cada conversación mantenidos de forma incremental: cada
+mensaje se analiza una sola vez al añadirse y los contadores de la ventana
+de mensajes recientes se actualizan al entrar y salir mensajes. El resumen
+de un usuario (o de todos los activos, para /status) es una lectura O(1).
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from keyword_matcher import KeywordMatcher
+from vehicle_catalog import VehicleCatalog, get_catalog
+
+# Mensajes recientes que cuentan para los temas del resumen
+SUMMARY_WINDOW = 10
+# Palabras de cada tema; las marcas del catálogo cuentan como "car_search"
+TOPIC_WORDS = {
+    "appointment": ("cita", "agendar", "appointment", "schedule", "scheduled", "test drive"),
+    "pricing": ("precio", "financiamiento", "price", "financing", "cuesta"),
+}
+# En el orden en que aparecen en el resumen
+TOPIC_LABELS = {
+    "car_search": "búsqueda de autos",
+    "appointment": "appointment",
+    "pricing": "pricing/financing",
+}
+
+# (temas, marcas) detectados en un mensaje
+Detected = Tuple[Tuple[str, ...], Tuple[str, ...]]
+NOTHING_DETECTED: Detected = ((), ())
+
+
+class TopicCounts:
+    """
+    Contadores de una sesión: mensajes y mensajes del usuario en el
+    historial, y cuántos de los últimos SUMMARY_WINDOW mensajes tocan cada
+    tema y mencionan cada marca
+    """
+
+    __slots__ = ("messages", "user_messages", "window", "topics", "brands")
+
+    def __init__(self, window: int):
+        self.messages = 0
+        self.user_messages = 0
+        self.window: deque = deque(maxlen=window)
+        self.topics: Dict[str, int] = {}
+        self.brands: Dict[str, int] = {}
+
+    def topic_names(self) -> List[str]:
+        return [label for topic, label in TOPIC_LABELS.items() if self.topics.get(topic)]
+
+    def summary(self) -> str:
+        topics = self.topic_names()
+        return (f"Conversation: {self.messages} messages ({self.user_messages} from user). "
+                f"Topics: {', '.join(topics) if topics else 'general conversation'}.")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "user_messages": self.user_messages,
+            "topics": self.topic_names(),
+            "brands": dict(self.brands),
+            "summary": self.summary()
+        }
+
+
+def _count(counter: Dict[str, int], keys: Iterable[str], delta: int):
+    for key in keys:
+        value = counter.get(key, 0) + delta
+        if value:
+            counter[key] = value
+        else:
+            del counter[key]
+
+
+class TopicTracker:
+    """
+    Seguimiento de temas para ConversationStore: `detect` analiza un mensaje
+    (fuera del lock del almacén), `add` aplica el mensaje nuevo y los
+    expulsados a los contadores, `start` los reconstruye a partir de los
+    turnos de una sesión rehidratada y `report` los copia para leerlos. El
+    matcher de marcas se compila una vez por versión del inventario.
+    """
+
+    def __init__(self, window: int = SUMMARY_WINDOW):
+        self.window = max(1, window)
+        self._lock = threading.Lock()
+        self._compiled: Tuple[Optional[str], Optional[KeywordMatcher]] = (None, None)
+
+    def matcher(self, catalog: Optional[VehicleCatalog] = None) -> KeywordMatcher:
+        catalog = catalog or get_catalog()
+        version, matcher = self._compiled
+        if version != catalog.version or matcher is None:
+            with self._lock:
+                brands = sorted({car["brand"] for car in catalog})
+                matcher = KeywordMatcher(
+                    [(brand, ("brand", brand)) for brand in brands] +
+                    [(word, ("topic", topic)) for topic, words in TOPIC_WORDS.items() for word in words]
+                )
+                self._compiled = (catalog.version, matcher)
+        return matcher
+
+    def detect(self, content: str) -> Detected:
+        topics, brands = set(), []
+        for kind, value in self.matcher().values(content):
+            if kind == "brand":
+                brands.append(value)
+            else:
+                topics.add(value)
+        if brands:
+            topics.add("car_search")
+        if not topics:
+            return NOTHING_DETECTED
+        return tuple(sorted(topics)), tuple(sorted(brands))
+
+    def start(self, turns: Iterable[Any]) -> TopicCounts:
+        """Contadores de los turnos existentes (objetos con role y content)"""
+        counts = TopicCounts(self.window)
+        turns = list(turns)
+        counts.messages = len(turns)
+        counts.user_messages = sum(turn.role == "user" for turn in turns)
+        for turn in turns[-self.window:]:
+            self._enter(counts, self.detect(turn.content))
+        return counts
+
+    def add(self, counts: TopicCounts, role: str, detected: Detected,
+            evicted: Iterable[Any], retained: int):
+        """Mensaje nuevo de `role` y turnos expulsados; `retained` es el tamaño del historial resultante"""
+        counts.user_messages += role == "user"
+        for turn in evicted:
+            counts.user_messages -= turn.role == "user"
+        counts.messages = retained
+        if len(counts.window) == counts.window.maxlen:
+            self._leave(counts)
+        self._enter(counts, detected)
+        # Con presupuesto de tokens el historial puede quedar por debajo de la ventana
+        while len(counts.window) > retained:
+            self._leave(counts)
+
+    @staticmethod
+    def report(counts: TopicCounts) -> Dict[str, Any]:
+        """Copia de los contadores (se llama con el lock del almacén tomado)"""
+        return counts.to_dict()
+
+    @staticmethod
+    def _enter(counts: TopicCounts, detected: Detected):
+        counts.window.append(detected)
+        _count(counts.topics, detected[0], 1)
+        _count(counts.brands, detected[1], 1)
+
+    @staticmethod
+    def _leave(counts: TopicCounts):
+        topics, brands = counts.window.popleft()
+        _count(counts.topics, topics, -1)
+        _count(counts.brands, brands, -1)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Búsqueda de texto completo (BM25) sobre características, modelo, motor y tracción
+"""
+
+import heapq
+import math
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Any, Optional, List, Tuple, Mapping, Sequence, Iterable, AbstractSet
+
+from inventory_columns import top_k_positions
+
+try:
+    import numpy as np
+except ImportError:  # Sin NumPy las puntuaciones se suman con diccionarios
+    np = None
+
+# Campos indexados; "model" puntúa pero no basta por sí solo para tratar un mensaje como pregunta de equipamiento
+INDEXED_FIELDS = ("features", "model", "engine", "drivetrain")
+EQUIPMENT_FIELDS = ("features", "engine", "drivetrain")
+
+# Palabras sin valor para la búsqueda (inglés y español)
+STOPWORDS = frozenset("""
+a an and any anything are at be can car cars could do does for from get got have has i in is it me
+my of on one or please show some something that the them there these this those to vehicle vehicles
+want we what which who with would you your looking need like tell about also come comes model models
+un una unos unas el la los las de del con y o que cual cuales tiene tienen tienes hay algun alguno
+alguna algo coche coches vehiculo vehiculos quiero busco para por en me mi
+""".split())
+
+# Frases equivalentes (en tokens) → término añadido al documento y a la consulta
+FEATURE_ALIASES = (
+    ("all wheel drive", "awd"), ("four wheel drive", "awd"), ("4x4", "awd"), ("4wd", "awd"),
+    ("xdrive", "awd"), ("quattro", "awd"), ("4matic", "awd"), ("4motion", "awd"),
+    ("rear wheel drive", "rwd"), ("front wheel drive", "fwd"),
+    ("sat nav", "navigation"), ("satnav", "navigation"), ("gps", "navigation"),
+    ("stereo", "sound"), ("audio", "sound"), ("speakers", "sound"),
+    ("sunroof", "roof"), ("moonroof", "roof"),
+)
+_ALIAS_PHRASES = tuple((f" {phrase} ", alias) for phrase, alias in FEATURE_ALIASES)
+
+_TOKEN = re.compile(r"[^\W_]+")
+_SUFFIXES = ("ing", "ers", "er", "ed", "es", "s")
+
+
+def _fold(text: str) -> str:
+    """Minúsculas y sin tildes ("León" → "leon")"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _stem(word: str) -> str:
+    """Sufijos ingleses frecuentes: "charging" y "charger" → "charg", "seats" → "seat" """
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4 and not word.endswith("ss"):
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Términos de un texto (con repeticiones) más los alias de FEATURE_ALIASES que aparezcan"""
+    words = _TOKEN.findall(_fold(text))
+    joined = f" {' '.join(words)} "
+    words.extend(alias for phrase, alias in _ALIAS_PHRASES if phrase in joined)
+    return [_stem(word) for word in words if word not in STOPWORDS]
+
+
+@lru_cache(maxsize=16384)
+def _document_terms(text: str) -> Tuple[str, ...]:
+    """tokenize para textos del inventario, que se repiten mucho entre vehículos"""
+    return tuple(tokenize(text))
+
+
+class FeatureIndex:
+    """
+    Índice invertido término → {posición: peso BM25}. Los pesos se calculan al
+    construir la instantánea, así que una consulta solo suma los pesos de sus
+    términos (unas pocas listas de postings) sin recorrer el inventario.
+    """
+
+    def __init__(self, vehicles: Sequence[Mapping[str, Any]], k1: float = 1.2, b: float = 0.75,
+                 excluded_terms: Iterable[str] = ()):
+        self.size = len(vehicles)
+        frequencies: Dict[str, Dict[int, int]] = {}
+        lengths: List[int] = []
+        self._equipment_terms = set()
+        for position, vehicle in enumerate(vehicles):
+            length = 0
+            for field in INDEXED_FIELDS:
+                value = vehicle.get(field)
+                texts = value if isinstance(value, (list, tuple)) else (value,)
+                for text in texts:
+                    if not text:
+                        continue
+                    terms = _document_terms(str(text))
+                    length += len(terms)
+                    for term in terms:
+                        postings = frequencies.setdefault(term, {})
+                        postings[position] = postings.get(position, 0) + 1
+                    if field in EQUIPMENT_FIELDS:
+                        self._equipment_terms.update(terms)
+            lengths.append(length)
+
+        average = (sum(lengths) / len(lengths)) if lengths else 0.0
+        # Normalización por longitud de cada documento, común a todos sus términos
+        norms = [k1 * (1 - b + b * length / average) if average else k1 for length in lengths]
+        self._postings: Dict[str, Dict[int, float]] = {}
+        for term, postings in frequencies.items():
+            df = len(postings)
+            idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            scale = idf * (k1 + 1)
+            self._postings[term] = {position: scale * tf / (tf + norms[position])
+                                    for position, tf in postings.items()}
+
+        # Copia en arrays para sumar puntuaciones de forma vectorizada en inventarios grandes
+        self._arrays: Optional[Dict[str, Tuple[Any, Any]]] = None
+        if np is not None:
+            self._arrays = {
+                term: (np.fromiter(weights.keys(), dtype=np.int64, count=len(weights)),
+                       np.fromiter(weights.values(), dtype=np.float64, count=len(weights)))
+                for term, weights in self._postings.items()
+            }
+
+        # Marcas y demás términos que ya filtra otro índice no cuentan como equipamiento
+        self._excluded = frozenset(_stem(_fold(term)) for term in excluded_terms)
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def query_terms(self, text: str) -> List[str]:
+        """Términos de la consulta presentes en el índice, sin repetir (sin marcas)"""
+        return [term for term in dict.fromkeys(tokenize(text))
+                if term in self._postings and term not in self._excluded]
+
+    def distinctive_terms(self, text: str) -> List[str]:
+        """
+        Términos de equipamiento que distinguen vehículos: aparecen en
+        características, motor o tracción, no en todo el inventario y no son
+        solo un número ("3" de "Serie 3")
+        """
+        return [term for term in self.query_terms(text)
+                if term in self._equipment_terms and not term.isdigit()
+                and len(self._postings[term]) < max(2, self.size)]
+
+    def is_feature_query(self, text: str, min_coverage: float = 0.5) -> bool:
+        """
+        True si el texto pregunta por equipamiento: algún término distintivo y
+        al menos la mitad de las palabras con contenido presentes en el índice
+        """
+        terms = list(dict.fromkeys(tokenize(text)))
+        if not terms:
+            return False
+        found = [term for term in terms if term in self._postings]
+        if len(found) < min_coverage * len(terms):
+            return False
+        return bool(self.distinctive_terms(text))
+
+    def search(self, text: str, positions: Optional[AbstractSet[int]] = None,
+               limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Vehículos con algún término distintivo, puntuados con BM25 sobre todos
+        los términos de la consulta. (posición, puntuación) de mayor a menor;
+        a igual puntuación, en el orden del inventario.
+        """
+        distinctive = self.distinctive_terms(text)
+        if not distinctive:
+            return []
+        if self._arrays is not None:
+            return self._search_arrays(distinctive, self.query_terms(text), positions, limit)
+
+        candidates = set()
+        for term in distinctive:
+            candidates.update(self._postings[term])
+        if positions is not None:
+            candidates &= positions
+        if not candidates:
+            return []
+
+        scores = dict.fromkeys(candidates, 0.0)
+        for term in self.query_terms(text):
+            for position, weight in self._postings[term].items():
+                if position in scores:
+                    scores[position] += weight
+        ranked = ((-score, position) for position, score in scores.items())
+        if limit is not None and limit < len(scores):
+            ordered = heapq.nsmallest(limit, ranked)
+        else:
+            ordered = sorted(ranked)
+        return [(position, -score) for score, position in ordered]
+
+    def _search_arrays(self, distinctive: List[str], terms: List[str],
+                       positions: Optional[AbstractSet[int]], limit: Optional[int]) -> List[Tuple[int, float]]:
+        """Mismo resultado que search con NumPy: máscara de candidatos, suma de pesos y top-k"""
+        candidate = np.zeros(self.size, dtype=bool)
+        for term in distinctive:
+            candidate[self._arrays[term][0]] = True
+        if positions is not None:
+            allowed = np.zeros(self.size, dtype=bool)
+            allowed[np.fromiter(positions, dtype=np.int64, count=len(positions))] = True
+            candidate &= allowed
+        hits = np.flatnonzero(candidate)
+        if not len(hits):
+            return []
+
+        scores = np.zeros(self.size, dtype=np.float64)
+        for term in terms:
+            found, weights = self._arrays[term]
+            scores[found] += weights
+        keys = -scores[hits]
+        ranked = top_k_positions(keys, limit)
+        return list(zip(hits[ranked].tolist(), (-keys[ranked]).tolist()))
+
+
+def matched_features(vehicle: Mapping[str, Any], terms: Iterable[str]) -> List[str]:
+    """Características, motor o tracción del vehículo que contienen alguno de los términos"""
+    wanted = set(terms)
+    matched = []
+    for field in EQUIPMENT_FIELDS:
+        value = vehicle.get(field)
+        for text in (value if isinstance(value, (list, tuple)) else (value,)):
+            # "quattro all-wheel drive" puede estar en características y en tracción
+            if text and str(text) not in matched and wanted.intersection(_document_terms(str(text))):
+                matched.append(str(text))
+    return matched
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Enrutado determinista de botones y filas de listas de WhatsApp. El id de un
+botón ya dice exactamente qué quiere el cliente, así que se resuelve con una
+tabla de despacho directa a las herramientas y al catálogo, sin clasificar la
+intención ni llamar a OpenAI.
+"""
+
+import time
+from typing import Dict, Optional, Callable, Tuple
+
+from agent_metrics import metrics as default_metrics
+from agent_result import AgentResult, Attachment
+from vehicle_catalog import get_catalog
+
+# Filas de listas que llevan un vehículo: "vehicle:BMW_X3_2023_BLU"
+VEHICLE_ROW_PREFIX = "vehicle:"
+# Fila "next page" de un listado: "inventory_page:2:<consulta sin la página>"
+INVENTORY_PAGE_PREFIX = "inventory_page:"
+
+# Tipo de coche del menú de búsqueda → consulta local del inventario
+CAR_TYPE_QUERIES = {
+    "economic": "cheapest cars",
+    "family": "suv",
+    "luxury": "most expensive cars",
+}
+
+# Botones de cita → detalle que recibe schedule_appointment
+APPOINTMENT_DETAILS = {
+    "schedule_test": "test drive",
+    "test_drive": "test drive",
+    "consultation": "consultation",
+    "inspection": "inspection",
+}
+
+# (usuario, argumento del id) → resultado, o None si el id no es válido
+Handler = Callable[[str, str], Optional[AgentResult]]
+
+
+class InteractiveRouter:
+    """
+    Tabla id → (ruta, función). Los ids exactos se buscan en un dict y los
+    que llevan un argumento (vehículo, tipo de coche) por prefijo. Cada ruta
+    registra su latencia en las métricas como interactive.<ruta>.
+    """
+
+    def __init__(self, agent, metrics=None):
+        self.agent = agent
+        self.metrics = metrics or default_metrics
+        self.routes: Dict[str, Tuple[str, Handler]] = {
+            "see_details": ("see_details", self._see_details),
+            "see_all_cars": ("inventory", self._inventory),
+            "compare_cars": ("compare", self._compare),
+        }
+        for button_id in APPOINTMENT_DETAILS:
+            self.routes[button_id] = ("appointment", self._appointment)
+        self.prefixes: Tuple[Tuple[str, str, Handler], ...] = (
+            (VEHICLE_ROW_PREFIX, "vehicle_details", self._vehicle_details),
+            (INVENTORY_PAGE_PREFIX, "inventory_page", self._inventory_page),
+            ("car_type_", "car_type", self._car_type),
+        )
+
+    def resolve(self, interactive_id: str) -> Optional[Tuple[str, Handler, str]]:
+        """(ruta, función, argumento) del id, o None si no está en la tabla"""
+        route = self.routes.get(interactive_id)
+        if route is not None:
+            return route[0], route[1], interactive_id
+        for prefix, name, handler in self.prefixes:
+            if interactive_id.startswith(prefix):
+                return name, handler, interactive_id[len(prefix):]
+        return None
+
+    def dispatch(self, user_id: str, interactive_id: str, title: str) -> Optional[AgentResult]:
+        """
+        Resuelve el botón o la fila y guarda el turno en el historial (el
+        título pulsado como mensaje del usuario). None si el id no tiene ruta
+        y hay que tratarlo como texto libre.
+        """
+        resolved = self.resolve(interactive_id)
+        if resolved is None:
+            self.metrics.increment("interactive.unrouted")
+            return None
+        name, handler, argument = resolved
+        started = time.perf_counter()
+        result = handler(user_id, argument)
+        if result is None:
+            self.metrics.increment("interactive.unrouted")
+            return None
+        result.timings["route"] = time.perf_counter() - started
+        self.agent.add_to_history(user_id, "user", title or interactive_id)
+        self.agent.add_to_history(user_id, "assistant", result.text, tool_name=result.tool_name)
+        self.agent.focus_vehicle(user_id, result.vehicle_id)
+        elapsed = time.perf_counter() - started
+        result.timings["total"] = elapsed
+        self.metrics.increment(f"interactive.routes.{name}")
+        self.metrics.observe_latency(f"interactive.{name}", elapsed)
+        return result
+
+    def _vehicle_details(self, _: str, vehicle_id: str) -> AgentResult:
+        # Una fila de una versión antigua del inventario puede nombrar un vehículo vendido
+        found = get_catalog().get(vehicle_id) is not None
+        text, image = self.agent.vehicle_details(vehicle_id)
+        result = AgentResult(text, "VEHICLE_DETAILS", "Vehicle details card" if found else None,
+                             vehicle_id=vehicle_id if found else None)
+        if image:
+            result.attachments.append(Attachment("image", image, vehicle_id))
+        return result
+
+    def _see_details(self, user_id: str, argument: str) -> AgentResult:
+        # "Ver detalles" tras una respuesta: la ficha del vehículo en foco, o el listado si no hay ninguno
+        vehicle_id = self.agent.focused_vehicle(user_id)
+        if vehicle_id and get_catalog().get(vehicle_id) is not None:
+            return self._vehicle_details(user_id, vehicle_id)
+        return self._inventory(user_id, argument)
+
+    def _car_type(self, _: str, car_type: str) -> Optional[AgentResult]:
+        query = CAR_TYPE_QUERIES.get(car_type)
+        if query is None:
+            return None
+        return self.agent.inventory_result(query)
+
+    def _inventory(self, *_: str) -> AgentResult:
+        return self.agent.inventory_result("")
+
+    def _inventory_page(self, _: str, argument: str) -> Optional[AgentResult]:
+        page, _, query = argument.partition(":")
+        if not page.isdigit():
+            return None
+        return self.agent.inventory_result(f"{query} page {page}".strip())
+
+    def _compare(self, *_: str) -> AgentResult:
+        return AgentResult(self.agent.compare_vehicles(), "SEARCH_INVENTORY", "Inventory search results")
+
+    def _appointment(self, _: str, button_id: str) -> AgentResult:
+        return AgentResult(self.agent.schedule_appointment(APPOINTMENT_DETAILS[button_id]), "SCHEDULE_APPOINTMENT")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Almacén columnar del inventario (NumPy) para filtrar y ordenar de forma vectorizada
+"""
+
+from typing import Dict, Any, Optional, List, Tuple, Mapping, Iterable, Sequence, Callable
+
+try:
+    import numpy as np
+except ImportError:  # Sin NumPy el catálogo usa sus índices en Python puro
+    np = None
+
+
+def top_k_positions(keys: "np.ndarray", k: Optional[int]) -> "np.ndarray":
+    """
+    Índices de las k claves menores en orden ascendente (todas si k es None
+    o no es menor que el tamaño). argpartition da el valor de corte, así que
+    solo se ordenan las k elegidas; los empates, también en el corte, se
+    resuelven por índice.
+    """
+    count = len(keys)
+    if k is not None and k <= 0:
+        return np.arange(0)
+    if k is not None and k < count:
+        kth = keys[np.argpartition(keys, k - 1)[k - 1]]
+        below = np.flatnonzero(keys < kth)
+        ties = np.flatnonzero(keys == kth)[:k - len(below)]
+        selected = np.concatenate((below, ties))
+    else:
+        selected = np.arange(count)
+    return selected[np.lexsort((selected, keys[selected]))]
+
+
+class ColumnarInventory:
+    """
+    Columnas numéricas como arrays float64 (NaN si falta el valor) y atributos
+    categóricos como códigos enteros. Todos los filtros de una búsqueda se
+    evalúan como una única máscara booleana y el top-k sale de argpartition.
+    """
+
+    available = np is not None
+
+    def __init__(self, numeric: Mapping[str, Sequence[Optional[float]]],
+                 categorical: Mapping[str, Sequence[Any]],
+                 terms: Callable[[Any], List[str]]):
+        if np is None:
+            raise RuntimeError("NumPy no está instalado")
+        self.size = len(next(iter(numeric.values()), ()))
+        self._numeric = {
+            field: np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            for field, values in numeric.items()
+        }
+
+        # Códigos por atributo y, para cada término del índice, los códigos que lo contienen
+        self._codes: Dict[str, Any] = {}
+        self._term_codes: Dict[str, Dict[str, Any]] = {}
+        for field, values in categorical.items():
+            vocabulary: Dict[Any, int] = {}
+            codes = np.fromiter((vocabulary.setdefault(value, len(vocabulary)) for value in values),
+                                dtype=np.int32, count=len(values))
+            term_codes: Dict[str, List[int]] = {}
+            for value, code in vocabulary.items():
+                if value is None:
+                    continue
+                for term in terms(value):
+                    term_codes.setdefault(term, []).append(code)
+            self._codes[field] = codes
+            self._term_codes[field] = {term: np.array(found, dtype=np.int32) for term, found in term_codes.items()}
+
+    def mask(self, facets: Optional[Mapping[str, Iterable[str]]] = None,
+             ranges: Optional[Mapping[str, Any]] = None):
+        """Máscara booleana: OR dentro de cada atributo, AND entre atributos e intervalos"""
+        mask = np.ones(self.size, dtype=bool)
+        for field, values in (facets or {}).items():
+            term_codes = self._term_codes.get(field, {})
+            wanted = [term_codes[value.lower()] for value in values if value.lower() in term_codes]
+            if not wanted:
+                return np.zeros(self.size, dtype=bool)
+            mask &= np.isin(self._codes[field], np.concatenate(wanted))
+        for field, numeric_range in (ranges or {}).items():
+            column = self._numeric.get(field)
+            if column is None:
+                return np.zeros(self.size, dtype=bool)
+            # Las comparaciones con NaN son falsas: los vehículos sin dato quedan fuera
+            if numeric_range.minimum is not None:
+                mask &= (column >= numeric_range.minimum) if numeric_range.min_inclusive else (column > numeric_range.minimum)
+            if numeric_range.maximum is not None:
+                mask &= (column <= numeric_range.maximum) if numeric_range.max_inclusive else (column < numeric_range.maximum)
+        return mask
+
+    def search(self, facets: Optional[Mapping[str, Iterable[str]]] = None,
+               ranges: Optional[Mapping[str, Any]] = None,
+               sort: Optional[str] = None, descending: bool = False,
+               offset: int = 0, limit: Optional[int] = None) -> Tuple[int, List[int]]:
+        """(total de coincidencias, posiciones de la página pedida)"""
+        positions = np.flatnonzero(self.mask(facets, ranges))
+        total = len(positions)
+        stop = total if limit is None else min(total, offset + limit)
+        if offset >= stop:
+            return total, []
+        if sort not in self._numeric:
+            return total, positions[offset:stop].tolist()
+
+        keys = self._numeric[sort][positions]
+        if descending:
+            keys = -keys
+        # Sin dato al final; empates en el orden del inventario
+        keys = np.where(np.isnan(keys), np.inf, keys)
+        # `positions` está ordenado: desempatar por índice es desempatar por posición
+        ranked = top_k_positions(keys, stop)
+        return total, positions[ranked[offset:stop]].tolist()
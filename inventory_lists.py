@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Mensajes de lista de WhatsApp con los resultados del inventario. Cada fila
+lleva el id del vehículo ("vehicle:<id>"), así que la selección vuelve como un
+id estructurado y se resuelve sin OpenAI; si hay más resultados, una fila
+"next page" pide la página siguiente de la misma búsqueda.
+
+Las filas de todos los vehículos y las páginas del inventario completo se
+construyen una vez por versión del inventario; por petición solo se eligen.
+"""
+
+import threading
+from types import MappingProxyType
+from typing import Dict, Any, Optional, List, Mapping, Sequence, Tuple
+
+from interactive_routes import VEHICLE_ROW_PREFIX, INVENTORY_PAGE_PREFIX
+from vehicle_catalog import VehicleCatalog, add_catalog_listener, get_catalog
+
+# Límites de la API de WhatsApp para mensajes de lista
+MAX_LIST_ROWS = 10
+MAX_ROW_TITLE = 24
+MAX_ROW_DESCRIPTION = 72
+MAX_ROW_ID = 200
+MAX_SECTION_TITLE = 24
+
+LIST_HEADER = "🚗 Available vehicles"
+LIST_BUTTON = "View vehicles"
+
+
+def render_list_row(car: Mapping[str, Any]) -> Dict[str, str]:
+    """Fila de un vehículo: marca y modelo como título, año, precio, tipo y color como descripción"""
+    return {
+        "id": f"{VEHICLE_ROW_PREFIX}{car['id']}",
+        "title": f"{car['brand']} {car['model']}"[:MAX_ROW_TITLE],
+        "description": f"{car['year']} · {car['price']} · {car['type']} · {car['color']}"[:MAX_ROW_DESCRIPTION],
+    }
+
+
+def next_page_row(query: str, page: int, first: int, last: int, total: int) -> Dict[str, str]:
+    """Fila que pide la página `page` de la búsqueda `query`"""
+    prefix = f"{INVENTORY_PAGE_PREFIX}{page}:"
+    return {
+        "id": prefix + query[:MAX_ROW_ID - len(prefix)],
+        "title": "➡️ Next page",
+        "description": f"Vehicles {first}-{last} of {total}",
+    }
+
+
+class _ListSnapshot:
+    """Filas por vehículo y secciones del inventario completo de una versión"""
+
+    __slots__ = ("version", "rows", "browse_pages")
+
+    def __init__(self, catalog: VehicleCatalog, page_size: int):
+        self.version = catalog.version
+        self.rows: Mapping[str, Dict[str, str]] = MappingProxyType({car["id"]: render_list_row(car) for car in catalog})
+        # Sin filtros ("see all vehicles"): secciones completas, incluida la fila de la página siguiente
+        vehicles = list(catalog)
+        total = len(vehicles)
+        pages = []
+        for offset in range(0, total, page_size):
+            page = vehicles[offset:offset + page_size]
+            pages.append(self.sections(page, offset, total, page_size, ""))
+        self.browse_pages: Tuple[List[Dict[str, Any]], ...] = tuple(pages)
+
+    def sections(self, page: Sequence[Mapping[str, Any]], offset: int, total: int,
+                 page_size: int, query: str) -> List[Dict[str, Any]]:
+        number = offset // page_size + 1
+        pages = -(-total // page_size)
+        rows = [self.rows[car["id"]] for car in page[:MAX_LIST_ROWS - 1]]
+        sections = [{"title": f"Page {number} of {pages}"[:MAX_SECTION_TITLE], "rows": rows}]
+        shown_until = offset + len(page)
+        if shown_until < total:
+            following = next_page_row(query, number + 1, shown_until + 1,
+                                      min(total, shown_until + page_size), total)
+            sections.append({"title": "More results", "rows": [following]})
+        return sections
+
+
+class InventoryLists:
+    """
+    Constructor de mensajes de lista con las filas precalculadas de la
+    versión vigente del inventario. Con INVENTORY_PAGE_SIZE mayor que 9 la
+    lista muestra los 9 primeros vehículos de la página (WhatsApp admite 10
+    filas y una queda para la página siguiente).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots: Dict[int, _ListSnapshot] = {}
+
+    def _snapshot(self, catalog: VehicleCatalog, page_size: int) -> _ListSnapshot:
+        snapshot = self._snapshots.get(page_size)
+        if snapshot is not None and snapshot.version == catalog.version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshots.get(page_size)
+            if snapshot is None or snapshot.version != catalog.version:
+                snapshot = self._snapshots[page_size] = _ListSnapshot(catalog, page_size)
+            return snapshot
+
+    def list_message(self, page: Sequence[Mapping[str, Any]], offset: int, total: int,
+                     page_size: int, query: str, catalog: Optional[VehicleCatalog] = None) -> Optional[Dict[str, Any]]:
+        """
+        Mensaje de lista (cabecera, cuerpo, botón y secciones) de una página de
+        resultados, o None si la página está vacía
+        """
+        if not page:
+            return None
+        catalog = catalog or get_catalog()
+        snapshot = self._snapshot(catalog, page_size)
+        unfiltered = not query and total == len(catalog) and offset % page_size == 0
+        if unfiltered and offset // page_size < len(snapshot.browse_pages):
+            sections = snapshot.browse_pages[offset // page_size]
+        else:
+            sections = snapshot.sections(page, offset, total, page_size, query)
+        shown_until = offset + min(len(page), MAX_LIST_ROWS - 1)
+        return {
+            "header": LIST_HEADER,
+            "body": f"{offset + 1}-{shown_until} of {total} vehicles matching your search. "
+                    f"Tap one for the full details and photo.",
+            "button": LIST_BUTTON,
+            "sections": sections,
+        }
+
+    def invalidate(self):
+        """Descarta las filas de versiones anteriores (se llama al recargar el inventario)"""
+        with self._lock:
+            self._snapshots.clear()
+
+
+inventory_lists = InventoryLists()
+
+
+def _on_catalog_reload(previous: VehicleCatalog, catalog: VehicleCatalog):
+    inventory_lists.invalidate()
+
+
+add_catalog_listener(_on_catalog_reload)
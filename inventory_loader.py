@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Carga del inventario desde una fuente externa (JSON, CSV o SQLite) con recarga en caliente
+"""
+
+import csv
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, List
+
+from vehicle_catalog import VehicleCatalog, catalog_from_json, set_catalog, LIST_FIELDS
+
+# Las listas (LIST_FIELDS) llegan en las fuentes tabulares como "a|b|c" o como JSON
+INTEGER_FIELDS = ("year",)
+# Sin estos campos un vehículo no se puede identificar ni nombrar: se descarta al cargar
+REQUIRED_FIELDS = ("id", "brand", "model", "year")
+# Campos que fichas, listados y comparaciones leen directamente; una celda vacía se rellena
+DISPLAY_FIELDS = ("price", "color", "mileage", "type", "engine", "power", "transmission", "drivetrain",
+                  "consumption", "emissions", "dimensions", "trunk_capacity", "warranty")
+MISSING_VALUE = "N/A"
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+_sequence = itertools.count(1)
+
+
+def _source_fingerprint(path: str) -> str:
+    """Huella del contenido de la fuente (SQLite: mtime y tamaño de la base y su WAL)"""
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        parts = []
+        for candidate in (path, path + "-wal"):
+            if os.path.exists(candidate):
+                stat = os.stat(candidate)
+                parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+        return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte una fila CSV/SQLite al formato de vehículo del catálogo"""
+    vehicle = {key: value for key, value in row.items() if value not in (None, "")}
+    for field in LIST_FIELDS:
+        value = vehicle.get(field)
+        if isinstance(value, str):
+            if value.startswith("["):
+                vehicle[field] = json.loads(value)
+            else:
+                vehicle[field] = [item.strip() for item in value.split("|") if item.strip()]
+    for field in INTEGER_FIELDS:
+        if isinstance(vehicle.get(field), str) and vehicle[field].isdigit():
+            vehicle[field] = int(vehicle[field])
+    return vehicle
+
+
+def _validate(vehicles: List[Dict[str, Any]], path: str) -> List[Dict[str, Any]]:
+    """
+    Descarta los vehículos sin REQUIRED_FIELDS y rellena los campos de
+    presentación vacíos; ValueError si no queda ninguno (se mantiene el inventario actual)
+    """
+    valid = []
+    for number, vehicle in enumerate(vehicles, 1):
+        missing = [field for field in REQUIRED_FIELDS if vehicle.get(field) in (None, "")]
+        if missing:
+            print(f"⚠️ {path}: vehículo {number} descartado, faltan {', '.join(missing)}")
+            continue
+        vehicle = dict(vehicle)
+        for field in DISPLAY_FIELDS:
+            if vehicle.get(field) in (None, ""):
+                vehicle[field] = MISSING_VALUE
+        for field in LIST_FIELDS:
+            if not vehicle.get(field):
+                vehicle[field] = []
+        valid.append(vehicle)
+    if vehicles and not valid:
+        raise ValueError(f"Ningún vehículo válido en {path}")
+    return valid
+
+
+def _read_csv(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8", newline="") as f:
+        return [_normalize_row(row) for row in csv.DictReader(f)]
+
+
+def _read_sqlite(path: str, table: str = "vehicles") -> List[Dict[str, Any]]:
+    # Solo lectura: el proceso que mantiene el stock es el único que escribe
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        connection.row_factory = sqlite3.Row
+        rows = connection.execute(f"SELECT * FROM {table}").fetchall()
+        return [_normalize_row(dict(row)) for row in rows]
+    finally:
+        connection.close()
+
+
+def load_inventory(path: str, fingerprint: Optional[str] = None) -> VehicleCatalog:
+    """
+    Lee una fuente de inventario y devuelve una instantánea nueva con su versión.
+    El formato se deduce de la extensión: .json, .csv o .db/.sqlite/.sqlite3.
+    Los vehículos se validan igual en los tres (_validate).
+    """
+    fingerprint = fingerprint or _source_fingerprint(path)
+    version = f"{next(_sequence)}-{fingerprint[:10]}"
+    lower = path.lower()
+
+    if lower.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            data = {"vehicles": data}
+        return catalog_from_json(dict(data, vehicles=_validate(data["vehicles"], path)), version=version)
+    if lower.endswith(".csv"):
+        return VehicleCatalog(_validate(_read_csv(path), path), version=version)
+    if lower.endswith(SQLITE_EXTENSIONS):
+        return VehicleCatalog(_validate(_read_sqlite(path), path), version=version)
+    raise ValueError(f"Formato de inventario no soportado: {path}")
+
+
+class InventoryWatcher:
+    """
+    Vigila la fuente del inventario (sondeo de mtime) y publica una nueva
+    instantánea cuando cambia. Los lectores nunca se bloquean: siguen usando la
+    instantánea anterior hasta que la nueva está completamente construida.
+    """
+
+    def __init__(self, path: str, interval: float = 5.0):
+        self.path = path
+        self.interval = interval
+        self.last_version: Optional[str] = None
+        self.last_reload_seconds: Optional[float] = None
+        self._last_fingerprint: Optional[str] = None
+        self._last_mtime: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _mtime(self) -> Optional[int]:
+        mtimes = []
+        for candidate in (self.path, self.path + "-wal"):
+            if os.path.exists(candidate):
+                mtimes.append(os.stat(candidate).st_mtime_ns)
+        return max(mtimes) if mtimes else None
+
+    def reload(self, force: bool = False) -> bool:
+        """Recarga si la fuente cambió; devuelve True si se publicó una instantánea nueva"""
+        mtime = self._mtime()
+        if mtime is None:
+            print(f"⚠️ Fuente de inventario no encontrada: {self.path}")
+            return False
+        if not force and mtime == self._last_mtime:
+            return False
+
+        fingerprint = _source_fingerprint(self.path)
+        self._last_mtime = mtime
+        if not force and fingerprint == self._last_fingerprint:
+            return False
+
+        start = time.perf_counter()
+        try:
+            catalog = load_inventory(self.path, fingerprint)
+        except Exception as e:
+            # Fichero a medio escribir o inválido: mantener la instantánea actual
+            print(f"❌ Error recargando inventario {self.path}: {e}")
+            self._last_mtime = None
+            return False
+
+        set_catalog(catalog)
+        self._last_fingerprint = fingerprint
+        self.last_version = catalog.version
+        self.last_reload_seconds = time.perf_counter() - start
+        print(f"🔁 Inventario {catalog.version} cargado: {len(catalog)} vehículos "
+              f"en {self.last_reload_seconds * 1000:.0f} ms")
+        return True
+
+    def start(self):
+        """Carga la fuente ahora y empieza a vigilarla en un hilo de fondo"""
+        self.reload(force=True)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="inventory-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.reload()
+
+
+def start_inventory_watcher(path: Optional[str] = None, interval: Optional[float] = None) -> Optional[InventoryWatcher]:
+    """
+    Arranca la vigilancia de AUTOMAX_INVENTORY_SOURCE (si está configurada).
+    Sin fuente externa se sigue usando data/vehicles.json.
+    """
+    path = path or os.getenv('AUTOMAX_INVENTORY_SOURCE')
+    if not path:
+        return None
+    if interval is None:
+        interval = float(os.getenv('AUTOMAX_INVENTORY_POLL_INTERVAL', '5'))
+    watcher = InventoryWatcher(path, interval)
+    watcher.start()
+    return watcher
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Interpretación de búsquedas de inventario en filtros por atributo
+"""
+
+import re
+import threading
+import unicodedata
+from typing import Dict, FrozenSet, Set, Optional, Tuple, List
+
+from keyword_matcher import KeywordMatcher
+from vehicle_catalog import VehicleCatalog, NumericRange
+
+# Palabra del cliente → clave del índice de cada atributo
+FUEL_TERMS = {
+    "electric": "electric",
+    "hybrid": "hybrid",
+    "gasoline": "gasoline",
+    "petrol": "gasoline",
+    "gas": "gasoline",
+    "diesel": "diesel"
+}
+COLOR_TERMS = {color: color for color in ("blue", "black", "white", "red", "silver", "grey", "gray", "green")}
+TYPE_TERMS = {vtype: vtype for vtype in ("suv", "sedan", "sports", "hatchback", "coupe", "convertible")}
+
+# Comparadores → (lado del intervalo, incluye el extremo)
+COMPARATORS = {
+    "under": ("max", False), "below": ("max", False), "less than": ("max", False),
+    "cheaper than": ("max", False), "fewer than": ("max", False), "before": ("max", False),
+    "older than": ("max", False), "up to": ("max", True), "at most": ("max", True),
+    "no more than": ("max", True), "max": ("max", True), "maximum": ("max", True),
+    "over": ("min", False), "above": ("min", False), "more than": ("min", False),
+    "after": ("min", False), "newer than": ("min", False), "at least": ("min", True),
+    "from": ("min", True), "since": ("min", True), "min": ("min", True), "minimum": ("min", True),
+}
+_AMOUNT = r"(?:€\s*)?(\d[\d,.]*)\s*(k\b)?\s*(€|eur\b|euros?\b|hp\b|bhp\b|cv\b|ps\b|horsepower\b|km\b|kms\b|kilometers\b|kilometres\b)?"
+_COMPARISON = re.compile(r"\b(" + "|".join(sorted(map(re.escape, COMPARATORS), key=len, reverse=True)) + r")\s+" + _AMOUNT)
+_BETWEEN = re.compile(r"\bbetween\s+" + _AMOUNT + r"\s+and\s+" + _AMOUNT)
+UNIT_FIELDS = {"hp": "power", "bhp": "power", "cv": "power", "ps": "power", "horsepower": "power",
+               "km": "mileage", "kms": "mileage", "kilometers": "mileage", "kilometres": "mileage",
+               "€": "price", "eur": "price", "euro": "price", "euros": "price"}
+
+# Frases de orden → (columna, descendente); gana la más larga ("least expensive" antes que "expensive")
+SORT_PHRASES = (
+    ("least expensive", ("price", False)), ("most expensive", ("price", True)),
+    ("price high to low", ("price", True)), ("price low to high", ("price", False)),
+    ("lowest price", ("price", False)), ("highest price", ("price", True)),
+    ("cheapest", ("price", False)), ("newest", ("year", True)), ("latest", ("year", True)),
+    ("oldest", ("year", False)), ("most powerful", ("power", True)), ("fastest", ("power", True)),
+    ("least powerful", ("power", False)), ("lowest mileage", ("mileage", False)),
+    ("least mileage", ("mileage", False)), ("fewest km", ("mileage", False)),
+    ("highest mileage", ("mileage", True)), ("expensive", ("price", True)),
+    ("cheap", ("price", False)), ("affordable", ("price", False)), ("budget", ("price", False)),
+)
+_TOP_K = re.compile(r"\btop\s+(\d{1,2})\b|\b(\d{1,2})\s+(?:" + "|".join(re.escape(p) for p, _ in SORT_PHRASES) + r")\b")
+_SORT_MATCHER = KeywordMatcher(SORT_PHRASES)
+_PAGE = re.compile(r"\bpage\s+(\d{1,3})\b")
+
+# Marcas que también son palabras comunes ("heated seat", "mini fridge"): solo
+# cuentan como marca seguidas de un modelo suyo o de una palabra de vehículo
+# ("seat leon", "seat suvs", "seat cars") o precedidas de "brand"/"make"
+AMBIGUOUS_BRANDS = ("seat", "mini", "smart")
+VEHICLE_WORDS = frozenset(("car", "cars", "vehicle", "vehicles", "model", "models", "brand")
+                          + tuple(TYPE_TERMS) + tuple(word + "s" for word in TYPE_TERMS))
+BRAND_PREFIXES = frozenset(("brand", "make"))
+_LAST_WORD = re.compile(r"(\w+)\W*$")
+_FIRST_WORD = re.compile(r"\W*(\w+)")
+
+
+class InventoryQuery:
+    """
+    Filtros extraídos de una búsqueda: {atributo: valores aceptados},
+    intervalos numéricos, orden, límite (top-k), página (desde 1) y el texto
+    restante, sin las frases ya interpretadas (para la búsqueda por equipamiento)
+    """
+
+    def __init__(self, facets: Dict[str, Set[str]], ranges: Optional[Dict[str, NumericRange]] = None,
+                 sort: Optional[str] = None, descending: bool = False,
+                 limit: Optional[int] = None, page: int = 1, text: str = ""):
+        self.facets = facets
+        self.ranges = ranges or {}
+        self.sort = sort
+        self.descending = descending
+        self.limit = limit
+        self.page = page
+        self.text = text
+
+    def __bool__(self) -> bool:
+        return bool(self.facets or self.ranges or self.sort)
+
+    def __repr__(self) -> str:
+        return (f"InventoryQuery(facets={self.facets!r}, ranges={self.ranges!r}, sort={self.sort!r}, "
+                f"descending={self.descending}, limit={self.limit}, page={self.page}, text={self.text!r})")
+
+
+def _amount(number: str, thousands: Optional[str], unit: Optional[str]) -> Tuple[Optional[float], Optional[str]]:
+    """(valor, campo) de una cantidad: "40k" → (40000, price), "180 hp" → (180, power), "2020" → (2020, year)"""
+    text = number.rstrip(".,")
+    if re.match(r"^\d{1,3}(\.\d{3})+$", text):
+        text = text.replace(".", "")
+    try:
+        value = float(text.replace(",", ""))
+    except ValueError:
+        return None, None
+    if thousands:
+        value *= 1000
+    if unit:
+        return value, UNIT_FIELDS.get(unit.strip())
+    if thousands:
+        return value, "price"
+    if 1950 <= value <= 2100 and text.isdigit():
+        return value, "year"
+    if value >= 1000:
+        return value, "price"
+    return None, None
+
+
+def parse_numeric_ranges(text: str) -> Dict[str, NumericRange]:
+    """
+    "under €40k" → price < 40000, "over 180 HP" → power > 180,
+    "less than 50,000 km" → mileage < 50000, "from 2020" → year ≥ 2020,
+    "between 20k and 30k" → 20000 ≤ price ≤ 30000
+    """
+    ranges: Dict[str, NumericRange] = {}
+
+    def add(field: Optional[str], numeric_range: NumericRange):
+        if field:
+            ranges[field] = ranges[field].intersect(numeric_range) if field in ranges else numeric_range
+
+    for match in _BETWEEN.finditer(text):
+        low, low_field = _amount(*match.group(1, 2, 3))
+        high, high_field = _amount(*match.group(4, 5, 6))
+        field = low_field or high_field
+        if low is not None and high is not None and field:
+            add(field, NumericRange(min(low, high), max(low, high)))
+    for match in _COMPARISON.finditer(text):
+        value, field = _amount(*match.group(2, 3, 4))
+        # Una cantidad precedida de "€" es un precio aunque no lleve unidad detrás
+        if "€" in match.group(0) and field != "mileage":
+            field = "price" if value is not None else None
+        if value is None or not field:
+            continue
+        side, inclusive = COMPARATORS[match.group(1)]
+        if side == "max":
+            add(field, NumericRange(maximum=value, max_inclusive=inclusive))
+        else:
+            add(field, NumericRange(minimum=value, min_inclusive=inclusive))
+    return ranges
+
+
+def parse_sort(text: str) -> Tuple[Optional[str], bool, Optional[int]]:
+    """(columna, descendente, límite top-k) de frases como "newest first" o "top 3 cheapest" """
+    phrase = _SORT_MATCHER.best(text)
+    if phrase is None:
+        return None, False, None
+    field, descending = phrase[3]
+    match = _TOP_K.search(text)
+    limit = int(match.group(1) or match.group(2)) if match else None
+    return field, descending, limit
+
+
+# (versión del inventario, matcher, palabras que confirman cada marca ambigua): una sola
+# entrada, así que no retiene instantáneas antiguas tras recargar
+_facet_lock = threading.Lock()
+_facet_compiled: Tuple[Optional[str], Optional[KeywordMatcher], Dict[str, FrozenSet[str]]] = (None, None, {})
+
+
+def _fold(word: str) -> str:
+    """Palabra sin acentos, para comparar modelos ("león" → "leon")"""
+    return "".join(char for char in unicodedata.normalize("NFKD", word) if not unicodedata.combining(char))
+
+
+def _facet_matcher(catalog: VehicleCatalog) -> Tuple[KeywordMatcher, Dict[str, FrozenSet[str]]]:
+    """
+    Palabras de cada atributo (con plurales) y marcas del inventario,
+    compiladas por versión, y para cada marca ambigua las palabras que la
+    confirman si van detrás (sus modelos y VEHICLE_WORDS)
+    """
+    global _facet_compiled
+    version, matcher, confirming = _facet_compiled
+    if version != catalog.version or matcher is None:
+        with _facet_lock:
+            patterns = []
+            for facet, terms in (("fuel", FUEL_TERMS), ("color", COLOR_TERMS), ("type", TYPE_TERMS)):
+                for word, value in terms.items():
+                    # "suvs", "sedans"
+                    patterns.extend([(word, (facet, value)), (word + "s", (facet, value))])
+            brands = catalog.facet_values("brand")
+            patterns.extend((term, ("brand", term)) for term in brands)
+            confirming = {}
+            for term in AMBIGUOUS_BRANDS:
+                if term in brands:
+                    models = {_fold(car["model"].lower().split()[0]) for car in catalog
+                              if car["brand"].lower() == term and car["model"].split()}
+                    confirming[term] = VEHICLE_WORDS | models
+            matcher = KeywordMatcher(patterns)
+            _facet_compiled = (catalog.version, matcher, confirming)
+    return matcher, confirming
+
+
+def _brand_in_context(text: str, start: int, end: int, confirming: FrozenSet[str]) -> bool:
+    """Marca ambigua confirmada por la palabra siguiente o por "brand"/"make" delante"""
+    following = _FIRST_WORD.match(text, end)
+    if following and _fold(following.group(1)) in confirming:
+        return True
+    previous = _LAST_WORD.search(text, 0, start)
+    return bool(previous and previous.group(1) in BRAND_PREFIXES)
+
+
+def parse_inventory_query(query: str, catalog: VehicleCatalog) -> InventoryQuery:
+    """
+    Extrae todos los valores mencionados de cada atributo, así que
+    "blue or red suv" filtra por color ∈ {blue, red} y tipo = suv.
+    Las marcas salen del propio inventario; las que también son palabras
+    comunes (AMBIGUOUS_BRANDS) solo cuentan junto a un modelo o una palabra de vehículo.
+    """
+    # Todas las coincidencias y el recorte sobre el mismo texto: lower() puede cambiar la longitud ("İ")
+    text = query.lower()
+    facets: Dict[str, Set[str]] = {}
+    spans = []
+    matcher, confirming = _facet_matcher(catalog)
+    for start, end, _, (facet, value) in matcher.find_longest(text):
+        if facet == "brand" and value in confirming and not _brand_in_context(text, start, end, confirming[value]):
+            # "heated seat": se queda en el texto para la búsqueda por equipamiento
+            continue
+        facets.setdefault(facet, set()).add(value)
+        spans.append((start, end))
+
+    sort, descending, limit = parse_sort(text)
+    page_match = _PAGE.search(text)
+    page = max(1, int(page_match.group(1))) if page_match else 1
+
+    # Lo que queda sin interpretar ("leather seats", "harman kardon") va a la búsqueda por equipamiento
+    spans.extend((start, end) for start, end, _, _ in _SORT_MATCHER.find_all(text))
+    for pattern in (_BETWEEN, _COMPARISON, _TOP_K, _PAGE):
+        spans.extend(match.span() for match in pattern.finditer(text))
+    return InventoryQuery(facets, parse_numeric_ranges(text), sort, descending, limit, page,
+                          _remove_spans(text, spans))
+
+
+def without_page(query: str) -> str:
+    """La consulta sin "page N", para pedir otra página de la misma búsqueda"""
+    return " ".join(_PAGE.sub(" ", query.lower()).split())
+
+
+def _remove_spans(text: str, spans: List[Tuple[int, int]]) -> str:
+    """El texto con los tramos indicados sustituidos por un espacio"""
+    parts, position = [], 0
+    for start, end in sorted(spans):
+        if start > position:
+            parts.append(text[position:start])
+        position = max(position, end)
+    parts.append(text[position:])
+    return " ".join(parts)
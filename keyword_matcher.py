@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Búsqueda simultánea de muchas palabras clave en un texto, compilada una sola vez
+"""
+
+import re
+import string
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Puntuación → espacio, para partir el texto en palabras con str.split (en C)
+_PUNCTUATION = string.punctuation.replace("_", "") + "¿¡«»“”‘’…–—"
+_SEPARATORS = str.maketrans({char: " " for char in _PUNCTUATION})
+# str.translate solo es rápido con texto ASCII; con emojis o acentos (fichas, respuestas) va mejor una regex
+_SEPARATOR_PATTERN = re.compile(f"[{re.escape(_PUNCTUATION)}]")
+
+# (inicio, fin, palabra clave, valor)
+Match = Tuple[int, int, str, Any]
+
+
+class KeywordMatcher:
+    """
+    Palabras clave (en minúsculas) indexadas por su palabra menos frecuente
+    ("audi q5 v150" → "v150"). Cada texto se parte en palabras una sola vez y
+    solo se verifican, con str.find, las palabras clave cuya palabra índice
+    aparece: el coste no crece con las palabras clave que no están en el mensaje.
+
+    Solo cuenta coincidencias de palabras completas: "ford" no aparece en
+    "affordable" ni "oi" en "going". Si una palabra clave se repite, vale la
+    primera; el orden de alta es también la prioridad en caso de empate.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        entries: List[Tuple[str, Any, List[str]]] = []
+        seen = set()
+        for keyword, value in patterns:
+            keyword = keyword.strip().lower()
+            words = _words(keyword)
+            if words and keyword not in seen:
+                seen.add(keyword)
+                entries.append((keyword, value, words))
+
+        frequency: Dict[str, int] = {}
+        for _, _, words in entries:
+            for word in set(words):
+                frequency[word] = frequency.get(word, 0) + 1
+
+        # palabra índice → [(palabra clave, valor, prioridad)]
+        self._by_word: Dict[str, List[Tuple[str, Any, int]]] = {}
+        for priority, (keyword, value, words) in enumerate(entries):
+            index_word = min(words, key=frequency.__getitem__)
+            self._by_word.setdefault(index_word, []).append((keyword, value, priority))
+        self._size = len(entries)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _scan(self, text: str) -> List[Tuple[int, int, Tuple[str, Any, int]]]:
+        """(inicio, fin, entrada) de cada coincidencia, por posición y las más largas primero"""
+        lower = text.lower()
+        candidates = self._by_word.keys() & set(_words(lower))
+        if not candidates:
+            return []
+        length = len(lower)
+        matches = []
+        for word in candidates:
+            for entry in self._by_word[word]:
+                keyword = entry[0]
+                start = lower.find(keyword)
+                while start != -1:
+                    end = start + len(keyword)
+                    if ((start == 0 or not _is_word_char(lower[start - 1]))
+                            and (end == length or not _is_word_char(lower[end]))):
+                        matches.append((start, end, entry))
+                    start = lower.find(keyword, start + 1)
+        matches.sort(key=lambda match: (match[0], -match[1]))
+        return matches
+
+    def find_all(self, text: str) -> List[Match]:
+        """Todas las coincidencias, también solapadas, ordenadas por posición (las más largas primero)"""
+        return [(start, end, entry[0], entry[1]) for start, end, entry in self._scan(text)]
+
+    def find_longest(self, text: str) -> List[Match]:
+        """Coincidencias sin solapes, de izquierda a derecha y la más larga en cada punto"""
+        result: List[Match] = []
+        end = 0
+        for match in self.find_all(text):
+            if match[0] >= end:
+                result.append(match)
+                end = match[1]
+        return result
+
+    def best(self, text: str) -> Optional[Match]:
+        """La coincidencia más larga; a igual longitud, la de mayor prioridad"""
+        best, best_key = None, None
+        for start, end, entry in self._scan(text):
+            key = (end - start, -entry[2])
+            if best_key is None or key > best_key:
+                best, best_key = (start, end, entry[0], entry[1]), key
+        return best
+
+    def values(self, text: str) -> Set[Any]:
+        """Valores de todas las palabras clave presentes (basta la primera aparición de cada una)"""
+        lower = text.lower()
+        candidates = self._by_word.keys() & set(_words(lower))
+        length = len(lower)
+        found = set()
+        for word in candidates:
+            for keyword, value, _ in self._by_word[word]:
+                if value in found:
+                    continue
+                start = lower.find(keyword)
+                while start != -1:
+                    end = start + len(keyword)
+                    if ((start == 0 or not _is_word_char(lower[start - 1]))
+                            and (end == length or not _is_word_char(lower[end]))):
+                        found.add(value)
+                        break
+                    start = lower.find(keyword, start + 1)
+        return found
+
+
+def _words(text: str) -> List[str]:
+    if text.isascii():
+        return text.translate(_SEPARATORS).split()
+    return _SEPARATOR_PATTERN.sub(" ", text).split()
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Cliente asíncrono de OpenAI para AutoMax con plazos por mensaje y peticiones cubiertas (hedging)
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, List, Coroutine
+
+from openai import AsyncOpenAI
+
+from agent_metrics import metrics as default_metrics
+from model_router import ModelRouter
+
+
+class DeadlineExceeded(Exception):
+    """Se agotó el plazo disponible para responder al mensaje"""
+
+
+class Deadline:
+    """Plazo absoluto compartido por todas las llamadas de un mismo mensaje"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Segundos restantes (nunca negativo)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class HedgeBudget:
+    """
+    Limita las peticiones duplicadas a una fracción del tráfico: cada petición
+    aporta `ratio` créditos y cada duplicado consume uno.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_burst: float = 5.0):
+        self.ratio = ratio
+        self.max_burst = max_burst
+        self._credits = max_burst if ratio > 0 else 0.0
+        self._lock = threading.Lock()
+
+    def on_request(self):
+        with self._lock:
+            self._credits = min(self.max_burst, self._credits + self.ratio)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._credits >= 1.0:
+                self._credits -= 1.0
+                return True
+            return False
+
+
+class LLMClient:
+    """
+    Envoltorio de AsyncOpenAI usado por el agente.
+
+    Todas las llamadas se ejecutan en un bucle de eventos propio (hilo de fondo),
+    así el mismo cliente sirve a código síncrono, a corrutinas de cualquier bucle
+    y a los hilos de Flask sin compartir conexiones entre bucles.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, request_timeout: Optional[float] = None,
+                 hedging: Optional[bool] = None, hedge_delay: Optional[float] = None,
+                 hedge_budget: Optional[float] = None, metrics=None,
+                 router: Optional[ModelRouter] = None):
+        self.metrics = metrics or default_metrics
+        # Selección de modelo por tarea con fallback al siguiente nivel
+        self.router = router or ModelRouter()
+        self.request_timeout = request_timeout or float(os.getenv('OPENAI_REQUEST_TIMEOUT', '20'))
+
+        if hedging is None:
+            hedging = os.getenv('OPENAI_HEDGING', '0').lower() in ('1', 'true', 'yes')
+        self.hedging = hedging
+        # Retraso fijo antes de duplicar; si no se configura se usa el p95 observado
+        if hedge_delay is None and os.getenv('OPENAI_HEDGE_DELAY'):
+            hedge_delay = float(os.getenv('OPENAI_HEDGE_DELAY'))
+        self.hedge_delay = hedge_delay
+        self.hedge_budget = HedgeBudget(
+            hedge_budget if hedge_budget is not None else float(os.getenv('OPENAI_HEDGE_BUDGET', '0.1'))
+        )
+        self.min_samples_for_p95 = 20
+        self.default_hedge_delay = 2.0
+
+        try:
+            self.client = AsyncOpenAI(api_key=api_key or os.getenv('OPENAI_API_KEY'), max_retries=0)
+        except Exception as e:
+            print(f"⚠️  Warning: Error inicializando OpenAI client: {e}")
+            self.client = None
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """True si hay cliente de OpenAI configurado"""
+        return self.client is not None
+
+    # ------------------------------------------------------------------
+    # Bucle de eventos propio
+    # ------------------------------------------------------------------
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-client-loop", daemon=True)
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def _in_client_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Programa una corrutina en el bucle del cliente y devuelve su Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+
+    def run(self, coro: Coroutine) -> Any:
+        """Ejecuta una corrutina en el bucle del cliente y espera el resultado (código síncrono)"""
+        if self._in_client_loop():
+            raise RuntimeError("LLMClient.run no puede llamarse desde el propio bucle del cliente")
+        return self.submit(coro).result()
+
+    async def _on_client_loop(self, coro: Coroutine) -> Any:
+        """Espera una corrutina ejecutándola en el bucle del cliente"""
+        if self._in_client_loop():
+            return await coro
+        future = self.submit(coro)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    # ------------------------------------------------------------------
+    # Completions
+    # ------------------------------------------------------------------
+
+    async def acomplete(self, task: str, model: str, messages: List[Dict[str, str]],
+                        deadline: Optional[Deadline] = None, **params) -> Any:
+        """
+        Chat completion asíncrona con plazo y hedging opcional. El modelo real lo
+        elige el router según los niveles de la tarea; `model` se usa si la tarea
+        no está configurada. Lanza DeadlineExceeded si no hay respuesta antes del plazo.
+        """
+        return await self._on_client_loop(self._complete(task, model, messages, deadline, params))
+
+    def complete(self, task: str, model: str, messages: List[Dict[str, str]],
+                 deadline: Optional[Deadline] = None, **params) -> Any:
+        """Versión síncrona de acomplete (bloquea el hilo que llama)"""
+        return self.run(self._complete(task, model, messages, deadline, params))
+
+    async def _complete(self, task: str, model: str, messages: List[Dict[str, str]],
+                        deadline: Optional[Deadline], params: Dict[str, Any]) -> Any:
+        if not self.client:
+            raise RuntimeError("OpenAI client no disponible")
+
+        timeout = self.request_timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline.remaining())
+        if timeout <= 0:
+            self.metrics.increment("llm.deadline_exceeded")
+            raise DeadlineExceeded(f"Sin tiempo para {task}")
+
+        self.hedge_budget.on_request()
+        self.metrics.increment(f"llm.requests.{task}")
+        start = time.perf_counter()
+        candidates = self.router.candidates(task, model)
+        last_error: Optional[BaseException] = None
+
+        for tier, candidate in enumerate(candidates, 1):
+            remaining = timeout - (time.perf_counter() - start)
+            if remaining <= 0:
+                break
+            attempt_timeout = remaining
+            if tier < len(candidates) and self.router.attempt_timeout(task):
+                attempt_timeout = min(remaining, self.router.attempt_timeout(task))
+
+            print(f"🧭 {task} → {candidate} (nivel {tier}/{len(candidates)}, {attempt_timeout:.1f}s)")
+            attempt_start = time.perf_counter()
+            try:
+                if self.hedging:
+                    response = await self._hedged_call(task, candidate, messages, params, attempt_timeout)
+                else:
+                    response = await asyncio.wait_for(self._call(candidate, messages, params), attempt_timeout)
+            except asyncio.TimeoutError:
+                self.router.record(candidate, False, time.perf_counter() - attempt_start)
+                last_error = DeadlineExceeded(f"{task} con {candidate} superó {attempt_timeout:.1f}s")
+                print(f"⏰ {last_error}")
+                self.metrics.increment("llm.fallbacks")
+                continue
+            except Exception as e:
+                self.router.record(candidate, False, time.perf_counter() - attempt_start)
+                self.metrics.increment(f"llm.errors.{task}")
+                self.metrics.increment("llm.fallbacks")
+                print(f"❌ {task} con {candidate}: {e}")
+                last_error = e
+                continue
+
+            self.router.record(candidate, True, time.perf_counter() - attempt_start)
+            self.metrics.increment(f"llm.model.{candidate}")
+            elapsed = time.perf_counter() - start
+            self.metrics.observe_latency(f"llm.{task}", elapsed)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                recorded = self.metrics.record_usage(task, usage)
+                print(f"🧮 {task} ({candidate}): {recorded['prompt_tokens']} tokens de prompt "
+                      f"({recorded['cached_tokens']} en caché), {elapsed * 1000:.0f} ms")
+            return response
+
+        if last_error is None or isinstance(last_error, DeadlineExceeded):
+            self.metrics.increment("llm.deadline_exceeded")
+            raise last_error or DeadlineExceeded(f"{task} superó {timeout:.1f}s")
+        raise last_error
+
+    async def _call(self, model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> Any:
+        return await self.client.chat.completions.create(model=model, messages=messages, **params)
+
+    def _hedge_delay_for(self, task: str) -> float:
+        """Retraso antes de duplicar: configurado o p95 observado de la tarea"""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        if self.metrics.latency_count(f"llm.{task}") >= self.min_samples_for_p95:
+            return self.metrics.latency_percentile(f"llm.{task}", 95)
+        return self.default_hedge_delay
+
+    async def _hedged_call(self, task: str, model: str, messages: List[Dict[str, str]],
+                           params: Dict[str, Any], timeout: float) -> Any:
+        """Lanza un duplicado si la primera petición tarda más que el p95 y usa la primera respuesta"""
+        started = time.monotonic()
+        primary = asyncio.ensure_future(self._call(model, messages, params))
+        delay = min(self._hedge_delay_for(task), timeout)
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        remaining = timeout - (time.monotonic() - started)
+        if not self.hedge_budget.try_acquire():
+            self.metrics.increment("llm.hedges_skipped")
+            return await asyncio.wait_for(primary, max(0.0, remaining))
+
+        self.metrics.increment("llm.hedges_fired")
+        hedge = asyncio.ensure_future(self._call(model, messages, params))
+        pending = {primary, hedge}
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                done, pending = await asyncio.wait(pending, timeout=remaining,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError()
+                for finished in done:
+                    if finished.exception() is None:
+                        if finished is hedge:
+                            self.metrics.increment("llm.hedges_won")
+                        return finished.result()
+                    last_error = finished.exception()
+            raise last_error
+        finally:
+            for task_future in (primary, hedge):
+                if not task_future.done():
+                    task_future.cancel()
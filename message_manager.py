@@ -1,4 +1,4 @@
-import time
+import os
 from typing import Dict, Any, Optional, List
 from whatsapp_sender import WhatsAppSender, create_main_menu_buttons, create_car_type_buttons, create_appointment_buttons
 from car_dealership_agent import CarDealershipWhatsAppAgent
@@ -12,6 +12,9 @@ class MessageManager:
         self.sender = whatsapp_sender
         self.car_agent = car_agent  # Cambié de 'agent' a 'car_agent' para consistencia
         
+        # Resultados del inventario como lista interactiva en vez de texto (WHATSAPP_INVENTORY_LISTS=0 lo desactiva)
+        self.inventory_lists = os.getenv('WHATSAPP_INVENTORY_LISTS', '1').lower() in ('1', 'true', 'yes')
+        
         # Información del concesionario
         self.dealership_info = {
             "name": "AutoMax",
@@ -67,7 +70,7 @@ class MessageManager:
                 return self._send_help_message(user_phone)
             
             # Procesar mensaje con el agente de chat
-            agent_result = self.car_agent.process_message(user_phone, user_name, message_text, "text")
+            agent_result = await self.car_agent.aprocess_message(user_phone, user_name, message_text, "text")
             
             if agent_result["success"]:
                 # Enviar respuesta del agente
@@ -77,7 +80,8 @@ class MessageManager:
                     "actions": agent_result["actions"],
                     "suggestions": agent_result["suggestions"],
                     "has_image": agent_result.get("has_image", False),
-                    "image_path": agent_result.get("image_path")
+                    "image_path": agent_result.get("image_path"),
+                    "list": agent_result.get("list")
                 }
                 
                 self._send_response(user_phone, response_data)
@@ -114,30 +118,14 @@ class MessageManager:
             elif button_id == "contact_info":
                 return self._handle_contact_info(user_phone)
             
-            # Procesar botones de tipos de auto
-            elif button_id.startswith("car_type_"):
-                car_type = button_id.replace("car_type_", "")
-                return self._handle_car_type_selection(user_phone, car_type)
-            
-            # Procesar botones de citas
-            elif button_id in ["test_drive", "consultation", "inspection"]:
-                return self._handle_appointment_type(user_phone, button_id)
-            
-            # Procesar otros botones específicos del agente
-            elif button_id in ["see_details", "compare_cars", "schedule_test"]:
-                # Convertir acción de botón en mensaje de texto para el agente
-                action_messages = {
-                    "see_details": "Quiero ver más detalles de los autos",
-                    "compare_cars": "Quiero comparar los autos",
-                    "schedule_test": "Quiero agendar una prueba de manejo"
-                }
-                
-                message_text = action_messages.get(button_id, button_title)
-                return await self.handle_text_message(user_phone, user_name, message_text, message_id)
+            # Tipos de auto, citas, detalles y comparación: tabla de despacho, sin OpenAI
+            routed = self.car_agent.process_interactive(user_phone, user_name, button_id, button_title)
+            if routed is not None:
+                self._send_response(user_phone, routed)
+                return {"status": "routed", "route": button_id, "response_type": routed["response_type"]}
             
-            else:
-                # Botón no reconocido, tratar como mensaje de texto
-                return await self.handle_text_message(user_phone, user_name, button_title, message_id)
+            # Botón no reconocido, tratar como mensaje de texto
+            return await self.handle_text_message(user_phone, user_name, button_title, message_id)
                 
         except Exception as e:
             print(f"❌ Error manejando botón: {str(e)}")
@@ -155,6 +143,12 @@ class MessageManager:
             # Marcar como leído
             self.sender.mark_as_read(message_id)
             
+            # Filas con id conocido (vehículos del inventario): directas a la herramienta
+            routed = self.car_agent.process_interactive(user_phone, user_name, selection_id, selection_title)
+            if routed is not None:
+                self._send_response(user_phone, routed)
+                return {"status": "routed", "route": selection_id, "response_type": routed["response_type"]}
+            
             # Convertir selección en mensaje de texto para el agente
             message_text = f"Me interesa: {selection_title}"
             return await self.handle_text_message(user_phone, user_name, message_text, message_id)
@@ -208,7 +202,7 @@ class MessageManager:
                     # Enviar imagen con el texto como caption
                     self.sender.send_image(user_phone, full_path, response_data["response"])
                     print(f"✅ Imagen enviada exitosamente: {image_path}")
-                    return  # No enviar texto adicional ya que va como caption
+                    # No se envía texto adicional ya que va como caption
                 except Exception as e:
                     print(f"❌ Error enviando imagen {image_path}: {e}")
                     # Si falla el envío de imagen, enviar solo texto
@@ -217,45 +211,51 @@ class MessageManager:
                 print(f"❌ Imagen no encontrada: {full_path}")
                 # Si no existe la imagen, enviar solo texto
                 self.sender.send_text(user_phone, response_data["response"])
+        elif self.inventory_lists and response_data.get("list"):
+            # Listado del inventario: las selecciones vuelven como ids de vehículo
+            self._send_inventory_list(user_phone, response_data)
         else:
             # Solo enviar el texto principal
             self.sender.send_text(user_phone, response_data["response"])
         
-        # NOTA: Botones, acciones y sugerencias desactivados intencionalmente
-        # Para reactivar, descomenta las secciones comentadas abajo
+        # Botones, acciones y sugerencias: solo llegan con WHATSAPP_RESPONSE_ACTIONS=1
+        # (sin ese modo el agente ni siquiera analiza la respuesta)
+        actions = response_data.get("actions") or []
+        suggestions = response_data.get("suggestions") or []
+        if not actions and not suggestions:
+            return
         
-        # # Pequeña pausa para evitar saturar WhatsApp
-        # time.sleep(0.5)
-        # 
-        # # Enviar acciones (botones, listas, etc.)
-        # for action in response_data.get("actions", []):
-        #     if action["type"] == "buttons":
-        #         data = action["data"]
-        #         self.sender.send_buttons(
-        #             user_phone,
-        #             data["header"],
-        #             data["body"],
-        #             data["buttons"],
-        #             "AutoMax"
-        #         )
-        #         time.sleep(0.3)
-        #     
-        #     elif action["type"] == "contact_info":
-        #         self._send_contact_info(user_phone)
-        #         time.sleep(0.3)
-        # 
-        # # Enviar sugerencias si las hay
-        # for suggestion in response_data.get("suggestions", []):
-        #     if suggestion["type"] == "buttons":
-        #         data = suggestion["data"]
-        #         self.sender.send_buttons(
-        #             user_phone,
-        #             data["header"],
-        #             data["body"],
-        #             data["buttons"],
-        #             "AutoMax"
-        #         )
-        #         time.sleep(0.3)
+        # Enviar acciones (botones, listas, etc.) y después las sugerencias, sin
+        # pausas: cada envío ya espera la respuesta de la API, así que el orden se mantiene
+        for action in actions + suggestions:
+            if action["type"] == "buttons":
+                data = action["data"]
+                self.sender.send_buttons(
+                    user_phone,
+                    data["header"],
+                    data["body"],
+                    data["buttons"],
+                    "AutoMax"
+                )
+            
+            elif action["type"] == "contact_info":
+                self._send_contact_info(user_phone)
+    
+    def _send_inventory_list(self, user_phone: str, response_data: Dict[str, Any]):
+        """
+        Envía los resultados como mensaje de lista; si WhatsApp lo rechaza, el
+        listado de texto completo
+        """
+        listing = response_data["list"]
+        sent = self.sender.send_list(
+            user_phone,
+            listing["header"],
+            listing["body"],
+            listing["button"],
+            listing["sections"]
+        )
+        if sent.get("error"):
+            self.sender.send_text(user_phone, response_data["response"])
     
     def _send_main_menu(self, user_phone: str) -> Dict[str, Any]:
         """
@@ -283,19 +283,6 @@ class MessageManager:
         )
         return {"status": "car_search_menu_sent"}
     
-    def _handle_car_type_selection(self, user_phone: str, car_type: str) -> Dict[str, Any]:
-        """
-        Maneja la selección de tipo de auto
-        """
-        type_messages = {
-            "economic": "Busco un auto económico",
-            "family": "Busco un auto familiar", 
-            "luxury": "Busco un auto de lujo"
-        }
-        
-        message = type_messages.get(car_type, "Busco un auto")
-        return self.handle_text_message(user_phone, None, message, "button_selection")
-    
     def _handle_schedule_appointment(self, user_phone: str) -> Dict[str, Any]:
         """
         Maneja el agendamiento de citas
@@ -309,19 +296,6 @@ class MessageManager:
         )
         return {"status": "appointment_menu_sent"}
     
-    def _handle_appointment_type(self, user_phone: str, appointment_type: str) -> Dict[str, Any]:
-        """
-        Maneja el tipo de cita seleccionado
-        """
-        type_messages = {
-            "test_drive": "Quiero agendar una prueba de manejo",
-            "consultation": "Quiero agendar una consulta",
-            "inspection": "Quiero agendar una inspección"
-        }
-        
-        message = type_messages.get(appointment_type, "Quiero agendar una cita")
-        return self.handle_text_message(user_phone, None, message, "appointment_selection")
-    
     def _handle_contact_info(self, user_phone: str) -> Dict[str, Any]:
         """
         Maneja la información de contacto
@@ -339,7 +313,6 @@ class MessageManager:
             hours_text += f"• {day}: {hours}\n"
         
         self.sender.send_text(user_phone, hours_text)
-        time.sleep(0.5)
         
         # Enviar ubicación
         self.sender.send_location(
@@ -349,7 +322,6 @@ class MessageManager:
             self.dealership_info["name"],
             self.dealership_info["address"]
         )
-        time.sleep(0.5)
         
         # Enviar contacto
         self.sender.send_contact(
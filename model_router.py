@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Enrutado de modelos por tarea con niveles (tiers) y fallback automático
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Any, Optional, List
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "model_routing.json")
+
+
+class ModelHealth:
+    """Latencias y errores recientes de un modelo (ventana deslizante)"""
+
+    def __init__(self, window: int):
+        self.outcomes = deque(maxlen=window)  # (ok, latencia)
+
+    def record(self, ok: bool, latency: float):
+        self.outcomes.append((ok, latency))
+
+    @property
+    def samples(self) -> int:
+        return len(self.outcomes)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for ok, _ in self.outcomes if not ok) / len(self.outcomes)
+
+    @property
+    def avg_latency(self) -> float:
+        # Los timeouts cuentan con la latencia consumida hasta abandonar el intento
+        if not self.outcomes:
+            return 0.0
+        return sum(latency for _, latency in self.outcomes) / len(self.outcomes)
+
+
+class ModelRouter:
+    """
+    Elige el modelo de cada tarea según la lista de niveles configurada,
+    saltando los modelos con demasiados errores o latencia alta. Un modelo
+    degradado vuelve a probarse en su nivel cada `probe_interval_s`: si la
+    prueba sale bien se olvida su historial y recupera el puesto. La
+    configuración se relee del disco cuando cambia, sin reiniciar el proceso.
+    """
+
+    def __init__(self, config_path: Optional[str] = None, clock: Callable[[], float] = time.monotonic):
+        self.config_path = config_path or os.getenv('MODEL_ROUTING_CONFIG', DEFAULT_CONFIG_PATH)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._config: Dict[str, Any] = {}
+        self._config_mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._health: Dict[str, ModelHealth] = {}
+        # modelo → instante en que se degradó o se probó por última vez
+        self._demoted: Dict[str, float] = {}
+        # modelo → instante de la prueba en curso (una sola petición a la vez)
+        self._probing: Dict[str, float] = {}
+        self._load_config()
+
+    # ------------------------------------------------------------------
+    # Configuración
+    # ------------------------------------------------------------------
+
+    def _load_config(self):
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError:
+            if self._config_mtime is not None:
+                logger.warning("⚠️ Configuración de modelos no encontrada: %s", self.config_path)
+            self._config, self._config_mtime = {}, None
+            return
+
+        try:
+            with open(self.config_path, encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            # Mantener la configuración anterior si el fichero está a medio escribir o es inválido
+            logger.error("❌ Error leyendo %s: %s", self.config_path, e)
+            return
+
+        if self._config_mtime is not None:
+            logger.info("🔁 Configuración de modelos recargada (%s)", self.config_path)
+        self._config, self._config_mtime = config, mtime
+
+    def _maybe_reload(self):
+        now = self._clock()
+        interval = float(self._config.get("reload_interval_s", 5))
+        if now - self._last_check < interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError:
+            mtime = None
+        if mtime != self._config_mtime:
+            self._load_config()
+
+    def reload(self):
+        """Fuerza la recarga de la configuración"""
+        with self._lock:
+            self._load_config()
+
+    # ------------------------------------------------------------------
+    # Selección
+    # ------------------------------------------------------------------
+
+    def candidates(self, task: str, default_model: str) -> List[str]:
+        """
+        Modelos a probar para la tarea, en orden. Los sanos van primero en el
+        orden de niveles; los degradados quedan al final como último recurso.
+        """
+        with self._lock:
+            self._maybe_reload()
+            task_config = self._config.get("tasks", {}).get(task, {})
+            tiers = list(task_config.get("tiers") or [default_model])
+            now = self._clock()
+            probe_interval = float(self._health_config().get("probe_interval_s", 30))
+            healthy, degraded, probes = [], [], []
+            for model in tiers:
+                if self._is_healthy(model):
+                    self._demoted.pop(model, None)
+                    healthy.append(model)
+                    continue
+                since = self._demoted.setdefault(model, now)
+                probe_started = self._probing.get(model)
+                # Una prueba sin resultado (plazo agotado antes del intento) caduca con el intervalo
+                if now - since >= probe_interval and (probe_started is None or now - probe_started >= probe_interval):
+                    self._probing[model] = self._demoted[model] = now
+                    probes.append(model)
+                    healthy.append(model)
+                else:
+                    degraded.append(model)
+            selected = healthy + degraded
+            if degraded or probes:
+                logger.info("🧭 %s: %s (degradados: %s%s)", task, " → ".join(selected),
+                            ", ".join(self._describe(model) for model in degraded) or "-",
+                            f"; probando {', '.join(probes)}" if probes else "")
+        return selected
+
+    def attempt_timeout(self, task: str) -> Optional[float]:
+        """Tiempo máximo de un intento antes de pasar al siguiente nivel"""
+        with self._lock:
+            value = self._config.get("tasks", {}).get(task, {}).get("attempt_timeout_s")
+        return float(value) if value else None
+
+    def _health_config(self) -> Dict[str, Any]:
+        return self._config.get("health", {})
+
+    def _describe(self, model: str) -> str:
+        health = self._health[model]
+        return f"{model} {health.error_rate:.0%} errores, {health.avg_latency:.1f}s"
+
+    def _is_healthy(self, model: str) -> bool:
+        health = self._health.get(model)
+        config = self._health_config()
+        if health is None or health.samples < int(config.get("min_samples", 5)):
+            return True
+        if health.error_rate > float(config.get("max_error_rate", 0.3)):
+            return False
+        return health.avg_latency <= float(config.get("max_latency_s", 8.0))
+
+    # ------------------------------------------------------------------
+    # Observaciones
+    # ------------------------------------------------------------------
+
+    def record(self, model: str, ok: bool, latency: float):
+        """Registra el resultado de una llamada (ok=False para errores y timeouts)"""
+        with self._lock:
+            health = self._health.get(model)
+            if health is None:
+                health = self._health[model] = ModelHealth(int(self._health_config().get("window", 50)))
+            if self._probing.pop(model, None) is not None:
+                if ok:
+                    # Recuperado: los fallos antiguos ya no dicen nada del modelo
+                    health.outcomes.clear()
+                    self._demoted.pop(model, None)
+                    logger.info("✅ %s recuperado tras la prueba (%.1fs)", model, latency)
+                else:
+                    self._demoted[model] = self._clock()
+                    logger.info("⚠️ %s sigue degradado tras la prueba", model)
+            health.record(ok, latency)
+
+    def status(self) -> Dict[str, Any]:
+        """Estado de salud por modelo (para /status)"""
+        with self._lock:
+            now = self._clock()
+            return {
+                model: {
+                    "samples": health.samples,
+                    "error_rate": round(health.error_rate, 3),
+                    "avg_latency_ms": round(health.avg_latency * 1000, 1),
+                    "healthy": self._is_healthy(model),
+                    "degraded_for_s": round(now - self._demoted[model], 1) if model in self._demoted else None,
+                    "probing": model in self._probing
+                }
+                for model, health in self._health.items()
+            }
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Backend de sesiones compartido entre varias instancias sobre el protocolo de
+Redis (RESP2), con un cliente mínimo sin dependencias externas
+"""
+
+import json
+import socket
+import threading
+from typing import Dict, Any, Optional, List, Sequence, Tuple
+from urllib.parse import urlparse
+
+from conversation_store import SessionConflict
+
+
+class RedisError(Exception):
+    """Respuesta de error del servidor (-ERR ...) o fallo de conexión"""
+
+
+def encode_command(args: Sequence[Any]) -> bytes:
+    """Comando como array RESP de bulk strings"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+def read_reply(stream) -> Any:
+    """
+    Lee una respuesta RESP. Los errores se devuelven como RedisError (sin
+    lanzarlos) para que un pipeline pueda leer todas sus respuestas.
+    """
+    line = stream.readline()
+    if not line:
+        raise RedisError("Conexión cerrada por el servidor")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        return RedisError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2].decode()
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [read_reply(stream) for _ in range(length)]
+    raise RedisError(f"Respuesta RESP desconocida: {line!r}")
+
+
+class RespClient:
+    """
+    Una conexión TCP con pipelining: `pipeline` envía todos los comandos en
+    una sola escritura y lee las respuestas en orden (un viaje de ida y vuelta)
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.round_trips = 0
+        self.commands = 0
+        # Reentrante: una transacción con WATCH retiene la conexión entre dos pipelines
+        self.lock = threading.RLock()
+        self._socket: Optional[socket.socket] = None
+        self._stream = None
+
+    @classmethod
+    def from_url(cls, url: str) -> "RespClient":
+        """redis://[:password@]host[:port][/db]"""
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip("/") or 0)
+        return cls(parsed.hostname or "localhost", parsed.port or 6379, db, parsed.password)
+
+    def _connect(self):
+        self._socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = self._socket.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            # Una contraseña o base incorrecta se detecta aquí, no en el siguiente comando
+            for command, reply in zip(setup, self._send(setup)):
+                if isinstance(reply, RedisError):
+                    raise RedisError(f"{command[0]} rechazado por {self.host}:{self.port}: {reply}")
+
+    def _send(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        self._socket.sendall(b"".join(encode_command(command) for command in commands))
+        self.round_trips += 1
+        self.commands += len(commands)
+        return [read_reply(self._stream) for _ in commands]
+
+    def pipeline(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        """
+        Envía los comandos juntos. Sin reintentos: una transacción enviada a
+        medias no se repite; la siguiente llamada abre una conexión nueva.
+        """
+        with self.lock:
+            try:
+                if self._socket is None:
+                    self._connect()
+                return self._send(commands)
+            except (OSError, RedisError) as e:
+                self.close()
+                raise RedisError(f"Error de conexión con {self.host}:{self.port}: {e}") from e
+
+    def execute(self, *args: Any) -> Any:
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def close(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = None
+        self._stream = None
+
+
+def _check(replies: List[Any]) -> List[Any]:
+    for reply in replies:
+        if isinstance(reply, RedisError):
+            raise reply
+    return replies
+
+
+class RedisSessionBackend:
+    """
+    Sesiones en Redis, compartidas por todas las instancias detrás del
+    balanceador. Cuatro claves por usuario con la misma hash tag ({usuario}),
+    así que en un clúster caen en el mismo slot:
+
+        session:{user}:turns    lista de mensajes [role, content, tokens] en JSON
+        session:{user}:summary  resumen acumulado
+        session:{user}:state    estado del adaptador de WhatsApp en JSON
+        session:{user}:version  contador que incrementa toda escritura (también el borrado)
+
+    Cada escritura es un MULTI/EXEC en un solo viaje (pipelining) y devuelve
+    la versión nueva. El estado usa concurrencia optimista: WATCH de la
+    versión y la transacción solo se aplica si nadie escribió desde la
+    versión leída; si no, SessionConflict y el almacén reintenta.
+    """
+
+    shared = True
+
+    def __init__(self, client: RespClient, key_prefix: str = "session"):
+        self.client = client
+        self.key_prefix = key_prefix
+        self._conflicts = 0
+        self._restored = 0
+
+    def _keys(self, user_id: str) -> Tuple[str, str, str, str]:
+        base = f"{self.key_prefix}:{{{user_id}}}"
+        return f"{base}:turns", f"{base}:summary", f"{base}:state", f"{base}:version"
+
+    def version(self, user_id: str) -> int:
+        value = self.client.execute("GET", self._keys(user_id)[3])
+        return int(value) if value is not None else 0
+
+    def load_session(self, user_id: str, limit: int) -> Optional[Dict[str, Any]]:
+        """Lectura atómica (MULTI/EXEC) de versión, últimos mensajes, resumen y estado"""
+        turns_key, summary_key, state_key, version_key = self._keys(user_id)
+        replies = _check(self.client.pipeline([
+            ("MULTI",),
+            ("GET", version_key),
+            ("LRANGE", turns_key, -limit, -1),
+            ("GET", summary_key),
+            ("GET", state_key),
+            ("EXEC",),
+        ]))
+        version, turns, summary, state = _check(replies[-1])
+        if version is None and not turns and summary is None and state is None:
+            return None
+        self._restored += 1
+        return {
+            "turns": [json.loads(turn) for turn in turns],
+            "summary": summary,
+            "state": json.loads(state) if state is not None else None,
+            "version": int(version or 0),
+        }
+
+    def _transaction(self, version_key: str, commands: List[Tuple]) -> int:
+        """Ejecuta los comandos más INCR de la versión en un MULTI/EXEC; devuelve la versión nueva"""
+        replies = _check(self.client.pipeline([("MULTI",)] + commands + [("INCR", version_key), ("EXEC",)]))
+        return _check(replies[-1])[-1]
+
+    def append_message(self, user_id: str, role: str, content: str, tokens: int, evicted: int = 0) -> int:
+        """Añade el mensaje y quita los `evicted` más antiguos en la misma transacción"""
+        turns_key, _, _, version_key = self._keys(user_id)
+        commands = [("RPUSH", turns_key, json.dumps([role, content, tokens], ensure_ascii=False))]
+        if evicted:
+            commands.append(("LTRIM", turns_key, evicted, -1))
+        return self._transaction(version_key, commands)
+
+    def save_summary(self, user_id: str, summary: str) -> int:
+        _, summary_key, _, version_key = self._keys(user_id)
+        return self._transaction(version_key, [("SET", summary_key, summary)])
+
+    def save_state(self, user_id: str, state: Dict[str, Any], expected_version: Optional[int] = None) -> int:
+        _, _, state_key, version_key = self._keys(user_id)
+        payload = json.dumps(state, ensure_ascii=False, default=str)
+        if expected_version is None:
+            return self._transaction(version_key, [("SET", state_key, payload)])
+
+        with self.client.lock:
+            # WATCH + lectura de la versión en un viaje; la transacción en otro
+            _, current = _check(self.client.pipeline([("WATCH", version_key), ("GET", version_key)]))
+            if int(current or 0) != expected_version:
+                self.client.execute("UNWATCH")
+                self._conflicts += 1
+                raise SessionConflict(f"{user_id}: versión {current}, se esperaba {expected_version}")
+            replies = _check(self.client.pipeline([
+                ("MULTI",), ("SET", state_key, payload), ("INCR", version_key), ("EXEC",)
+            ]))
+        if replies[-1] is None:
+            # EXEC nulo: otro nodo cambió la versión entre WATCH y EXEC
+            self._conflicts += 1
+            raise SessionConflict(f"{user_id}: la sesión cambió durante la transacción")
+        return replies[-1][-1]
+
+    def clear_session(self, user_id: str) -> int:
+        """
+        Borra mensajes, resumen y estado pero no la versión: la incrementa,
+        así otro nodo con una copia en memoria de la versión N no puede
+        confundirla con una sesión nueva que llegue otra vez a N
+        """
+        turns_key, summary_key, state_key, version_key = self._keys(user_id)
+        return self._transaction(version_key, [("DEL", turns_key, summary_key, state_key)])
+
+    def close(self):
+        self.client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Viajes de ida y vuelta, comandos y conflictos (para /status)"""
+        return {
+            "backend": "redis",
+            "server": f"{self.client.host}:{self.client.port}/{self.client.db}",
+            "round_trips": self.client.round_trips,
+            "commands": self.client.commands,
+            "conflicts": self._conflicts,
+            "restored_users": self._restored,
+        }
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Servidor en proceso que habla el protocolo de Redis (RESP2) con el
+subconjunto de comandos que usa RedisSessionBackend. Sirve para pruebas y
+benchmarks sin un Redis real; en producción se usa REDIS_URL.
+"""
+
+import socketserver
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+
+from redis_backend import RedisError, read_reply
+
+
+class _Status(str):
+    """Respuesta simple (+OK, +QUEUED)"""
+
+
+OK = _Status("OK")
+QUEUED = _Status("QUEUED")
+NULL_ARRAY = object()
+
+
+def _encode_reply(value: Any) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RedisError):
+        return f"-{value}\r\n".encode()
+    if isinstance(value, bool):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode_reply(item) for item in value)
+    if isinstance(value, _Status):
+        return f"+{value}\r\n".encode()
+    data = value.encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+class _Keyspace:
+    """Claves (str o list) y contador de modificaciones por clave para WATCH"""
+
+    def __init__(self, password: Optional[str] = None, databases: int = 16):
+        self.values: Dict[str, Any] = {}
+        self.modified: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.password = password
+        self.databases = databases
+        self._clock = 0
+
+    def touch(self, key: str):
+        self._clock += 1
+        self.modified[key] = self._clock
+
+    def execute(self, name: str, args: List[str]) -> Any:
+        """Ejecuta un comando con el lock tomado"""
+        values = self.values
+        if name == "PING":
+            return _Status("PONG")
+        if name == "AUTH":
+            if self.password is not None and args[-1:] != [self.password]:
+                return RedisError("WRONGPASS invalid username-password pair or user is disabled.")
+            return OK
+        if name == "SELECT":
+            # Todas las bases comparten el mismo espacio de claves; solo se valida el índice
+            if not args or not args[0].isdigit() or int(args[0]) >= self.databases:
+                return RedisError("ERR DB index is out of range")
+            return OK
+        if name == "GET":
+            value = values.get(args[0])
+            if isinstance(value, list):
+                return RedisError("WRONGTYPE Operation against a key holding the wrong kind of value")
+            return value
+        if name == "SET":
+            values[args[0]] = args[1]
+            self.touch(args[0])
+            return OK
+        if name == "DEL":
+            removed = 0
+            for key in args:
+                if values.pop(key, None) is not None:
+                    removed += 1
+                    self.touch(key)
+            return removed
+        if name == "INCR":
+            value = int(values.get(args[0]) or 0) + 1
+            values[args[0]] = str(value)
+            self.touch(args[0])
+            return value
+        if name == "RPUSH":
+            items = values.setdefault(args[0], [])
+            items.extend(args[1:])
+            self.touch(args[0])
+            return len(items)
+        if name in ("LRANGE", "LTRIM"):
+            items = values.get(args[0], [])
+            start, stop = int(args[1]), int(args[2])
+            length = len(items)
+            start = max(0, start + length if start < 0 else start)
+            stop = stop + length if stop < 0 else min(stop, length - 1)
+            selected = items[start:stop + 1] if start <= stop else []
+            if name == "LRANGE":
+                return list(selected)
+            if selected:
+                values[args[0]] = selected
+            else:
+                values.pop(args[0], None)
+            self.touch(args[0])
+            return OK
+        if name == "FLUSHDB":
+            for key in list(values):
+                self.touch(key)
+            values.clear()
+            return OK
+        return RedisError(f"ERR unknown command '{name}'")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # Sin Nagle: las respuestas de un pipeline salen en cuanto se escriben
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        keyspace: _Keyspace = self.server.keyspace
+        watched: Dict[str, int] = {}
+        queued: Optional[List[Tuple[str, List[str]]]] = None
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (RedisError, ConnectionError, ValueError):
+                return
+            if not isinstance(command, list) or not command:
+                return
+            name, args = command[0].upper(), command[1:]
+            if name == "MULTI":
+                queued = []
+                reply: Any = OK
+            elif name == "EXEC":
+                with keyspace.lock:
+                    if queued is None:
+                        reply = RedisError("ERR EXEC without MULTI")
+                    elif any(keyspace.modified.get(key, 0) != seen for key, seen in watched.items()):
+                        reply = NULL_ARRAY
+                    else:
+                        reply = [keyspace.execute(queued_name, queued_args) for queued_name, queued_args in queued]
+                queued = None
+                watched = {}
+            elif name == "DISCARD":
+                queued, watched, reply = None, {}, OK
+            elif queued is not None:
+                queued.append((name, args))
+                reply = QUEUED
+            elif name == "WATCH":
+                with keyspace.lock:
+                    for key in args:
+                        watched[key] = keyspace.modified.get(key, 0)
+                reply = OK
+            elif name == "UNWATCH":
+                watched, reply = {}, OK
+            else:
+                with keyspace.lock:
+                    reply = keyspace.execute(name, args)
+            self.wfile.write(b"*-1\r\n" if reply is NULL_ARRAY else _encode_reply(reply))
+
+
+class RespStandInServer(socketserver.ThreadingTCPServer):
+    """
+    Servidor RESP en un hilo del propio proceso (puerto libre por defecto):
+
+        with RespStandInServer() as server:
+            backend = RedisSessionBackend(RespClient(*server.address))
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, password: Optional[str] = None):
+        super().__init__((host, port), _Handler)
+        self.keyspace = _Keyspace(password)
+        self._thread = threading.Thread(target=self.serve_forever, name="resp-stand-in", daemon=True)
+        self._thread.start()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server_address[0], self.server_address[1]
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        super().__exit__(*exc_info)
+
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Acciones de WhatsApp (botones, datos de contacto) que acompañan a una
+respuesta del agente, detectadas con una sola pasada del texto por un matcher
+compilado con las marcas reales del catálogo y las palabras de cada señal
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional, Tuple
+
+from keyword_matcher import KeywordMatcher
+from vehicle_catalog import VehicleCatalog, get_catalog
+
+# Palabras de cada señal. Las fichas y listados están en inglés y todos llevan
+# "Price:", así que "price" solo cuenta cuando se habla de pagos o financiación.
+RESPONSE_SIGNALS = {
+    "price": ("financing", "finance", "monthly payment", "down payment", "payment plan",
+              "financiación", "financiamiento", "cuota mensual", "mensualidad"),
+    "appointment": ("cita", "horarios", "agendar", "appointment"),
+    "contact": ("contacto", "ubicación", "dirección", "teléfono"),
+    # Las respuestas sin resultados del agente: "Sorry, we currently don't have any..."
+    "no_results": ("we don't have", "we don’t have", "we do not have", "we currently don't have",
+                   "we currently don’t have", "we don't currently have", "we don’t currently have",
+                   "couldn't find", "couldn’t find", "could not find", "no vehicles", "no cars",
+                   "no matching", "out of stock", "no hay", "no tengo", "no tenemos"),
+}
+
+
+class ResponseAction(ABC):
+    """Acción para la respuesta; `to_dict` da el formato que envía MessageManager"""
+
+    __slots__ = ()
+    kind = ""
+
+    @abstractmethod
+    def to_dict(self) -> Dict[str, Any]:
+        """{"type": ..., "data": ...} para MessageManager"""
+
+
+class ButtonsAction(ResponseAction):
+    """Mensaje con hasta tres botones de respuesta"""
+
+    __slots__ = ("header", "body", "buttons")
+    kind = "buttons"
+
+    def __init__(self, header: str, body: str, buttons: Tuple[Tuple[str, str], ...]):
+        self.header = header
+        self.body = body
+        self.buttons = buttons
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.kind,
+            "data": {
+                "header": self.header,
+                "body": self.body,
+                "buttons": [{"id": button_id, "title": title} for button_id, title in self.buttons]
+            }
+        }
+
+
+class ContactInfoAction(ResponseAction):
+    """Horarios, ubicación y contacto del concesionario"""
+
+    __slots__ = ()
+    kind = "contact_info"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": self.kind, "data": {"send_location": True, "send_contact": True}}
+
+
+# Acciones fijas, creadas una vez por proceso. Todos los ids de botón tienen
+# ruta en InteractiveRouter; no hay sugerencia de financiación porque no se
+# ofrece por este canal y sus botones no llevarían a ninguna parte.
+CARS_ACTION = ButtonsAction("🚗 Autos encontrados", "¿Te gustaría ver más detalles de alguno?", (
+    ("see_details", "Ver detalles"), ("compare_cars", "Comparar"), ("schedule_test", "Agendar prueba")))
+APPOINTMENT_ACTION = ButtonsAction("📅 Agendar cita", "¿Qué tipo de cita necesitas?", (
+    ("test_drive", "Prueba de manejo"), ("consultation", "Consulta"), ("inspection", "Inspección")))
+CONTACT_ACTION = ContactInfoAction()
+NO_RESULTS_SUGGESTION = ButtonsAction("🔍 Otras opciones", "¿Te gustaría intentar otra búsqueda?", (
+    ("see_all_cars", "Ver todo"), ("car_type_economic", "Económicos"), ("car_type_family", "Familiares")))
+
+
+class ResponseAnalysis:
+    """Tipo de respuesta, acciones, sugerencias y marcas mencionadas"""
+
+    __slots__ = ("type", "actions", "suggestions", "brands")
+
+    def __init__(self, response_type: str, actions: List[ResponseAction],
+                 suggestions: List[ResponseAction], brands: List[str]):
+        self.type = response_type
+        self.actions = actions
+        self.suggestions = suggestions
+        self.brands = brands
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.type,
+            "actions": [action.to_dict() for action in self.actions],
+            "suggestions": [suggestion.to_dict() for suggestion in self.suggestions],
+            "car_mentions": self.brands
+        }
+
+
+class ResponseAnalyzer:
+    """
+    Matcher de marcas y señales reconstruido solo cuando cambia la versión
+    del inventario. Las marcas son las que tenemos en stock, no una lista fija.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._compiled: Tuple[Optional[str], Optional[KeywordMatcher]] = (None, None)
+
+    def matcher(self, catalog: Optional[VehicleCatalog] = None) -> KeywordMatcher:
+        catalog = catalog or get_catalog()
+        version, matcher = self._compiled
+        if version != catalog.version or matcher is None:
+            with self._lock:
+                brands = sorted({car["brand"] for car in catalog})
+                matcher = KeywordMatcher(
+                    [(brand, ("brand", brand)) for brand in brands] +
+                    [(word, ("signal", signal)) for signal, words in RESPONSE_SIGNALS.items() for word in words]
+                )
+                self._compiled = (catalog.version, matcher)
+        return matcher
+
+    def analyze(self, response: str) -> ResponseAnalysis:
+        brands: List[str] = []
+        signals = set()
+        for kind, value in self.matcher().values(response):
+            if kind == "brand":
+                brands.append(value)
+            else:
+                signals.add(value)
+        brands.sort()
+
+        actions: List[ResponseAction] = []
+        suggestions: List[ResponseAction] = []
+        response_type = "text"
+        # Mismo orden de prioridad que antes: gana la última señal encontrada
+        if brands:
+            response_type = "cars_mentioned"
+            actions.append(CARS_ACTION)
+        if "price" in signals:
+            response_type = "price_mentioned"
+        if "appointment" in signals:
+            response_type = "appointment_mentioned"
+            actions.append(APPOINTMENT_ACTION)
+        if "contact" in signals:
+            response_type = "contact_mentioned"
+            actions.append(CONTACT_ACTION)
+        if "no_results" in signals:
+            response_type = "no_results"
+            suggestions.append(NO_RESULTS_SUGGESTION)
+        return ResponseAnalysis(response_type, actions, suggestions, brands)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Persistencia de sesiones (estado de usuario, historial y resúmenes) en SQLite
+con escritura diferida: sobrevive a reinicios y redeploys sin añadir latencia
+al camino crítico de cada mensaje
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, List, Tuple
+
+DEFAULT_SESSION_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sessions.db")
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS user_states (user_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+    "role TEXT NOT NULL, content TEXT NOT NULL, tokens INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS messages_user ON messages (user_id, id)",
+    "CREATE TABLE IF NOT EXISTS summaries (user_id TEXT PRIMARY KEY, summary TEXT NOT NULL)",
+)
+
+
+class SQLiteSessionBackend:
+    """
+    Base SQLite en modo WAL. Las escrituras se encolan en memoria y un hilo de
+    fondo las aplica en una sola transacción por lote: cada SESSION_FLUSH_INTERVAL
+    segundos como máximo, o antes si la cola llega a SESSION_FLUSH_BATCH
+    operaciones. Restaurar un usuario con operaciones aún en cola vacía antes
+    la cola, así que nunca devuelve datos más antiguos que los de la memoria.
+
+    Si un lote falla vuelve a la cola, delante de las operaciones nuevas, y se
+    reintenta hasta SESSION_FLUSH_RETRIES veces; después se aplica operación a
+    operación y solo se descartan (y se cuentan) las que siguen fallando.
+    """
+
+    # Un solo proceso escribe en la base: la memoria del proceso siempre es la copia más reciente
+    shared = False
+
+    def __init__(self, path: str = DEFAULT_SESSION_DB_PATH, flush_interval: Optional[float] = None,
+                 batch_size: Optional[int] = None, max_retries: Optional[int] = None):
+        if flush_interval is None:
+            flush_interval = float(os.getenv('SESSION_FLUSH_INTERVAL', '0.5'))
+        if batch_size is None:
+            batch_size = int(os.getenv('SESSION_FLUSH_BATCH', '500'))
+        if max_retries is None:
+            max_retries = int(os.getenv('SESSION_FLUSH_RETRIES', '5'))
+        self.path = path
+        self.flush_interval = max(0.01, flush_interval)
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max(0, max_retries)
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Una conexión compartida por el hilo de escritura y las lecturas, protegida por _db_lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._connection.execute(statement)
+        self._connection.commit()
+        self._db_lock = threading.Lock()
+
+        self._queue: List[Tuple] = []
+        self._queued_users: set = set()
+        self._condition = threading.Condition()
+        self._closed = False
+        # Fallos seguidos del lote que está en la cabeza de la cola
+        self._failures = 0
+        self._stats = {"operations": 0, "batches": 0, "restored_users": 0, "flush_ms_max": 0.0,
+                       "flush_errors": 0, "dropped_operations": 0}
+        self._writer = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # Escritura diferida
+
+    def _enqueue(self, operation: Tuple):
+        with self._condition:
+            if self._closed:
+                return
+            self._queue.append(operation)
+            self._queued_users.add(operation[1])
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify()
+
+    def save_state(self, user_id: str, state: Dict[str, Any], expected_version: Optional[int] = None):
+        # Se serializa ahora: el diccionario puede cambiar antes de escribirse
+        self._enqueue(("state", user_id, json.dumps(state, ensure_ascii=False, default=str)))
+
+    def append_message(self, user_id: str, role: str, content: str, tokens: int, evicted: int = 0):
+        """Añade un mensaje y borra los `evicted` más antiguos del usuario (expulsados del buffer)"""
+        self._enqueue(("message", user_id, role, content, tokens))
+        if evicted:
+            self._enqueue(("evict", user_id, evicted))
+
+    def save_summary(self, user_id: str, summary: str):
+        self._enqueue(("summary", user_id, summary))
+
+    def clear_session(self, user_id: str):
+        self._enqueue(("clear", user_id))
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if len(self._queue) < self.batch_size and not self._closed:
+                    # Agrupar lo que llegue durante el intervalo en el mismo lote
+                    self._condition.wait(self.flush_interval)
+                closed = self._closed
+            flushed = self.flush()
+            if closed:
+                return
+            if not flushed:
+                # Esperar antes de reintentar, aunque la cola esté llena
+                time.sleep(self.flush_interval)
+
+    def flush(self) -> bool:
+        """Aplica todas las operaciones pendientes en una transacción; False si el lote falló"""
+        with self._db_lock:
+            with self._condition:
+                batch, self._queue = self._queue, []
+                self._queued_users = set()
+            if not batch:
+                return True
+            start = time.perf_counter()
+            try:
+                self._apply(batch)
+                self._connection.commit()
+            except sqlite3.Error as e:
+                self._connection.rollback()
+                self._stats["flush_errors"] += 1
+                self._failures += 1
+                if self._failures <= self.max_retries:
+                    print(f"⚠️ Error guardando {len(batch)} operaciones de sesión ({e}); "
+                          f"reintento {self._failures}/{self.max_retries}")
+                    with self._condition:
+                        self._queue = batch + self._queue
+                        self._queued_users.update(operation[1] for operation in batch)
+                    return False
+                self._failures = 0
+                dropped = self._apply_each(batch)
+                self._stats["dropped_operations"] += dropped
+                print(f"❌ {dropped} de {len(batch)} operaciones de sesión descartadas "
+                      f"tras {self.max_retries} reintentos: {e}")
+                return not dropped
+            self._failures = 0
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._stats["operations"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["flush_ms_max"] = max(self._stats["flush_ms_max"], round(elapsed_ms, 2))
+            return True
+
+    def _apply(self, batch: List[Tuple]):
+        execute = self._connection.execute
+        # Mensajes seguidos se insertan juntos con executemany; el resto en orden
+        messages: List[Tuple] = []
+        for operation in batch:
+            kind = operation[0]
+            if kind == "message":
+                messages.append(operation[1:])
+                continue
+            if messages:
+                self._connection.executemany(
+                    "INSERT INTO messages (user_id, role, content, tokens) VALUES (?, ?, ?, ?)", messages)
+                messages = []
+            if kind == "state":
+                execute("INSERT OR REPLACE INTO user_states (user_id, state, updated) VALUES (?, ?, ?)",
+                        (operation[1], operation[2], time.time()))
+            elif kind == "evict":
+                execute("DELETE FROM messages WHERE id IN "
+                        "(SELECT id FROM messages WHERE user_id = ? ORDER BY id LIMIT ?)", operation[1:])
+            elif kind == "summary":
+                execute("INSERT OR REPLACE INTO summaries (user_id, summary) VALUES (?, ?)", operation[1:])
+            elif kind == "clear":
+                execute("DELETE FROM messages WHERE user_id = ?", (operation[1],))
+                execute("DELETE FROM summaries WHERE user_id = ?", (operation[1],))
+                execute("DELETE FROM user_states WHERE user_id = ?", (operation[1],))
+        if messages:
+            self._connection.executemany(
+                "INSERT INTO messages (user_id, role, content, tokens) VALUES (?, ?, ?, ?)", messages)
+
+    def _apply_each(self, batch: List[Tuple]) -> int:
+        """Aplica el lote operación a operación; devuelve cuántas fallaron"""
+        failed = 0
+        for operation in batch:
+            try:
+                self._apply([operation])
+                self._connection.commit()
+            except sqlite3.Error:
+                self._connection.rollback()
+                failed += 1
+        self._stats["operations"] += len(batch) - failed
+        return failed
+
+    # Restauración perezosa (la primera vez que se ve a un usuario tras arrancar)
+
+    def _flush_user(self, user_id: str):
+        with self._condition:
+            queued = user_id in self._queued_users
+        if queued:
+            self.flush()
+
+    def load_session(self, user_id: str, limit: int) -> Optional[Dict[str, Any]]:
+        """
+        Sesión guardada del usuario: últimos `limit` mensajes [role, content,
+        tokens] en orden, resumen y estado; None si no hay nada guardado
+        """
+        self._flush_user(user_id)
+        with self._db_lock:
+            rows = self._connection.execute(
+                "SELECT role, content, tokens FROM messages WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, limit)).fetchall()
+            summary = self._connection.execute(
+                "SELECT summary FROM summaries WHERE user_id = ?", (user_id,)).fetchone()
+            state = self._connection.execute(
+                "SELECT state FROM user_states WHERE user_id = ?", (user_id,)).fetchone()
+        if not rows and summary is None and state is None:
+            return None
+        self._stats["restored_users"] += 1
+        rows.reverse()
+        return {
+            "turns": rows,
+            "summary": summary[0] if summary else None,
+            "state": json.loads(state[0]) if state else None
+        }
+
+    def close(self):
+        """Escribe lo pendiente y cierra la base (también al salir del proceso)"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._writer.join(timeout=5)
+        # Un lote que falla vuelve a la cola hasta agotar los reintentos
+        for _ in range(self.max_retries + 2):
+            if self.flush():
+                break
+        with self._db_lock:
+            self._connection.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Operaciones escritas, lotes y cola pendiente (para /status)"""
+        with self._condition:
+            pending = len(self._queue)
+        stats = dict(self._stats)
+        stats.update({"backend": "sqlite", "pending": pending, "flush_interval_s": self.flush_interval})
+        return stats
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_session_backend():
+    """
+    Backend de sesiones del proceso según SESSION_BACKEND: "sqlite" (por
+    defecto, base en SESSION_DB_PATH), "redis" (compartido entre instancias,
+    servidor en REDIS_URL) o "memory" para no persistir
+    """
+    global _backend
+    kind = os.getenv('SESSION_BACKEND', 'sqlite').lower()
+    if kind == 'memory':
+        return None
+    with _backend_lock:
+        if _backend is None:
+            if kind == 'redis':
+                from redis_backend import RedisError, RedisSessionBackend, RespClient
+                url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+                client = RespClient.from_url(url)
+                try:
+                    client.execute("PING")
+                except RedisError as e:
+                    print(f"⚠️ No se pudo conectar a Redis ({e}); se usará solo memoria")
+                    return None
+                _backend = RedisSessionBackend(client)
+                print(f"💾 Sesiones compartidas en Redis {client.host}:{client.port}/{client.db}")
+                return _backend
+            path = os.getenv('SESSION_DB_PATH', DEFAULT_SESSION_DB_PATH)
+            try:
+                _backend = SQLiteSessionBackend(path)
+                print(f"💾 Sesiones persistidas en {path}")
+            except sqlite3.Error as e:
+                print(f"⚠️ No se pudo abrir la base de sesiones {path}: {e}; se usará solo memoria")
+                return None
+        return _backend
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Nivel frío de sesiones: las sesiones inactivas que salen de memoria se
+guardan comprimidas en disco local hasta el siguiente mensaje del usuario
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from typing import Dict, Any, Optional
+
+DEFAULT_COLD_SESSION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cold_sessions")
+
+
+class ColdSessionTier:
+    """
+    Un fichero por usuario con la sesión en JSON comprimido con zlib. El
+    nombre es un hash del identificador, así que los teléfonos no quedan a la
+    vista en el sistema de ficheros. El fichero se borra al rehidratar: desde
+    ese momento la copia en memoria es la buena.
+
+    Los nombres presentes se guardan en un conjunto en memoria (se lee el
+    directorio al arrancar), así que un usuario nuevo no cuesta ninguna
+    llamada al sistema de ficheros.
+    """
+
+    def __init__(self, directory: str = DEFAULT_COLD_SESSION_DIR, level: int = 6):
+        self.directory = directory
+        self.level = level
+        os.makedirs(directory, exist_ok=True)
+        self._names = {name for name in os.listdir(directory) if name.endswith(".z")}
+
+    @staticmethod
+    def _name(user_id: str) -> str:
+        return hashlib.sha1(user_id.encode()).hexdigest() + ".z"
+
+    def write(self, user_id: str, session: Dict[str, Any]) -> int:
+        """Guarda la sesión; devuelve los bytes escritos"""
+        data = zlib.compress(json.dumps(session, ensure_ascii=False, default=str).encode(), self.level)
+        name = self._name(user_id)
+        path = os.path.join(self.directory, name)
+        # Escritura atómica: un proceso que muere a medias no deja un fichero truncado
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+        self._names.add(name)
+        return len(data)
+
+    def take(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Lee y elimina la sesión del usuario; None si no hay ninguna"""
+        name = self._name(user_id)
+        if name not in self._names:
+            return None
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._names.discard(name)
+            return None
+        try:
+            session = json.loads(zlib.decompress(data))
+        except (zlib.error, ValueError) as e:
+            print(f"⚠️ Sesión fría ilegible de {user_id}: {e}")
+            session = None
+        self.discard(user_id)
+        return session
+
+    def discard(self, user_id: str):
+        name = self._name(user_id)
+        if name not in self._names:
+            return
+        self._names.discard(name)
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+def get_cold_tier() -> Optional[ColdSessionTier]:
+    """Nivel frío según SESSION_COLD_DIR ("" lo desactiva: las sesiones expulsadas solo se recuperan del backend)"""
+    directory = os.getenv('SESSION_COLD_DIR', DEFAULT_COLD_SESSION_DIR)
+    if not directory:
+        return None
+    try:
+        return ColdSessionTier(directory)
+    except OSError as e:
+        print(f"⚠️ No se pudo usar el directorio de sesiones frías {directory}: {e}")
+        return None
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Preguntas cortas sobre un atributo del vehículo en foco ("what's the price?",
+"is it automatic?", "how many km does it have?") respondidas directamente con
+el catálogo, sin enviar el historial a gpt-4o-mini. Lo que no se puede
+responder con seguridad (comparaciones, varias marcas, financiación...) vuelve
+al LLM.
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+from keyword_matcher import KeywordMatcher
+from vehicle_catalog import VehicleCatalog, get_catalog
+
+# Frases → atributo; la coincidencia más larga gana ("how much does it consume" es consumo, no precio)
+SLOT_PHRASES = {
+    "price": ("price", "how much", "how much is it", "how much does it cost", "cost", "costs", "priced"),
+    "power": ("power", "horsepower", "hp", "how powerful", "kw", "how much power", "how much horsepower"),
+    "transmission": ("transmission", "gearbox", "automatic", "manual", "gears"),
+    "mileage": ("mileage", "km", "kms", "kilometers", "kilometres", "miles", "how many km", "odometer"),
+    "warranty": ("warranty", "guarantee"),
+    "trunk": ("trunk", "boot", "luggage", "cargo space", "trunk capacity"),
+    "consumption": ("consumption", "consume", "consumes", "how much does it consume", "fuel economy",
+                    "mpg", "l/100km", "fuel efficient"),
+    "color": ("color", "colour", "what color", "what colour"),
+}
+SLOT_FIELDS = {
+    "price": "price", "power": "power", "transmission": "transmission", "mileage": "mileage",
+    "warranty": "warranty", "trunk": "trunk_capacity", "consumption": "consumption", "color": "color",
+}
+SLOT_ANSWERS = {
+    "price": "💰 The {name} is priced at {value}.",
+    "power": "🏎️ The {name} delivers {value}.",
+    "transmission": "⚙️ Transmission of the {name}: {value}.",
+    "mileage": "📊 Mileage of the {name}: {value}.",
+    "warranty": "🛡️ The {name} comes with {value}.",
+    "trunk": "🧳 The {name} has {value} of trunk space.",
+    "consumption": "⛽ The {name} consumes {value}.",
+    "color": "🎨 The {name} is {value}.",
+}
+# Comparaciones, negociación o preguntas abiertas: mejor el LLM con el historial
+BLOCKING_PHRASES = (
+    "which", "compare", "comparison", "versus", "vs", "than", "difference", "bigger", "smaller",
+    "better", "best", "cheaper", "more", "less", "discount", "financing", "finance", "loan",
+    "monthly", "negotiate", "both", "them", "these", "those", "all", "other", "others", "why",
+    "trade in", "insurance", "insure", "insured", "negotiable", "negotiation", "haggle", "deal",
+    # Citas y visitas: "book an appointment to check the warranty" no pregunta por la garantía
+    "book", "booking", "appointment", "schedule", "test drive", "visit", "reserve",
+    # Distancia o ubicación del concesionario ("how far are you in km?")
+    "far", "distance", "where", "located", "location",
+    # Búsquedas en el inventario ("do you have manual cars?"), no preguntas sobre el vehículo en foco
+    "cars", "vehicles", "models", "do you have", "any", "show me", "options", "available",
+)
+_BLOCKED = object()
+QUESTION_MATCHER = KeywordMatcher(
+    [(phrase, slot) for slot, phrases in SLOT_PHRASES.items() for phrase in phrases] +
+    [(phrase, _BLOCKED) for phrase in BLOCKING_PHRASES]
+)
+# "is it automatic?": respuesta de sí o no además del dato
+YES_NO_STARTS = ("is ", "does ", "has ", "can ", "is it", "it's ")
+TRANSMISSION_WORDS = ("automatic", "manual")
+MAX_QUESTION_WORDS = 12
+# Marcas habituales que pueden no estar en stock: nombrarlas nunca es preguntar por el vehículo en foco
+OTHER_BRANDS = (
+    "toyota", "tesla", "honda", "volkswagen", "vw", "nissan", "hyundai", "kia", "mazda", "peugeot",
+    "renault", "citroen", "citroën", "fiat", "opel", "skoda", "škoda", "volvo", "porsche", "lexus",
+    "jeep", "chevrolet", "dacia", "cupra", "land rover", "range rover", "jaguar", "mitsubishi",
+    "subaru", "suzuki", "alfa romeo", "ferrari", "lamborghini", "maserati", "bmw", "mercedes",
+    "mercedes-benz", "audi", "seat", "ford",
+)
+
+
+def _vehicle_name_matcher(catalog: VehicleCatalog) -> KeywordMatcher:
+    """
+    Todo lo que nombra vehículos, con los ids a los que puede referirse:
+    marca y modelo, modelo, marca (todos sus modelos), las palabras clave del
+    catálogo ("mercedes", colores, tipos) y marcas que no tenemos (ninguno).
+    En caso de repetición gana la primera entrada.
+    """
+    brands: Dict[str, set] = {}
+    for car in catalog:
+        brands.setdefault(car["brand"].lower(), set()).add(car["id"])
+    names = []
+    for car in catalog:
+        names.append((f"{car['brand']} {car['model']}", frozenset((car["id"],))))
+        names.append((car["model"], frozenset((car["id"],))))
+    names.extend((brand, frozenset(ids)) for brand, ids in brands.items())
+    names.extend((keyword, frozenset((vehicle_id,))) for keyword, vehicle_id in catalog.keywords)
+    names.extend((brand, frozenset()) for brand in OTHER_BRANDS)
+    return KeywordMatcher(names)
+
+
+class SlotQuestionResolver:
+    """
+    Responde preguntas de atributo sobre el vehículo en foco de la sesión (o
+    el que nombra el propio mensaje). `answer` devuelve (texto, vehículo) o
+    None si la pregunta debe ir al LLM.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names: Tuple[Optional[str], Optional[KeywordMatcher]] = (None, None)
+
+    def _name_matcher(self, catalog: VehicleCatalog) -> KeywordMatcher:
+        version, matcher = self._names
+        if version != catalog.version or matcher is None:
+            with self._lock:
+                matcher = _vehicle_name_matcher(catalog)
+                self._names = (catalog.version, matcher)
+        return matcher
+
+    def answer(self, message: str, focused_vehicle: Optional[str]) -> Optional[Tuple[str, str]]:
+        text = message.strip().lower()
+        if not text or len(text.split()) > MAX_QUESTION_WORDS:
+            return None
+        matches = QUESTION_MATCHER.find_longest(text)
+        slots = []
+        for _, _, _, slot in matches:
+            if slot is _BLOCKED:
+                return None
+            if slot not in slots:
+                slots.append(slot)
+        if not slots:
+            return None
+
+        catalog = get_catalog()
+        # Cada nombre del mensaje debe referirse exactamente a un único vehículo, el mismo para todos
+        # (y, si hay vehículo en foco, a ese): "how much is the bmw?" con dos BMW o con un Audi en foco va al LLM
+        named = {match[3] for match in self._name_matcher(catalog).find_longest(text)}
+        if named:
+            if len(named) > 1:
+                return None
+            ids = named.pop()
+            if len(ids) != 1 or (focused_vehicle and focused_vehicle not in ids):
+                return None
+            vehicle_id = next(iter(ids))
+        else:
+            vehicle_id = focused_vehicle
+        car = catalog.get(vehicle_id) if vehicle_id else None
+        if car is None:
+            return None
+
+        name = f"{car['brand']} {car['model']}"
+        lines = []
+        for slot in slots:
+            value = car.get(SLOT_FIELDS[slot])
+            if not value:
+                return None
+            line = SLOT_ANSWERS[slot].format(name=name, value=value)
+            if slot == "transmission" and text.startswith(YES_NO_STARTS):
+                asked = [word for word in TRANSMISSION_WORDS if word in text]
+                if len(asked) == 1:
+                    # "S tronic", "9G-TRONIC", "Steptronic": todo lo que no dice manual es automático
+                    is_manual = "manual" in value.lower()
+                    line = ("Yes! " if (asked[0] == "manual") == is_manual else "No. ") + line
+            lines.append(line)
+        lines.append("💬 Anything else you'd like to know about it?")
+        return "\n".join(lines), car["id"]
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Ejecución especulativa de GENERAL_CHAT en paralelo con la clasificación de intención
+"""
+
+import os
+import threading
+from typing import Dict, Any, Optional
+
+from agent_metrics import metrics as default_metrics
+from llm_client import HedgeBudget
+
+
+class SpeculationGuard:
+    """
+    Decide cuándo lanzar la completion de chat general antes de conocer la
+    intención y lleva la cuenta de latencia ahorrada frente a tokens extra.
+
+    El límite de coste es una fracción máxima de mensajes especulados
+    (SPECULATIVE_CHAT_MAX_RATE); los tokens de las especulaciones canceladas se
+    estiman con el estimador local porque la API no devuelve su uso.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, max_rate: Optional[float] = None, metrics=None):
+        if enabled is None:
+            enabled = os.getenv('SPECULATIVE_CHAT', '0').lower() in ('1', 'true', 'yes')
+        if max_rate is None:
+            max_rate = float(os.getenv('SPECULATIVE_CHAT_MAX_RATE', '0.5'))
+        self.enabled = enabled
+        self.max_rate = max_rate
+        self.metrics = metrics or default_metrics
+        self._budget = HedgeBudget(ratio=max_rate, max_burst=3.0)
+        self._lock = threading.Lock()
+        self._stats = {
+            "messages": 0,
+            "launched": 0,
+            "skipped_by_guard": 0,
+            "hits": 0,
+            "cancelled": 0,
+            "latency_saved_s": 0.0,
+            "extra_prompt_tokens": 0,
+            "extra_completion_tokens": 0
+        }
+
+    def should_speculate(self) -> bool:
+        """True si este mensaje puede lanzar una especulación"""
+        if not self.enabled:
+            return False
+        self._budget.on_request()
+        with self._lock:
+            self._stats["messages"] += 1
+        if self._budget.try_acquire():
+            self._bump("launched")
+            return True
+        self._bump("skipped_by_guard")
+        return False
+
+    def record_hit(self, latency_saved: float):
+        """La intención fue GENERAL_CHAT y se aprovechó la respuesta especulada"""
+        with self._lock:
+            self._stats["hits"] += 1
+            self._stats["latency_saved_s"] += max(0.0, latency_saved)
+        self.metrics.increment("speculation.hits")
+
+    def record_waste(self, prompt_tokens: int, completion_tokens: int = 0):
+        """La especulación se descartó: contabilizar los tokens gastados de más"""
+        with self._lock:
+            self._stats["cancelled"] += 1
+            self._stats["extra_prompt_tokens"] += prompt_tokens
+            self._stats["extra_completion_tokens"] += completion_tokens
+        self.metrics.increment("speculation.cancelled")
+
+    def report(self) -> Dict[str, Any]:
+        """Latencia ahorrada frente a tokens extra gastados"""
+        with self._lock:
+            stats = dict(self._stats)
+        launched = stats["launched"]
+        stats["hit_rate"] = round(stats["hits"] / launched, 3) if launched else 0.0
+        stats["avg_latency_saved_ms"] = round(1000 * stats["latency_saved_s"] / stats["hits"], 1) if stats["hits"] else 0.0
+        extra_tokens = stats["extra_prompt_tokens"] + stats["extra_completion_tokens"]
+        stats["extra_tokens_per_second_saved"] = round(extra_tokens / stats["latency_saved_s"], 1) if stats["latency_saved_s"] else None
+        stats["latency_saved_s"] = round(stats["latency_saved_s"], 3)
+        return stats
+
+    def _bump(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+        self.metrics.increment(f"speculation.{key}")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la caché semántica de respuestas
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from agent_metrics import AgentMetrics
+from answer_cache import SemanticAnswerCache, question_vector
+
+
+@pytest.fixture
+def cache():
+    answers = SemanticAnswerCache(enabled=True, threshold=0.8, ttl=3600, max_entries=100, metrics=AgentMetrics())
+    answers.store("is there a warranty?", "Yes, every vehicle comes with a warranty.")
+    return answers
+
+
+def test_paraphrase_hits(cache):
+    assert cache.lookup("Is there any warranty?") is not None
+
+
+@pytest.mark.parametrize("question", [
+    "is there no warranty?",
+    "isn't there a warranty?",
+    "¿no hay garantía?",
+])
+def test_negated_question_misses(cache, question):
+    assert cache.lookup(question) is None
+
+
+def test_negated_questions_match_each_other(cache):
+    cache.store("is there no warranty on used cars?", "All used cars have at least one year.")
+    hit = cache.lookup("is there no warranty on used cars")
+    assert hit is not None and hit[0].startswith("All used cars")
+
+
+def test_vectors_are_stable_across_processes():
+    script = "import json; from answer_cache import question_vector; print(json.dumps(question_vector('do you offer financing?')))"
+    root = os.path.dirname(os.path.abspath(__file__))
+    vectors = []
+    for seed in ("1", "2"):
+        output = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True,
+                                env={**os.environ, "PYTHONHASHSEED": seed}, check=True).stdout
+        vectors.append(json.loads(output.strip().splitlines()[-1]))
+    local = {str(bucket): weight for bucket, weight in question_vector("do you offer financing?").items()}
+    assert vectors[0] == vectors[1] == local
+
+
+def test_report_hides_questions_unless_asked(cache):
+    cache.lookup("is there a warranty?")
+    assert "top_questions" not in cache.report()
+    assert cache.report(include_questions=True)["top_questions"] == [{"question": "is there a warranty?", "hits": 1}]
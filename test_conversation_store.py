@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Pruebas del almacén de sesiones: buffer circular, expulsión LRU/TTL, nivel
+frío y reintento de update_state ante conflictos
+"""
+
+import pytest
+
+from agent_metrics import AgentMetrics
+from conversation_store import ConversationStore, SessionConflict
+from session_cache import ColdSessionTier
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ConflictingBackend:
+    """Backend compartido en memoria cuyo save_state falla `conflicts` veces con SessionConflict"""
+
+    shared = True
+
+    def __init__(self, conflicts: int):
+        self.conflicts = conflicts
+        self.saved = []
+
+    def version(self, user_id):
+        return 0
+
+    def load_session(self, user_id, limit):
+        return None
+
+    def append_message(self, user_id, role, content, tokens, evicted=0):
+        return None
+
+    def save_state(self, user_id, state, expected_version=None):
+        if self.conflicts:
+            self.conflicts -= 1
+            raise SessionConflict(user_id)
+        self.saved.append(dict(state))
+        return None
+
+    def clear_session(self, user_id):
+        pass
+
+    def stats(self):
+        return {"backend": "fake"}
+
+
+def make_store(**kwargs) -> ConversationStore:
+    kwargs.setdefault("metrics", AgentMetrics())
+    return ConversationStore(**kwargs)
+
+
+def test_append_keeps_last_messages_and_returns_evicted():
+    store = make_store(capacity=3)
+    evicted = [store.append("u", "user", f"m{index}", tokens=10) for index in range(5)]
+    assert [turn.content for turn in store.messages("u")] == ["m2", "m3", "m4"]
+    assert [turn.content for turns in evicted for turn in turns] == ["m0", "m1"]
+
+
+def test_token_budget_keeps_min_recent():
+    store = make_store(capacity=50)
+    for index in range(4):
+        store.append("u", "user", f"m{index}", tokens=100, token_budget=250, min_recent=1)
+    assert [turn.content for turn in store.messages("u")] == ["m2", "m3"]
+    store.append("u", "user", "huge", tokens=1000, token_budget=250, min_recent=1)
+    assert [turn.content for turn in store.messages("u")] == ["huge"]
+
+
+def test_lru_eviction_and_cold_round_trip(tmp_path):
+    cold = ColdSessionTier(str(tmp_path / "cold"))
+    store = make_store(capacity=10, max_resident=2, cold_tier=cold)
+    for user in ("a", "b", "c"):
+        store.append(user, "user", f"hello from {user}")
+        store.update_state(user, {"status": "active", "user": user})
+    assert "a" not in store
+    assert store.stats()["evicted_lru"] == 1
+    assert len(cold) == 1
+
+    # El siguiente acceso rehidrata la sesión completa y borra el fichero frío
+    assert [turn.content for turn in store.messages("a")] == ["hello from a"]
+    assert store.get_state("a") == {"status": "active", "user": "a"}
+    assert store.stats()["rehydrated_cold"] == 1
+    assert "a" in store
+    assert "b" not in store and len(cold) == 1
+
+
+def test_idle_sessions_are_evicted(tmp_path):
+    clock = FakeClock()
+    store = make_store(capacity=10, idle_ttl=60, clock=clock, cold_tier=ColdSessionTier(str(tmp_path)))
+    store.append("idle", "user", "hi")
+    clock.now += 61
+    store.append("active", "user", "hi")
+    assert "idle" not in store and "active" in store
+    assert store.stats()["evicted_idle"] == 1
+    assert store.message_count("idle") == 1
+
+
+def test_clear_removes_cold_copy(tmp_path):
+    cold = ColdSessionTier(str(tmp_path))
+    store = make_store(max_resident=1, cold_tier=cold)
+    store.append("a", "user", "hi")
+    store.append("b", "user", "hi")
+    assert len(cold) == 1
+    store.clear("a")
+    assert len(cold) == 0
+    assert store.messages("a") == []
+
+
+def test_update_state_retries_after_conflict():
+    backend = ConflictingBackend(conflicts=2)
+    store = make_store(backend=backend)
+    state = store.update_state("u", {"status": "active"})
+    assert state == {"status": "active"}
+    assert backend.saved == [{"status": "active"}]
+    assert store.stats()["conflicts"] == 2
+    assert store.get_state("u") == {"status": "active"}
+
+
+def test_update_state_gives_up_after_attempts():
+    store = make_store(backend=ConflictingBackend(conflicts=10))
+    with pytest.raises(SessionConflict):
+        store.update_state("u", {"status": "active"}, attempts=3)
+    assert store.get_state("u") is None
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los contadores de temas: se mantienen al expulsar turnos del
+buffer, al salir mensajes de la ventana y al expulsar y rehidratar sesiones
+del nivel frío
+"""
+
+from agent_metrics import AgentMetrics
+from conversation_store import ConversationStore
+from conversation_topics import TopicTracker
+from session_cache import ColdSessionTier
+
+
+def make_store(**kwargs) -> ConversationStore:
+    kwargs.setdefault("metrics", AgentMetrics())
+    kwargs.setdefault("tracker", TopicTracker())
+    return ConversationStore(**kwargs)
+
+
+def test_counters_follow_buffer_eviction():
+    store = make_store(capacity=3)
+    store.append("u", "user", "What is the price of the BMW?")
+    store.append("u", "assistant", "It costs €45,000")
+    store.append("u", "user", "Hello")
+    assert store.tracked("u")["topics"] == ["búsqueda de autos", "pricing/financing"]
+
+    # La pregunta del precio sale del buffer: ya no cuenta ni como mensaje ni como tema
+    store.append("u", "assistant", "Hi!")
+    report = store.tracked("u")
+    assert (report["messages"], report["user_messages"]) == (3, 1)
+    assert report["topics"] == [] and report["brands"] == {}
+    assert report["summary"].endswith("Topics: general conversation.")
+
+
+def test_window_only_counts_recent_messages():
+    store = make_store(capacity=20, tracker=TopicTracker(window=2))
+    store.append("u", "user", "I want to schedule a test drive")
+    store.append("u", "user", "Do you have an Audi?")
+    store.append("u", "user", "And a Ford?")
+    report = store.tracked("u")
+    assert report["messages"] == 3
+    assert report["topics"] == ["búsqueda de autos"]
+    assert report["brands"] == {"Audi": 1, "Ford": 1}
+
+
+def test_counters_survive_eviction_and_rehydration(tmp_path):
+    store = make_store(capacity=10, max_resident=1, cold_tier=ColdSessionTier(str(tmp_path)))
+    store.append("a", "user", "How much is the SEAT Leon? Any financing?")
+    store.append("a", "assistant", "The SEAT Leon costs €21,000")
+    store.append("a", "user", "Can I book an appointment?")
+    before = store.tracked("a")
+
+    store.append("b", "user", "Hello")
+    assert "a" not in store
+    # /status solo recorre las sesiones residentes y no rehidrata
+    assert list(store.tracked_sessions()) == ["b"]
+    assert "a" not in store
+
+    # Los contadores no viajan al nivel frío: se reconstruyen de los turnos
+    assert store.tracked("a") == before
+    assert before["brands"] == {"SEAT": 2}
+    assert before["topics"] == ["búsqueda de autos", "appointment", "pricing/financing"]
+    assert store.stats()["rehydrated_cold"] == 1
+
+    # Y siguen actualizándose de forma incremental tras la rehidratación
+    store.append("a", "user", "Is the BMW cheaper?")
+    report = store.tracked("a")
+    assert (report["messages"], report["user_messages"]) == (4, 3)
+    assert report["brands"] == {"SEAT": 2, "BMW": 1}
+
+
+def test_clear_drops_counters(tmp_path):
+    store = make_store(cold_tier=ColdSessionTier(str(tmp_path)))
+    store.append("u", "user", "Price of the Audi?")
+    store.clear("u")
+    assert store.tracked("u") is None
+    assert store.tracked_sessions() == {}
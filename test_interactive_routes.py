@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Pruebas del enrutado de botones y filas de listas (sin OpenAI ni base de sesiones)
+"""
+
+import os
+
+import pytest
+
+# Los agentes de las pruebas no deben escribir en la base de sesiones real
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("SESSION_COLD_DIR", "")
+
+
+@pytest.fixture(scope="module")
+def agent():
+    from chat_agent_python import CarDealershipChatAgent
+    agent = CarDealershipChatAgent()
+    agent.llm.client = None
+    return agent
+
+
+def test_see_details_shows_focused_vehicle(agent):
+    agent.focus_vehicle("+34600000001", "AUDI_A4_2022_WHT")
+    result = agent.interactive.dispatch("+34600000001", "see_details", "Ver detalles")
+    assert result.intent == "VEHICLE_DETAILS"
+    assert result.vehicle_id == "AUDI_A4_2022_WHT"
+    assert result.image_path
+    assert "Audi A4" in result.text
+
+
+def test_see_details_without_focus_lists_inventory(agent):
+    result = agent.interactive.dispatch("+34600000002", "see_details", "Ver detalles")
+    assert result.intent == "SEARCH_INVENTORY"
+    assert result.list_message is not None
+
+
+def test_vehicle_row_focuses_vehicle(agent):
+    agent.interactive.dispatch("+34600000003", "vehicle:BMW_X3_2023_BLU", "BMW X3 (2023)")
+    assert agent.focused_vehicle("+34600000003") == "BMW_X3_2023_BLU"
+    result = agent.interactive.dispatch("+34600000003", "see_details", "Ver detalles")
+    assert result.vehicle_id == "BMW_X3_2023_BLU"
+
+
+def test_unrouted_id(agent):
+    assert agent.interactive.dispatch("+34600000004", "unknown_button", "?") is None
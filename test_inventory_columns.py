@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Pruebas del top-k compartido por el inventario columnar, la búsqueda por
+equipamiento y los vehículos similares
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from inventory_columns import top_k_positions
+
+
+@pytest.mark.parametrize("k", [None, 0, 1, 3, 7, 20, 50])
+def test_matches_stable_sort(k):
+    rng = np.random.default_rng(7)
+    # Muchos empates, también en el valor de corte
+    keys = rng.integers(0, 5, size=20).astype(np.float64)
+    keys[3] = np.inf
+    expected = np.argsort(keys, kind="stable")[:k if k is not None else None]
+    assert top_k_positions(keys, k).tolist() == expected.tolist()
+
+
+def test_empty_keys():
+    assert top_k_positions(np.array([], dtype=np.float64), 3).tolist() == []
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los mensajes de lista: las filas precalculadas se descartan al
+recargar el inventario y nunca sirven datos de una versión anterior
+"""
+
+import pytest
+
+from inventory_lists import InventoryLists, inventory_lists
+from interactive_routes import VEHICLE_ROW_PREFIX
+from vehicle_catalog import VehicleCatalog, get_catalog, set_catalog
+
+PAGE_SIZE = 5
+
+
+def vehicle(vehicle_id: str, price: str = "€20,000", **fields):
+    car = {"id": vehicle_id, "brand": "SEAT", "model": vehicle_id.title(), "year": "2022",
+           "price": price, "type": "hatchback", "color": "red", "features": []}
+    car.update(fields)
+    return car
+
+
+@pytest.fixture
+def restore_catalog():
+    previous = get_catalog()
+    yield
+    set_catalog(previous)
+
+
+def row_ids(message):
+    return [row["id"] for section in message["sections"] for row in section["rows"]]
+
+
+def browse(lists, catalog):
+    cars = list(catalog)
+    return lists.list_message(cars[:PAGE_SIZE], 0, len(cars), PAGE_SIZE, "", catalog=catalog)
+
+
+def test_snapshot_is_reused_within_a_version():
+    catalog = VehicleCatalog([vehicle("leon"), vehicle("ibiza")], version="v1")
+    lists = InventoryLists()
+    first = browse(lists, catalog)
+    assert browse(lists, catalog)["sections"] is first["sections"]
+
+
+def test_new_version_rebuilds_rows():
+    lists = InventoryLists()
+    before = VehicleCatalog([vehicle("leon", price="€20,000")], version="v1")
+    after = VehicleCatalog([vehicle("leon", price="€18,500")], version="v2")
+    assert "€20,000" in browse(lists, before)["sections"][0]["rows"][0]["description"]
+    assert "€18,500" in browse(lists, after)["sections"][0]["rows"][0]["description"]
+
+
+def test_reload_invalidates_shared_lists(restore_catalog):
+    set_catalog(VehicleCatalog([vehicle("leon"), vehicle("ibiza")], version="v1"))
+    assert row_ids(browse(inventory_lists, get_catalog())) == [f"{VEHICLE_ROW_PREFIX}leon",
+                                                                f"{VEHICLE_ROW_PREFIX}ibiza"]
+    # La recarga quita un vehículo y añade otro; la lista no conserva filas de la versión anterior
+    set_catalog(VehicleCatalog([vehicle("ibiza"), vehicle("arona")], version="v2"))
+    assert inventory_lists._snapshots == {}
+    message = browse(inventory_lists, get_catalog())
+    assert row_ids(message) == [f"{VEHICLE_ROW_PREFIX}ibiza", f"{VEHICLE_ROW_PREFIX}arona"]
+    assert message["body"].startswith("1-2 of 2 vehicles")
+
+
+def test_filtered_page_after_reload_finds_new_vehicles(restore_catalog):
+    set_catalog(VehicleCatalog([vehicle("leon")], version="v1"))
+    browse(inventory_lists, get_catalog())
+    set_catalog(VehicleCatalog([vehicle("leon"), vehicle("tarraco", type="suv")], version="v2"))
+    catalog = get_catalog()
+    page = [catalog.get("tarraco")]
+    message = inventory_lists.list_message(page, 0, 1, PAGE_SIZE, "suv", catalog=catalog)
+    assert row_ids(message) == [f"{VEHICLE_ROW_PREFIX}tarraco"]
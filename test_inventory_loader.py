@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la carga de inventarios externos: celdas vacías y filas sin
+identificar en CSV, SQLite y JSON
+"""
+
+import csv
+import json
+import sqlite3
+
+import pytest
+
+from inventory_loader import MISSING_VALUE, load_inventory
+from vehicle_cards import render_listing_fragment, render_vehicle_card
+
+FIELDS = ["id", "brand", "model", "year", "price", "color", "type", "engine", "fuel", "transmission",
+          "mileage", "power", "consumption", "emissions", "drivetrain", "features", "dimensions",
+          "trunk_capacity", "warranty"]
+COMPLETE = {
+    "id": "SEAT_LEON_2022_RED", "brand": "SEAT", "model": "Leon", "year": "2022", "price": "€21,000",
+    "color": "red", "type": "hatchback", "engine": "1.5 TSI", "fuel": "gasoline", "transmission": "Manual",
+    "mileage": "12,000 km", "power": "150 HP", "consumption": "5.6L/100km", "emissions": "128 g/km CO2",
+    "drivetrain": "FWD", "features": "LED headlights|Apple CarPlay", "dimensions": "4.37m x 1.80m x 1.46m",
+    "trunk_capacity": "380 liters", "warranty": "2 years",
+}
+# Celdas vacías en campos que la ficha muestra
+BLANK = dict(COMPLETE, id="SEAT_IBIZA_2021_WHT", model="Ibiza", year="2021", engine="", emissions="", features="", warranty="")
+# Sin id: no se puede listar ni seleccionar
+UNIDENTIFIED = dict(COMPLETE, id="")
+
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_sqlite(path, rows):
+    connection = sqlite3.connect(path)
+    connection.execute(f"CREATE TABLE vehicles ({', '.join(FIELDS)})")
+    connection.executemany(f"INSERT INTO vehicles VALUES ({', '.join('?' for _ in FIELDS)})",
+                           [[row[field] or None for field in FIELDS] for row in rows])
+    connection.commit()
+    connection.close()
+
+
+@pytest.fixture(params=["csv", "db"])
+def source(request, tmp_path):
+    path = str(tmp_path / f"inventory.{request.param}")
+    (write_csv if request.param == "csv" else write_sqlite)(path, [COMPLETE, BLANK, UNIDENTIFIED])
+    return path
+
+
+def test_blank_cells_render_with_placeholder(source):
+    catalog = load_inventory(source)
+    assert [car["id"] for car in catalog] == ["SEAT_LEON_2022_RED", "SEAT_IBIZA_2021_WHT"]
+    car = catalog.get("SEAT_IBIZA_2021_WHT")
+    assert car["engine"] == car["emissions"] == car["warranty"] == MISSING_VALUE
+    assert car["features"] == ()
+    card = render_vehicle_card(car)
+    assert f"Engine: {MISSING_VALUE}" in card and "SEAT Ibiza (2021)" in card
+    assert render_listing_fragment(car)
+    assert catalog.get("SEAT_LEON_2022_RED")["features"] == ("LED headlights", "Apple CarPlay")
+
+
+def test_json_vehicles_are_validated(tmp_path):
+    path = tmp_path / "inventory.json"
+    blank = {key: value for key, value in BLANK.items() if value}
+    path.write_text(json.dumps({"vehicles": [blank, {"brand": "Ford"}]}))
+    catalog = load_inventory(str(path))
+    assert len(catalog) == 1
+    assert render_vehicle_card(catalog.get("SEAT_IBIZA_2021_WHT"))
+
+
+def test_source_without_valid_vehicles_is_rejected(tmp_path):
+    path = str(tmp_path / "inventory.csv")
+    write_csv(path, [UNIDENTIFIED])
+    with pytest.raises(ValueError):
+        load_inventory(path)
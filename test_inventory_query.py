@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la interpretación de búsquedas de inventario
+(inventario de data/vehicles.json)
+"""
+
+import pytest
+
+from inventory_query import parse_inventory_query, parse_numeric_ranges, parse_sort
+from vehicle_catalog import get_catalog
+
+
+def ranges(text):
+    return {field: repr(numeric_range) for field, numeric_range in parse_numeric_ranges(text).items()}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("under €40k", {"price": "NumericRange[None, 40000.0)"}),
+    ("up to 25.000 euros", {"price": "NumericRange[None, 25000.0]"}),
+    ("over 180 hp", {"power": "NumericRange(180.0, None]"}),
+    ("less than 50,000 km", {"mileage": "NumericRange[None, 50000.0)"}),
+    ("from 2020", {"year": "NumericRange[2020.0, None]"}),
+    ("between 30k and 20k", {"price": "NumericRange[20000.0, 30000.0]"}),
+    ("over 20k but under 30k", {"price": "NumericRange(20000.0, 30000.0)"}),
+    ("at least 150 cv, at most 2 owners", {"power": "NumericRange[150.0, None]"}),
+    ("under 5 please", {}),
+])
+def test_parse_numeric_ranges(text, expected):
+    assert ranges(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("show me the newest first", ("year", True, None)),
+    ("top 3 cheapest", ("price", False, 3)),
+    ("5 most powerful suvs", ("power", True, 5)),
+    ("least expensive sedan", ("price", False, None)),
+    ("the most expensive one", ("price", True, None)),
+    ("top 3 please", (None, False, None)),
+    ("blue suv", (None, False, None)),
+])
+def test_parse_sort(text, expected):
+    assert parse_sort(text) == expected
+
+
+def test_remaining_text_after_length_changing_lowercase():
+    # "İ".lower() ocupa dos caracteres: los tramos no deben desplazarse
+    search = parse_inventory_query("İİ blue suv with leather seats", get_catalog())
+    assert search.facets == {"color": {"blue"}, "type": {"suv"}}
+    assert search.text.split()[-3:] == ["with", "leather", "seats"]
+    assert "blue" not in search.text and "suv" not in search.text
+
+
+@pytest.mark.parametrize("query", ["car with heated seat", "a car seat for my kid", "ford with a heated seat"])
+def test_seat_as_a_word_is_not_a_brand(query):
+    search = parse_inventory_query(query, get_catalog())
+    assert "seat" not in search.facets.get("brand", set())
+    assert "seat" in search.text
+
+
+@pytest.mark.parametrize("query", ["seat leon", "a seat león please", "seat hatchbacks", "show me seat cars",
+                                   "any car of the brand seat"])
+def test_seat_next_to_a_vehicle_word_is_a_brand(query):
+    assert "seat" in parse_inventory_query(query, get_catalog()).facets["brand"]
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Pruebas de KeywordMatcher: palabras completas, coincidencia más larga y prioridad
+"""
+
+import pytest
+
+from keyword_matcher import KeywordMatcher
+
+
+@pytest.fixture
+def matcher():
+    return KeywordMatcher([
+        ("bmw", "brand"),
+        ("BMW X3", "model"),
+        ("ford", "ford"),
+        ("oi", "oi"),
+        ("x3", "short"),
+        ("bmw", "duplicate"),
+    ])
+
+
+@pytest.mark.parametrize("text", ["affordable cars", "going there", "bmwx3", "fords"])
+def test_only_whole_words(matcher, text):
+    assert matcher.find_all(text) == []
+    assert matcher.values(text) == set()
+
+
+def test_whole_words_between_punctuation(matcher):
+    assert matcher.values("¿tenéis ford?") == {"ford"}
+    assert matcher.values("BMW, ford y oi") == {"brand", "ford", "oi"}
+
+
+def test_duplicate_keyword_keeps_first(matcher):
+    assert len(matcher) == 5
+    assert matcher.find_all("a bmw") == [(2, 5, "bmw", "brand")]
+
+
+def test_find_all_longest_first_and_overlapping(matcher):
+    assert matcher.find_all("the bmw x3 please") == [
+        (4, 10, "bmw x3", "model"),
+        (4, 7, "bmw", "brand"),
+        (8, 10, "x3", "short"),
+    ]
+
+
+def test_find_longest_skips_overlaps(matcher):
+    assert matcher.find_longest("bmw x3 or ford") == [(0, 6, "bmw x3", "model"), (10, 14, "ford", "ford")]
+
+
+def test_best_prefers_longest_then_priority():
+    assert KeywordMatcher([("bmw", 1), ("bmw x3", 2)]).best("a bmw x3")[3] == 2
+    # Empate de longitud: gana la registrada primero, aunque aparezca después
+    tied = KeywordMatcher([("ford", "first"), ("audi", "second")])
+    assert tied.best("audi or ford")[3] == "first"
+    assert KeywordMatcher([("audi", "second"), ("ford", "first")]).best("audi or ford")[3] == "second"
+    assert tied.best("nothing here") is None
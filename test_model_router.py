@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Pruebas del enrutado de modelos: fallback al siguiente nivel y recuperación
+de un modelo degradado tras el intervalo de prueba
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from agent_metrics import AgentMetrics
+from llm_client import LLMClient
+from model_router import ModelRouter
+
+CONFIG = {
+    "health": {"window": 10, "min_samples": 3, "max_error_rate": 0.3, "max_latency_s": 5, "probe_interval_s": 30},
+    "tasks": {"intent": {"tiers": ["fast", "backup"], "attempt_timeout_s": 0.2}},
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def router(tmp_path, clock):
+    path = tmp_path / "model_routing.json"
+    path.write_text(json.dumps(CONFIG))
+    return ModelRouter(str(path), clock=clock)
+
+
+def fail(router, model, times=3):
+    for _ in range(times):
+        router.record(model, False, 0.1)
+
+
+def test_unhealthy_model_moves_last(router):
+    assert router.candidates("intent", "default") == ["fast", "backup"]
+    fail(router, "fast")
+    assert router.candidates("intent", "default") == ["backup", "fast"]
+    assert router.status()["fast"]["healthy"] is False
+
+
+def test_unconfigured_task_uses_default(router):
+    assert router.candidates("translation", "gpt-default") == ["gpt-default"]
+
+
+def test_degraded_model_is_probed_and_recovers(router, clock):
+    fail(router, "fast")
+    assert router.candidates("intent", "default") == ["backup", "fast"]
+    clock.now += 31
+    # Una sola petición prueba el modelo en su nivel; las demás siguen sin él
+    assert router.candidates("intent", "default") == ["fast", "backup"]
+    assert router.candidates("intent", "default") == ["backup", "fast"]
+    assert router.status()["fast"]["probing"] is True
+    router.record("fast", True, 0.2)
+    assert router.candidates("intent", "default") == ["fast", "backup"]
+    assert router.status()["fast"] == {"samples": 1, "error_rate": 0.0, "avg_latency_ms": 200.0,
+                                       "healthy": True, "degraded_for_s": None, "probing": False}
+
+
+def test_failed_probe_restarts_the_interval(router, clock):
+    fail(router, "fast")
+    router.candidates("intent", "default")
+    clock.now += 31
+    assert router.candidates("intent", "default")[0] == "fast"
+    router.record("fast", False, 1.0)
+    clock.now += 10
+    assert router.candidates("intent", "default") == ["backup", "fast"]
+    clock.now += 21
+    assert router.candidates("intent", "default")[0] == "fast"
+
+
+def test_unanswered_probe_expires(router, clock):
+    fail(router, "fast")
+    router.candidates("intent", "default")
+    clock.now += 31
+    assert router.candidates("intent", "default")[0] == "fast"
+    # La petición de la prueba no llegó a llamar al modelo
+    clock.now += 31
+    assert router.candidates("intent", "default")[0] == "fast"
+
+
+def test_client_falls_back_to_next_tier(router):
+    llm = LLMClient(api_key="test", router=router, metrics=AgentMetrics())
+    calls = []
+
+    async def call(model, messages, params):
+        calls.append(model)
+        if model == "fast":
+            await asyncio.sleep(5)
+        return f"answer from {model}"
+
+    llm._call = call
+    assert llm.complete("intent", "default", [{"role": "user", "content": "hi"}]) == "answer from backup"
+    assert calls == ["fast", "backup"]
+    assert router.status()["fast"]["error_rate"] == 1.0
+    assert llm.metrics.snapshot()["counters"]["llm.fallbacks"] == 1
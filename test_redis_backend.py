@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Pruebas de RedisSessionBackend contra el servidor RESP en proceso:
+dos nodos compartiendo sesiones y concurrencia optimista del estado
+"""
+
+import pytest
+
+from agent_metrics import AgentMetrics
+from conversation_store import ConversationStore, SessionConflict
+from redis_backend import RedisError, RedisSessionBackend, RespClient
+from resp_server import RespStandInServer
+
+
+@pytest.fixture
+def server():
+    with RespStandInServer() as server:
+        yield server
+
+
+def make_node(server) -> ConversationStore:
+    return ConversationStore(capacity=10, backend=RedisSessionBackend(RespClient(*server.address)),
+                             metrics=AgentMetrics())
+
+
+def test_nodes_see_each_others_writes(server):
+    first, second = make_node(server), make_node(server)
+    first.append("u", "user", "hola")
+    assert [turn.content for turn in second.messages("u")] == ["hola"]
+    second.append("u", "assistant", "¿en qué puedo ayudarte?")
+    assert [turn.content for turn in first.messages("u")] == ["hola", "¿en qué puedo ayudarte?"]
+    assert first.stats()["reloaded_stale"] == 1
+
+
+def test_save_state_with_stale_version_conflicts(server):
+    backend = RedisSessionBackend(RespClient(*server.address))
+    version = backend.save_state("u", {"status": "active"})
+    backend.append_message("u", "user", "hola", tokens=1)
+    with pytest.raises(SessionConflict):
+        backend.save_state("u", {"status": "browsing"}, expected_version=version)
+    assert backend.stats()["conflicts"] == 1
+    assert backend.load_session("u", 10)["state"] == {"status": "active"}
+
+
+def test_update_state_retries_across_nodes(server):
+    first, second = make_node(server), make_node(server)
+    first.update_state("u", {"status": "active"})
+    second.update_state("u", {"vehicle": "AUDI_A4_2022_WHT"})
+    # `first` tiene una versión vieja: el WATCH falla, recarga y vuelve a aplicar
+    state = first.update_state("u", {"step": 2})
+    assert state == {"status": "active", "vehicle": "AUDI_A4_2022_WHT", "step": 2}
+    assert first.stats()["conflicts"] == 1
+    assert second.get_state("u") == state
+
+
+def test_wrong_password_or_db_fails_on_connect():
+    with RespStandInServer(password="secret") as server:
+        assert RespClient(*server.address, password="secret").execute("PING") == "PONG"
+        with pytest.raises(RedisError, match="AUTH rechazado"):
+            RespClient(*server.address, password="wrong").execute("PING")
+        with pytest.raises(RedisError, match="SELECT rechazado"):
+            RespClient(*server.address, db=99, password="secret").execute("PING")
+
+
+def test_clear_keeps_version_increasing(server):
+    first, second = make_node(server), make_node(server)
+    first.append("u", "user", "old 1")
+    first.append("u", "user", "old 2")
+    assert [turn.content for turn in second.messages("u")] == ["old 1", "old 2"]
+    # `second` guarda la versión 2; tras borrar, dos mensajes nuevos no deben volver a la 2
+    first.clear("u")
+    first.append("u", "user", "new 1")
+    first.append("u", "user", "new 2")
+    assert first.backend.version("u") == 5
+    assert [turn.content for turn in second.messages("u")] == ["new 1", "new 2"]
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Pruebas del análisis de respuestas: señales sobre fichas reales y respuestas
+sin resultados en inglés, y botones que siempre tienen ruta
+"""
+
+import time
+
+import pytest
+
+from interactive_routes import InteractiveRouter
+from message_manager import MessageManager
+from response_actions import ResponseAction, ResponseAnalyzer
+from vehicle_cards import render_listing_fragment, render_vehicle_card
+from vehicle_catalog import get_catalog
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return ResponseAnalyzer()
+
+
+def button_ids(analysis):
+    return [button["id"] for action in analysis["actions"] + analysis["suggestions"]
+            for button in action["data"].get("buttons", [])]
+
+
+@pytest.mark.parametrize("car", list(get_catalog()), ids=lambda car: car["id"])
+def test_cards_do_not_suggest_financing(analyzer, car):
+    analysis = analyzer.analyze(render_vehicle_card(car)).to_dict()
+    assert analysis["type"] != "price_mentioned"
+    assert analysis["suggestions"] == []
+    assert car["brand"] in analysis["car_mentions"]
+
+
+def test_listing_does_not_suggest_financing(analyzer):
+    listing = "\n".join(render_listing_fragment(car) for car in get_catalog())
+    assert analyzer.analyze(listing).suggestions == []
+
+
+@pytest.mark.parametrize("response", [
+    "Sorry, we don't have any red convertibles right now.",
+    "❌ Sorry, we currently don't have any electric vehicles in our inventory.",
+    "Sorry, we don’t currently have that model.",
+    "I couldn't find that specific vehicle. Can you tell me which model interests you?",
+    "Lo siento, no tenemos descapotables rojos.",
+])
+def test_english_no_results(analyzer, response):
+    analysis = analyzer.analyze(response).to_dict()
+    assert analysis["type"] == "no_results"
+    assert button_ids(analysis) == ["see_all_cars", "car_type_economic", "car_type_family"]
+
+
+def test_financing_mentioned(analyzer):
+    assert analyzer.analyze("We don't offer financing through this channel.").type == "price_mentioned"
+
+
+@pytest.mark.parametrize("response", [
+    "Sorry, we don't have any red convertibles. Would you like to schedule an appointment?",
+    render_vehicle_card(get_catalog().get("AUDI_A4_2022_WHT")),
+])
+def test_every_button_has_a_route(analyzer, response):
+    router = InteractiveRouter(agent=None)
+    ids = button_ids(analyzer.analyze(response).to_dict())
+    assert ids
+    assert all(router.resolve(button_id) is not None for button_id in ids)
+
+
+def test_response_action_is_abstract():
+    with pytest.raises(TypeError):
+        ResponseAction()
+
+
+class RecordingSender:
+    def __init__(self):
+        self.sent = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.sent.append(name) or {}
+
+
+def test_actions_are_sent_without_pauses(analyzer):
+    sender = RecordingSender()
+    manager = MessageManager(sender, car_agent=None)
+    analysis = analyzer.analyze("Sorry, we don't have that. Our contact phone: teléfono. Book an appointment?").to_dict()
+    started = time.perf_counter()
+    manager._send_response("+34600000000", {"response": "text", **analysis})
+    assert time.perf_counter() - started < 0.2
+    assert sender.sent == ["send_text", "send_buttons", "send_text", "send_location", "send_contact", "send_buttons"]
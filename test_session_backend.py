@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la escritura diferida en SQLite: lotes, restauración y
+reintentos cuando una transacción falla
+"""
+
+import sqlite3
+
+import pytest
+
+from session_backend import SQLiteSessionBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    # Intervalo largo: los lotes solo se aplican al llamar a flush
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"), flush_interval=60, batch_size=1000, max_retries=2)
+    yield backend
+    backend.close()
+
+
+def contents(backend, user_id="u"):
+    return [row[1] for row in backend.load_session(user_id, 50)["turns"]]
+
+
+def fail_applies(monkeypatch, backend, times, when=lambda batch: True):
+    apply = backend._apply
+    remaining = [times]
+
+    def failing(batch):
+        if remaining[0] and when(batch):
+            remaining[0] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return apply(batch)
+
+    monkeypatch.setattr(backend, "_apply", failing)
+
+
+def test_operations_are_written_in_one_batch(backend):
+    backend.append_message("u", "user", "hola", 1)
+    backend.append_message("u", "assistant", "¿qué buscas?", 1)
+    backend.save_state("u", {"status": "active"})
+    backend.save_summary("u", "saludo")
+    assert backend.stats()["pending"] == 4
+    assert backend.flush() is True
+    assert backend.stats()["batches"] == 1 and backend.stats()["operations"] == 4
+    session = backend.load_session("u", 50)
+    assert session["state"] == {"status": "active"} and session["summary"] == "saludo"
+    assert contents(backend) == ["hola", "¿qué buscas?"]
+
+
+def test_load_flushes_queued_user(backend):
+    backend.append_message("u", "user", "hola", 1)
+    backend.append_message("u", "user", "adiós", 1, evicted=1)
+    assert contents(backend) == ["adiós"]
+
+
+def test_failed_batch_is_retried_ahead_of_newer_operations(backend, monkeypatch):
+    fail_applies(monkeypatch, backend, times=1)
+    backend.append_message("u", "user", "first", 1)
+    assert backend.flush() is False
+    assert backend.stats()["pending"] == 1
+    backend.append_message("u", "user", "second", 1)
+    assert backend.flush() is True
+    assert contents(backend) == ["first", "second"]
+    stats = backend.stats()
+    assert (stats["flush_errors"], stats["dropped_operations"], stats["operations"]) == (1, 0, 2)
+
+
+def test_failing_operation_is_dropped_after_retries(backend, monkeypatch):
+    # Solo falla la operación "bad", también sola: las demás del lote se guardan
+    fail_applies(monkeypatch, backend, times=10,
+                 when=lambda batch: any(operation[-2:] == ("bad", 1) for operation in batch))
+    backend.append_message("u", "user", "good", 1)
+    backend.append_message("u", "user", "bad", 1)
+    backend.append_message("u", "user", "later", 1)
+    assert [backend.flush() for _ in range(3)] == [False, False, False]
+    assert backend.stats()["pending"] == 0
+    assert contents(backend) == ["good", "later"]
+    stats = backend.stats()
+    assert (stats["flush_errors"], stats["dropped_operations"]) == (3, 1)
+
+
+def test_close_writes_pending_operations(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    backend = SQLiteSessionBackend(path, flush_interval=60, batch_size=1000)
+    backend.append_message("u", "user", "hola", 1)
+    backend.close()
+    reopened = SQLiteSessionBackend(path, flush_interval=60)
+    try:
+        assert contents(reopened) == ["hola"]
+    finally:
+        reopened.close()
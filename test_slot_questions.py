@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Pruebas del resolutor de preguntas de atributo sobre el vehículo en foco
+(inventario de data/vehicles.json)
+"""
+
+import pytest
+
+from slot_questions import SlotQuestionResolver
+
+AUDI = "AUDI_A4_2022_WHT"
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return SlotQuestionResolver()
+
+
+@pytest.mark.parametrize("question", [
+    "What is the price?",
+    "how much is the audi a4?",
+    "how much is the audi?",
+    "how many km does it have?",
+    "What warranty does it have?",
+])
+def test_answers_about_focused_vehicle(resolver, question):
+    answer = resolver.answer(question, AUDI)
+    assert answer is not None
+    text, vehicle_id = answer
+    assert vehicle_id == AUDI
+    assert "Audi A4" in text
+
+
+def test_yes_no_transmission(resolver):
+    text, _ = resolver.answer("is it automatic?", AUDI)
+    assert text.startswith("Yes!")
+    text, _ = resolver.answer("is it manual?", AUDI)
+    assert text.startswith("No.")
+
+
+@pytest.mark.parametrize("question", [
+    # Otra marca o modelo, en stock o no
+    "how much is the bmw?",
+    "how much is the tesla?",
+    "what's the price of a toyota corolla?",
+    "price of the mercedes?",
+    "what is the price of the x3?",
+    # Seguro, negociación, citas y distancia
+    "how much does it cost to insure",
+    "is the price negotiable?",
+    "i want to book an appointment to check the warranty",
+    "how far are you in km?",
+])
+def test_defers_to_llm_with_vehicle_in_focus(resolver, question):
+    assert resolver.answer(question, AUDI) is None
+
+
+def test_named_vehicle_without_focus(resolver):
+    _, vehicle_id = resolver.answer("price of the mercedes?", None)
+    assert vehicle_id == "MERCEDES_C_2023_BLK"
+    # "bmw" puede ser el X3 o el Serie 3
+    assert resolver.answer("how much is the bmw?", None) is None
+    assert resolver.answer("what's the price?", None) is None
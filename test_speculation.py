@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Pruebas del fallback de _route_intent cuando la clasificación de intención
+falla con una conversación general especulativa en marcha (sin OpenAI)
+"""
+
+import asyncio
+import os
+
+import pytest
+
+# Los agentes de las pruebas no deben escribir en la base de sesiones real
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("SESSION_COLD_DIR", "")
+
+MESSAGES = [{"role": "user", "content": "hello there"}]
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    from chat_agent_python import CarDealershipChatAgent
+    agent = CarDealershipChatAgent()
+    agent.llm.client = object()
+    agent.answer_cache.enabled = False
+    monkeypatch.setattr(agent.speculation, "should_speculate", lambda: True)
+
+    async def intent_fails(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("intent model down")
+
+    monkeypatch.setattr(agent.llm, "acomplete", intent_fails)
+    return agent
+
+
+def run_route(agent):
+    return asyncio.run(agent._route_intent("hello there", MESSAGES))
+
+
+def test_failed_speculation_falls_through_to_general_chat(agent):
+    calls = []
+
+    async def general_chat(messages, deadline):
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise RuntimeError("speculation failed")
+        return "Hi! How can I help?"
+
+    agent._general_chat = general_chat
+    result = run_route(agent)
+    assert (result.text, result.intent) == ("Hi! How can I help?", "GENERAL_CHAT")
+    assert calls == [0, 1]
+
+
+def test_successful_speculation_is_reused(agent):
+    calls = []
+
+    async def general_chat(messages, deadline):
+        calls.append(len(calls))
+        return "speculated answer"
+
+    agent._general_chat = general_chat
+    result = run_route(agent)
+    assert result.text == "speculated answer"
+    assert calls == [0]
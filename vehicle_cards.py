@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Fichas de vehículo y líneas de listado pre-renderizadas, cacheadas por
+(vehículo, versión del inventario, idioma)
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Iterable, Mapping, Tuple
+
+from vehicle_catalog import VehicleCatalog, add_catalog_listener, get_catalog
+
+SEPARATOR = "───────────────────────────────"
+
+# Textos fijos de la ficha por idioma (los datos del vehículo no se traducen)
+CARD_LABELS: Dict[str, Dict[str, str]] = {
+    "english": {
+        "price": "Price", "color": "Color", "mileage": "Mileage", "type": "Type",
+        "specs": "TECHNICAL SPECIFICATIONS", "engine": "Engine", "power": "Power",
+        "transmission": "Transmission", "drivetrain": "Drivetrain", "consumption": "Consumption",
+        "emissions": "Emissions", "dimensions": "DIMENSIONS", "exterior": "Exterior", "trunk": "Trunk",
+        "features": "FEATURED CHARACTERISTICS", "warranty": "WARRANTY",
+        "cta": "🏢 Would you like to schedule an appointment to see it at our dealership?\n📞 We're ready to help you!"
+    },
+    "español": {
+        "price": "Precio", "color": "Color", "mileage": "Kilometraje", "type": "Tipo",
+        "specs": "ESPECIFICACIONES TÉCNICAS", "engine": "Motor", "power": "Potencia",
+        "transmission": "Transmisión", "drivetrain": "Tracción", "consumption": "Consumo",
+        "emissions": "Emisiones", "dimensions": "DIMENSIONES", "exterior": "Exterior", "trunk": "Maletero",
+        "features": "CARACTERÍSTICAS DESTACADAS", "warranty": "GARANTÍA",
+        "cta": "🏢 ¿Te gustaría agendar una cita para verlo en nuestro concesionario?\n📞 ¡Estamos listos para ayudarte!"
+    }
+}
+DEFAULT_LANGUAGE = "english"
+
+
+def _labels(language: str) -> Tuple[str, Dict[str, str]]:
+    """(idioma efectivo, textos); los idiomas sin plantilla usan la inglesa"""
+    if language in CARD_LABELS:
+        return language, CARD_LABELS[language]
+    return DEFAULT_LANGUAGE, CARD_LABELS[DEFAULT_LANGUAGE]
+
+
+def render_vehicle_card(car: Mapping[str, Any], language: str = DEFAULT_LANGUAGE) -> str:
+    """Ficha completa de un vehículo (formato visual sin asteriscos para WhatsApp)"""
+    _, label = _labels(language)
+    lines = [
+        f"🚗 {car['brand']} {car['model']} ({car['year']})",
+        "═══════════════════════════════",
+        "",
+        f"💰 {label['price']}: {car['price']}",
+        f"🎨 {label['color']}: {car['color']}",
+        f"📊 {label['mileage']}: {car['mileage']}",
+        f"🚙 {label['type']}: {car['type']}",
+        "",
+        f"🔧 {label['specs']}",
+        SEPARATOR,
+        f"⚡ {label['engine']}: {car['engine']}",
+        f"🏎️ {label['power']}: {car['power']}",
+        f"⚙️ {label['transmission']}: {car['transmission']}",
+        f"🚗 {label['drivetrain']}: {car['drivetrain']}",
+        f"⛽ {label['consumption']}: {car['consumption']}",
+        f"🌱 {label['emissions']}: {car['emissions']}",
+        "",
+        f"📏 {label['dimensions']}",
+        SEPARATOR,
+        f"📐 {label['exterior']}: {car['dimensions']}",
+        f"🧳 {label['trunk']}: {car['trunk_capacity']}",
+        "",
+        f"✨ {label['features']}",
+        SEPARATOR,
+    ]
+    lines.extend(f"🔹 {feature}" for feature in car['features'])
+    lines.extend([
+        "",
+        f"🛡️ {label['warranty']}",
+        SEPARATOR,
+        f"📋 {car['warranty']}",
+        "",
+        label["cta"],
+    ])
+    return "\n".join(lines)
+
+
+def render_listing_fragment(car: Mapping[str, Any], language: str = DEFAULT_LANGUAGE) -> str:
+    """Bloque de un vehículo en un listado, sin el número de orden (se antepone al unir)"""
+    _, label = _labels(language)
+    return (f"{car['brand']} {car['model']} ({car['year']})\n"
+            f"   💰 {label['price']}: {car['price']}\n"
+            f"   🎨 {label['color']}: {car['color']}\n"
+            f"   ⚡ {label['engine']}: {car['engine']} - {car['power']}\n"
+            f"   📊 {label['mileage']}: {car['mileage']}\n\n")
+
+
+class VehicleCardCache:
+    """
+    Caché LRU acotada de textos renderizados. La clave incluye la versión del
+    inventario, así que una recarga nunca sirve una ficha antigua; además se
+    vacía al publicar una instantánea nueva para liberar memoria.
+    """
+
+    RENDERERS = {"card": render_vehicle_card, "line": render_listing_fragment}
+
+    def __init__(self, max_entries: Optional[int] = None):
+        if max_entries is None:
+            max_entries = int(os.getenv('VEHICLE_CARD_CACHE_SIZE', '4096'))
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Tuple[str, str, str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _get(self, kind: str, car: Mapping[str, Any], version: str, language: str) -> str:
+        if language not in CARD_LABELS:
+            language = DEFAULT_LANGUAGE
+        key = (kind, car["id"], version, language)
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return text
+
+        text = self.RENDERERS[kind](car, language)
+        with self._lock:
+            self._misses += 1
+            self._entries[key] = text
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return text
+
+    def card(self, vehicle_id: str, language: str = DEFAULT_LANGUAGE,
+             catalog: Optional[VehicleCatalog] = None) -> Optional[str]:
+        """Ficha del vehículo en la instantánea dada (o la vigente); None si no existe"""
+        catalog = catalog or get_catalog()
+        car = catalog.get(vehicle_id)
+        if car is None:
+            return None
+        return self._get("card", car, catalog.version, language)
+
+    def listing_fragment(self, car: Mapping[str, Any], version: str, language: str = DEFAULT_LANGUAGE) -> str:
+        """Bloque de listado de un vehículo de la instantánea `version`"""
+        return self._get("line", car, version, language)
+
+    def prerender(self, catalog: Optional[VehicleCatalog] = None,
+                  languages: Iterable[str] = (DEFAULT_LANGUAGE,)) -> int:
+        """Renderiza fichas y líneas de todo el catálogo (hasta llenar la caché); devuelve cuántas"""
+        catalog = catalog or get_catalog()
+        rendered = 0
+        for language in languages:
+            for car in catalog:
+                if rendered + 2 > self.max_entries:
+                    return rendered
+                self._get("card", car, catalog.version, language)
+                self._get("line", car, catalog.version, language)
+                rendered += 2
+        return rendered
+
+    def invalidate(self):
+        """Vacía la caché (se llama al recargar el inventario)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Entradas, aciertos y expulsiones (para /status)"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0
+            }
+
+
+vehicle_cards = VehicleCardCache()
+
+
+def _on_catalog_reload(previous: VehicleCatalog, catalog: VehicleCatalog):
+    vehicle_cards.invalidate()
+    if prerender_enabled():
+        vehicle_cards.prerender(catalog, prerender_languages())
+
+
+def prerender_enabled() -> bool:
+    return os.getenv('VEHICLE_CARD_PRERENDER', '0').lower() in ('1', 'true', 'yes')
+
+
+def prerender_languages() -> Tuple[str, ...]:
+    languages = os.getenv('VEHICLE_CARD_PRERENDER_LANGUAGES', DEFAULT_LANGUAGE)
+    return tuple(language.strip() for language in languages.split(",") if language.strip())
+
+
+add_catalog_listener(_on_catalog_reload)
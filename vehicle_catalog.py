@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Catálogo canónico de vehículos de AutoMax, cargado una sola vez desde data/vehicles.json
+"""
+
+import bisect
+import heapq
+import json
+import os
+import re
+import threading
+from types import MappingProxyType
+from typing import Dict, Any, Optional, List, Tuple, Iterator, Mapping, Callable, Iterable, FrozenSet
+
+from feature_search import FeatureIndex
+from inventory_columns import ColumnarInventory
+from keyword_matcher import KeywordMatcher
+from vehicle_similarity import SimilarityIndex
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "vehicles.json")
+
+
+# Campos que llegan como listas y se guardan como tuplas
+LIST_FIELDS = ("features",)
+
+# Atributos con índice invertido (valor → posiciones en el inventario)
+FACET_FIELDS = ("fuel", "brand", "color", "type")
+_FACET_TOKEN_SPLIT = re.compile(r"[\s/-]+")
+
+# Campos de texto ("€45,000", "184 HP (135 kW)", "15,000 km") con columna numérica ordenada
+NUMERIC_FIELDS = ("price", "power", "mileage", "year", "consumption", "trunk_capacity")
+_NUMBER = re.compile(r"\d[\d,.]*")
+_DOTTED_THOUSANDS = re.compile(r"^\d{1,3}(\.\d{3})+$")
+
+
+def parse_number(value: Any) -> Optional[float]:
+    """Primer número de un texto de inventario: "€45,000" → 45000, "184 HP (135 kW)" → 184"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    match = _NUMBER.search(str(value or ""))
+    if not match:
+        return None
+    text = match.group().rstrip(".,")
+    if _DOTTED_THOUSANDS.match(text):
+        # Formato europeo: "45.000"
+        text = text.replace(".", "")
+    try:
+        return float(text.replace(",", ""))
+    except ValueError:
+        return None
+
+
+class NumericRange:
+    """Intervalo sobre una columna numérica; None deja el extremo abierto"""
+
+    def __init__(self, minimum: Optional[float] = None, maximum: Optional[float] = None,
+                 min_inclusive: bool = True, max_inclusive: bool = True):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.min_inclusive = min_inclusive
+        self.max_inclusive = max_inclusive
+
+    def intersect(self, other: "NumericRange") -> "NumericRange":
+        """Intervalo que cumple ambas condiciones"""
+        result = NumericRange(self.minimum, self.maximum, self.min_inclusive, self.max_inclusive)
+        if other.minimum is not None and (result.minimum is None or other.minimum > result.minimum
+                                          or (other.minimum == result.minimum and not other.min_inclusive)):
+            result.minimum, result.min_inclusive = other.minimum, other.min_inclusive
+        if other.maximum is not None and (result.maximum is None or other.maximum < result.maximum
+                                          or (other.maximum == result.maximum and not other.max_inclusive)):
+            result.maximum, result.max_inclusive = other.maximum, other.max_inclusive
+        return result
+
+    def __repr__(self) -> str:
+        left = "[" if self.min_inclusive else "("
+        right = "]" if self.max_inclusive else ")"
+        return f"NumericRange{left}{self.minimum}, {self.maximum}{right}"
+
+
+def _freeze_vehicle(raw: Dict[str, Any]) -> Mapping[str, Any]:
+    """Copia inmutable de un vehículo (las listas pasan a tuplas)"""
+    vehicle = dict(raw)
+    for field in LIST_FIELDS:
+        if isinstance(vehicle.get(field), list):
+            vehicle[field] = tuple(vehicle[field])
+    return MappingProxyType(vehicle)
+
+
+def facet_terms(value: Any) -> List[str]:
+    """
+    Claves de índice de un valor: el valor completo en minúsculas y cada una de
+    sus palabras ("Mercedes-Benz" → mercedes-benz, mercedes, benz)
+    """
+    text = str(value).strip().lower()
+    if not text:
+        return []
+    terms = [text]
+    for token in _FACET_TOKEN_SPLIT.split(text):
+        if token and token not in terms:
+            terms.append(token)
+    return terms
+
+
+def derive_keywords(vehicles: List[Mapping[str, Any]]) -> List[Tuple[str, str]]:
+    """
+    Palabras clave para inventarios sin lista explícita (CSV, SQLite):
+    primero modelo y marca+modelo, luego color completo, marca, color base y tipo.
+    Si dos vehículos comparten palabra clave gana el primero del inventario.
+    """
+    groups: List[List[Tuple[str, str]]] = [[], [], [], []]
+    for vehicle in vehicles:
+        vehicle_id = vehicle["id"]
+        brand = str(vehicle.get("brand", "")).lower()
+        model = str(vehicle.get("model", "")).lower()
+        color = str(vehicle.get("color", "")).lower()
+        groups[0].extend([(f"{brand} {model}".strip(), vehicle_id), (model, vehicle_id)])
+        groups[1].append((color, vehicle_id))
+        groups[2].extend([(brand, vehicle_id), (color.split(" ")[-1] if color else "", vehicle_id)])
+        groups[3].append((str(vehicle.get("type", "")).lower(), vehicle_id))
+
+    keywords, seen = [], set()
+    for group in groups:
+        for keyword, vehicle_id in group:
+            if keyword and keyword not in seen:
+                seen.add(keyword)
+                keywords.append((keyword, vehicle_id))
+    return keywords
+
+
+class VehicleCatalog:
+    """
+    Instantánea inmutable del inventario. Se construye una vez y se comparte
+    entre todas las peticiones; las lecturas no necesitan bloqueo.
+    """
+
+    def __init__(self, vehicles: List[Dict[str, Any]],
+                 keywords: Optional[List[Tuple[str, str]]] = None,
+                 default_vehicle_id: Optional[str] = None,
+                 version: str = "static",
+                 columnar: Optional[bool] = None):
+        # Identificador de la instantánea: las cachés derivadas lo usan como clave
+        self.version = version
+        frozen = [_freeze_vehicle(raw) for raw in vehicles]
+        if keywords is None:
+            keywords = derive_keywords(frozen)
+        self._vehicles: Tuple[Mapping[str, Any], ...] = tuple(frozen)
+        self._by_id: Mapping[str, Mapping[str, Any]] = MappingProxyType({v["id"]: v for v in frozen})
+        self._positions: Mapping[str, int] = MappingProxyType({v["id"]: i for i, v in enumerate(frozen)})
+
+        # Palabras clave → id, en orden de prioridad (gana la primera coincidencia)
+        self._keywords: Tuple[Tuple[str, str], ...] = tuple(
+            (keyword.lower(), vehicle_id) for keyword, vehicle_id in (keywords or [])
+            if vehicle_id in self._by_id
+        )
+        self._keyword_matcher = KeywordMatcher(self._keywords)
+
+        if default_vehicle_id not in self._by_id:
+            default_vehicle_id = frozen[0]["id"] if frozen else None
+        self.default_vehicle_id = default_vehicle_id
+
+        self._facets = self._build_facet_indexes(frozen)
+        # BM25 sobre características, modelo, motor y tracción (las marcas ya tienen su índice)
+        self._feature_index = FeatureIndex(frozen, excluded_terms=self._facets["brand"].keys())
+
+        # Columnas numéricas (None si el texto no tiene número) e índices ordenados para bisect
+        self._columns: Dict[str, Tuple[Optional[float], ...]] = {}
+        self._sorted: Dict[str, Tuple[Tuple[float, ...], Tuple[int, ...]]] = {}
+        self._descending: Dict[str, Tuple[int, ...]] = {}
+        for field in NUMERIC_FIELDS:
+            column = tuple(parse_number(vehicle.get(field)) for vehicle in frozen)
+            order = sorted((position for position, value in enumerate(column) if value is not None),
+                           key=column.__getitem__)
+            self._columns[field] = column
+            self._sorted[field] = (tuple(column[position] for position in order), tuple(order))
+            # Orden descendente estable: los empates conservan el orden del inventario
+            self._descending[field] = tuple(sorted(order, key=column.__getitem__, reverse=True))
+
+        # Vector por vehículo (precio, potencia, consumo, maletero, tipo, tracción) para "coches como este"
+        self._similarity = SimilarityIndex(frozen, self._columns)
+
+        # Copia columnar (NumPy) para búsquedas vectorizadas; sin NumPy se usan los índices anteriores
+        if columnar is None:
+            columnar = os.getenv('AUTOMAX_COLUMNAR_INVENTORY', '1').lower() not in ('0', 'false', 'no')
+        self._columnar: Optional[ColumnarInventory] = None
+        if columnar and ColumnarInventory.available:
+            self._columnar = ColumnarInventory(
+                self._columns,
+                {field: [vehicle.get(field) for vehicle in frozen] for field in FACET_FIELDS},
+                terms=facet_terms
+            )
+
+    @staticmethod
+    def _build_facet_indexes(vehicles: List[Mapping[str, Any]]) -> Mapping[str, Mapping[str, FrozenSet[int]]]:
+        """Índices invertidos por atributo, construidos una vez por instantánea"""
+        indexes = {}
+        for field in FACET_FIELDS:
+            postings: Dict[str, List[int]] = {}
+            terms_by_value: Dict[Any, List[str]] = {}
+            for position, vehicle in enumerate(vehicles):
+                value = vehicle.get(field)
+                if value is None:
+                    continue
+                terms = terms_by_value.get(value)
+                if terms is None:
+                    terms = terms_by_value[value] = facet_terms(value)
+                for term in terms:
+                    postings.setdefault(term, []).append(position)
+            indexes[field] = MappingProxyType({term: frozenset(ids) for term, ids in postings.items()})
+        return MappingProxyType(indexes)
+
+    def __len__(self) -> int:
+        return len(self._vehicles)
+
+    def __iter__(self) -> Iterator[Mapping[str, Any]]:
+        return iter(self._vehicles)
+
+    def __contains__(self, vehicle_id: str) -> bool:
+        return vehicle_id in self._by_id
+
+    @property
+    def vehicles(self) -> Tuple[Mapping[str, Any], ...]:
+        """Todos los vehículos en el orden del fichero"""
+        return self._vehicles
+
+    @property
+    def keywords(self) -> Tuple[Tuple[str, str], ...]:
+        """Pares (palabra clave, id) usados por detect_specific_vehicle"""
+        return self._keywords
+
+    @property
+    def keyword_matcher(self) -> KeywordMatcher:
+        """Las palabras clave compiladas: indexadas por su palabra menos frecuente y verificadas con str.find"""
+        return self._keyword_matcher
+
+    @property
+    def feature_index(self) -> FeatureIndex:
+        """Índice de texto completo de la instantánea"""
+        return self._feature_index
+
+    def get(self, vehicle_id: str) -> Optional[Mapping[str, Any]]:
+        """Vehículo por id, o None si no existe"""
+        return self._by_id.get(vehicle_id)
+
+    def facet_values(self, facet: str) -> Tuple[str, ...]:
+        """Claves indexadas de un atributo (valores completos y sus palabras)"""
+        return tuple(self._facets.get(facet, {}))
+
+    def match_positions(self, facets: Mapping[str, Iterable[str]]) -> Optional[FrozenSet[int]]:
+        """
+        Posiciones que cumplen los filtros: OR entre los valores de un mismo
+        atributo y AND entre atributos. None si no hay ningún filtro.
+        """
+        candidates = []
+        for facet, values in facets.items():
+            index = self._facets.get(facet, {})
+            matched = frozenset().union(*(index.get(value.lower(), ()) for value in values))
+            if not matched:
+                return frozenset()
+            candidates.append(matched)
+        if not candidates:
+            return None
+        # Intersecar empezando por el conjunto más pequeño
+        candidates.sort(key=len)
+        result = candidates[0]
+        for other in candidates[1:]:
+            result = result & other
+            if not result:
+                break
+        return result
+
+    def filter(self, facets: Mapping[str, Iterable[str]]) -> Tuple[Mapping[str, Any], ...]:
+        """Vehículos que cumplen los filtros, en el orden del inventario"""
+        positions = self.match_positions(facets)
+        if positions is None:
+            return self._vehicles
+        vehicles = self._vehicles
+        return tuple(vehicles[position] for position in sorted(positions))
+
+    def numeric(self, vehicle_id: str, field: str) -> Optional[float]:
+        """Valor numérico de un campo (precio en €, potencia en HP, kilómetros, año)"""
+        vehicle = self._by_id.get(vehicle_id)
+        if vehicle is None or field not in self._columns:
+            return None
+        return parse_number(vehicle.get(field))
+
+    def range_positions(self, field: str, numeric_range: NumericRange) -> FrozenSet[int]:
+        """Posiciones cuyo valor está dentro del intervalo (búsqueda binaria en el índice ordenado)"""
+        values, order = self._sorted.get(field, ((), ()))
+        start, end = 0, len(values)
+        if numeric_range.minimum is not None:
+            side = bisect.bisect_left if numeric_range.min_inclusive else bisect.bisect_right
+            start = side(values, numeric_range.minimum)
+        if numeric_range.maximum is not None:
+            side = bisect.bisect_right if numeric_range.max_inclusive else bisect.bisect_left
+            end = side(values, numeric_range.maximum)
+        return frozenset(order[start:end]) if start < end else frozenset()
+
+    def search(self, facets: Optional[Mapping[str, Iterable[str]]] = None,
+               ranges: Optional[Mapping[str, NumericRange]] = None,
+               sort: Optional[str] = None, descending: bool = False,
+               offset: int = 0, limit: Optional[int] = None) -> Tuple[int, Tuple[Mapping[str, Any], ...]]:
+        """
+        Filtros por atributo + intervalos numéricos, orden opcional por una
+        columna numérica y paginación. Devuelve (total de coincidencias, página).
+        """
+        vehicles = self._vehicles
+        # Sin filtros el índice ordenado ya da el top-k recorriendo k elementos
+        if self._columnar is not None and (facets or ranges):
+            total, page = self._columnar.search(facets, ranges, sort, descending, offset, limit)
+            return total, tuple(vehicles[position] for position in page)
+
+        positions = self._filter_positions(facets, ranges)
+        total = len(self._vehicles) if positions is None else len(positions)
+        stop = total if limit is None else min(total, offset + limit)
+        if offset >= stop:
+            return total, ()
+        page = self._ordered_positions(positions, sort, descending, stop)[offset:stop]
+        return total, tuple(vehicles[position] for position in page)
+
+    def _filter_positions(self, facets: Optional[Mapping[str, Iterable[str]]],
+                          ranges: Optional[Mapping[str, NumericRange]]) -> Optional[FrozenSet[int]]:
+        """Posiciones que cumplen atributos e intervalos (None si no hay ningún filtro)"""
+        positions = self.match_positions(facets or {})
+        for field, numeric_range in (ranges or {}).items():
+            if positions is not None and not positions:
+                break
+            in_range = self.range_positions(field, numeric_range)
+            positions = in_range if positions is None else positions & in_range
+        return positions
+
+    def feature_search(self, query: str, facets: Optional[Mapping[str, Iterable[str]]] = None,
+                       ranges: Optional[Mapping[str, NumericRange]] = None,
+                       sort: Optional[str] = None, descending: bool = False,
+                       offset: int = 0, limit: Optional[int] = None) -> Tuple[int, Tuple[Mapping[str, Any], ...]]:
+        """
+        Vehículos cuyo equipamiento coincide con el texto, por relevancia BM25
+        (o por una columna numérica si se pide orden), restringidos por los
+        mismos filtros que search. Devuelve (total de coincidencias, página).
+        """
+        positions = self._filter_positions(facets, ranges)
+        if positions is not None and not positions:
+            return 0, ()
+        ranked = [position for position, _ in self._feature_index.search(query, positions)]
+        if sort in self._columns:
+            column = self._columns[sort]
+            # Orden estable: a igual valor se mantiene la relevancia; sin dato al final
+            with_value = [position for position in ranked if column[position] is not None]
+            with_value.sort(key=column.__getitem__, reverse=descending)
+            ranked = with_value + [position for position in ranked if column[position] is None]
+        total = len(ranked)
+        stop = total if limit is None else min(total, offset + limit)
+        vehicles = self._vehicles
+        return total, tuple(vehicles[position] for position in ranked[offset:stop])
+
+    def _ordered_positions(self, positions: Optional[FrozenSet[int]], sort: Optional[str],
+                           descending: bool, count: int) -> List[int]:
+        """Las primeras `count` posiciones en el orden pedido (los vehículos sin valor van al final)"""
+        if sort not in self._sorted:
+            if positions is None:
+                return list(range(count))
+            return heapq.nsmallest(count, positions) if count < len(positions) else sorted(positions)
+
+        values, order = self._sorted[sort]
+        if positions is None or len(positions) * 8 >= len(order):
+            # Recorrer el índice ordenado y quedarse con las primeras coincidencias (top-k)
+            ordered = []
+            for position in (self._descending[sort] if descending else order):
+                if positions is None or position in positions:
+                    ordered.append(position)
+                    if len(ordered) == count:
+                        return ordered
+        else:
+            # Pocas coincidencias: ordenarlas directamente por su valor
+            column = self._columns[sort]
+            with_value = [position for position in positions if column[position] is not None]
+            # Empates en el orden del inventario, igual que al recorrer el índice
+            if descending:
+                ordered = heapq.nlargest(count, with_value, key=lambda position: (column[position], -position))
+            else:
+                ordered = heapq.nsmallest(count, with_value, key=lambda position: (column[position], position))
+            if len(ordered) == count:
+                return ordered
+        missing = set(range(len(self._vehicles)) if positions is None else positions).difference(order)
+        return ordered + sorted(missing)[:count - len(ordered)]
+
+    def similar(self, vehicle_id: str, k: int = 3,
+                facets: Optional[Mapping[str, Iterable[str]]] = None,
+                ranges: Optional[Mapping[str, NumericRange]] = None) -> Tuple[Mapping[str, Any], ...]:
+        """Los k vehículos más parecidos a uno dado (sin incluirlo), opcionalmente filtrados"""
+        position = self._positions.get(vehicle_id)
+        if position is None:
+            return ()
+        allowed = self._filter_positions(facets, ranges)
+        vehicles = self._vehicles
+        return tuple(vehicles[found] for found, _ in self._similarity.nearest(position, k, allowed=allowed))
+
+    def closest_to(self, facets: Optional[Mapping[str, Iterable[str]]] = None,
+                   ranges: Optional[Mapping[str, NumericRange]] = None, k: int = 3) -> Tuple[Mapping[str, Any], ...]:
+        """
+        Alternativas para una búsqueda sin resultados: los vehículos más cercanos
+        al tipo pedido y al centro de los intervalos de precio, potencia,
+        consumo o maletero (un intervalo abierto apunta a su extremo)
+        """
+        targets = {}
+        for field, numeric_range in (ranges or {}).items():
+            bounds = [value for value in (numeric_range.minimum, numeric_range.maximum) if value is not None]
+            if bounds:
+                targets[field] = sum(bounds) / len(bounds)
+        vector, mask = self._similarity.query_vector(types=(facets or {}).get("type", ()), targets=targets)
+        vehicles = self._vehicles
+        return tuple(vehicles[found] for found, _ in self._similarity.nearest(k=k, vector=vector, mask=mask))
+
+    def extreme(self, field: str, highest: bool = False,
+                facets: Optional[Mapping[str, Iterable[str]]] = None) -> Optional[Mapping[str, Any]]:
+        """Vehículo con el valor mínimo (o máximo) de una columna, opcionalmente filtrado"""
+        _, page = self.search(facets=facets, sort=field, descending=highest, limit=1)
+        return page[0] if page else None
+
+
+def catalog_from_json(data: Any, version: str = "static") -> VehicleCatalog:
+    """Catálogo a partir del JSON del inventario (objeto con "vehicles" o lista de vehículos)"""
+    if isinstance(data, list):
+        data = {"vehicles": data}
+    keywords = data.get("keywords")
+    return VehicleCatalog(
+        data["vehicles"],
+        keywords=[tuple(pair) for pair in keywords] if keywords is not None else None,
+        default_vehicle_id=data.get("default_vehicle_id"),
+        version=version
+    )
+
+
+def load_catalog(path: str = DEFAULT_CATALOG_PATH) -> VehicleCatalog:
+    """Lee el catálogo desde un fichero JSON"""
+    with open(path, encoding="utf-8") as f:
+        return catalog_from_json(json.load(f))
+
+
+# Catálogo cargado al importar el módulo; inventory_loader puede sustituirlo en caliente
+_catalog = load_catalog()
+_listeners: List[Callable[[VehicleCatalog, VehicleCatalog], None]] = []
+_listeners_lock = threading.Lock()
+
+
+def get_catalog() -> VehicleCatalog:
+    """
+    Catálogo vigente. Cada petición debe leerlo una vez y trabajar sobre esa
+    instantánea: una recarga nunca modifica un catálogo ya publicado.
+    """
+    return _catalog
+
+
+def set_catalog(catalog: VehicleCatalog):
+    """Publica una nueva instantánea (la asignación de la referencia es atómica)"""
+    global _catalog
+    previous = _catalog
+    _catalog = catalog
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(previous, catalog)
+        except Exception as e:
+            print(f"⚠️ Error notificando recarga de inventario: {e}")
+
+
+def add_catalog_listener(listener: Callable[[VehicleCatalog, VehicleCatalog], None]):
+    """Registra una función (anterior, nuevo) que se llama tras cada recarga"""
+    with _listeners_lock:
+        _listeners.append(listener)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Vectores numéricos por vehículo y búsqueda de los más parecidos ("coches como este")
+"""
+
+import heapq
+import math
+from typing import Dict, Any, Optional, List, Tuple, Mapping, Sequence, Iterable, AbstractSet
+
+from feature_search import tokenize
+from inventory_columns import top_k_positions
+
+try:
+    import numpy as np
+except ImportError:  # Sin NumPy las distancias se calculan vehículo a vehículo
+    np = None
+
+# Peso de cada dimensión en la distancia (una diferencia de 0 a 1 en precio pesa lo mismo que cambiar de tipo)
+NUMERIC_WEIGHTS = {"price": 1.0, "power": 0.8, "consumption": 0.5, "trunk_capacity": 0.5}
+TYPE_WEIGHT = 1.0
+DRIVETRAIN_WEIGHT = 0.5
+DRIVETRAINS = ("awd", "rwd", "fwd")
+
+
+def drivetrain_class(value: Any) -> Optional[str]:
+    """"xDrive All-Wheel Drive" → awd, "Rear-wheel drive" → rwd (None si no se reconoce)"""
+    terms = set(tokenize(str(value or "")))
+    for drivetrain in DRIVETRAINS:
+        if drivetrain in terms:
+            return drivetrain
+    return None
+
+
+class SimilarityIndex:
+    """
+    Una fila por vehículo: precio, potencia, consumo y maletero normalizados
+    a [0, 1] (el valor medio si falta el dato), más tipo y tracción en
+    one-hot. Un cambio de tipo o de tracción suma su peso al cuadrado, igual
+    que una diferencia de 0 a 1 en una columna numérica.
+    """
+
+    def __init__(self, vehicles: Sequence[Mapping[str, Any]],
+                 columns: Mapping[str, Sequence[Optional[float]]]):
+        self.size = len(vehicles)
+        self.dimensions = 0
+        self._slices: Dict[str, slice] = {}
+        self._bounds: Dict[str, Tuple[float, float]] = {}
+        rows: List[List[float]] = [[] for _ in range(self.size)]
+
+        for field, weight in NUMERIC_WEIGHTS.items():
+            column = columns.get(field) or [None] * self.size
+            present = [value for value in column if value is not None]
+            self._bounds[field] = (min(present), max(present)) if present else (0.0, 0.0)
+            for row, value in zip(rows, column):
+                row.append(weight * self._normalize(field, value))
+            self._add_slice(field, 1)
+
+        # Tipos del inventario en minúsculas ("suv", "sports car")
+        types = [str(vehicle.get("type", "")).strip().lower() for vehicle in vehicles]
+        self._types = tuple(sorted(set(types) - {""}))
+        self._categorical("type", types, self._types, TYPE_WEIGHT, rows)
+        classes: Dict[Any, Optional[str]] = {}
+        drivetrains = []
+        for vehicle in vehicles:
+            value = vehicle.get("drivetrain")
+            if value not in classes:
+                classes[value] = drivetrain_class(value)
+            drivetrains.append(classes[value])
+        self._categorical("drivetrain", drivetrains, DRIVETRAINS, DRIVETRAIN_WEIGHT, rows)
+
+        self._rows = rows
+        self._matrix = None
+        if np is not None:
+            self._matrix = np.array(rows, dtype=np.float64).reshape(self.size, self.dimensions)
+            # ‖x − y‖² = ‖x‖² − 2·x·y + ‖y‖²: con las normas precalculadas basta un producto matriz-vector
+            self._norms = np.einsum("ij,ij->i", self._matrix, self._matrix)
+
+    def _add_slice(self, name: str, width: int):
+        self._slices[name] = slice(self.dimensions, self.dimensions + width)
+        self.dimensions += width
+
+    def _normalize(self, field: str, value: Optional[float]) -> float:
+        low, high = self._bounds[field]
+        if value is None or high <= low:
+            return 0.5
+        return min(1.0, max(0.0, (value - low) / (high - low)))
+
+    def _categorical(self, name: str, values: List[Optional[str]], vocabulary: Sequence[str],
+                     weight: float, rows: List[List[float]]):
+        # Dos categorías distintas difieren en dos dimensiones: cada una vale weight/√2
+        scale = weight / math.sqrt(2)
+        index = {value: offset for offset, value in enumerate(vocabulary)}
+        for row, value in zip(rows, values):
+            one_hot = [0.0] * len(vocabulary)
+            if value in index:
+                one_hot[index[value]] = scale
+            row.extend(one_hot)
+        self._add_slice(name, len(vocabulary))
+
+    def query_vector(self, types: Iterable[str] = (), targets: Optional[Mapping[str, float]] = None,
+                     drivetrain: Optional[str] = None) -> Tuple[List[float], List[bool]]:
+        """
+        Vector y máscara de dimensiones conocidas para una búsqueda sin vehículo
+        de referencia: tipos aceptados (términos del índice, "suv"), valores
+        objetivo por columna numérica y tracción. Las dimensiones sin dato no cuentan.
+        """
+        vector = [0.0] * self.dimensions
+        mask = [False] * self.dimensions
+        for field, value in (targets or {}).items():
+            if field in NUMERIC_WEIGHTS:
+                position = self._slices[field].start
+                vector[position] = NUMERIC_WEIGHTS[field] * self._normalize(field, value)
+                mask[position] = True
+
+        wanted = [offset for offset, vehicle_type in enumerate(self._types)
+                  if any(term in vehicle_type.split() or term == vehicle_type for term in types)]
+        if wanted:
+            type_slice = self._slices["type"]
+            share = TYPE_WEIGHT / math.sqrt(2) / len(wanted)
+            for offset in range(type_slice.start, type_slice.stop):
+                mask[offset] = True
+            for offset in wanted:
+                vector[type_slice.start + offset] = share
+        if drivetrain in DRIVETRAINS:
+            drive_slice = self._slices["drivetrain"]
+            for offset in range(drive_slice.start, drive_slice.stop):
+                mask[offset] = True
+            vector[drive_slice.start + DRIVETRAINS.index(drivetrain)] = DRIVETRAIN_WEIGHT / math.sqrt(2)
+        return vector, mask
+
+    def nearest(self, position: Optional[int] = None, k: int = 3,
+                vector: Optional[Sequence[float]] = None, mask: Optional[Sequence[bool]] = None,
+                allowed: Optional[AbstractSet[int]] = None) -> List[Tuple[int, float]]:
+        """
+        Los k vehículos más cercanos a la fila `position` (excluida) o a un
+        vector con máscara: (posición, distancia), de menor a mayor distancia
+        y, a igual distancia, en el orden del inventario
+        """
+        if position is not None:
+            vector, mask = self._rows[position], None
+        if vector is None or k <= 0 or not self.size:
+            return []
+        if mask is not None and not any(mask):
+            return []
+        if self._matrix is not None:
+            return self._nearest_matrix(vector, mask, k, position, allowed)
+
+        dimensions = [d for d in range(self.dimensions) if mask is None or mask[d]]
+        distances = []
+        for candidate in (range(self.size) if allowed is None else allowed):
+            if candidate != position:
+                row = self._rows[candidate]
+                distances.append((sum((row[d] - vector[d]) ** 2 for d in dimensions), candidate))
+        return [(candidate, math.sqrt(distance)) for distance, candidate in heapq.nsmallest(k, distances)]
+
+    def _nearest_matrix(self, vector: Sequence[float], mask: Optional[Sequence[bool]], k: int,
+                        position: Optional[int], allowed: Optional[AbstractSet[int]]) -> List[Tuple[int, float]]:
+        target = np.asarray(vector, dtype=np.float64)
+        if mask is None:
+            distances = self._norms - 2 * (self._matrix @ target) + target @ target
+        else:
+            columns = np.flatnonzero(np.asarray(mask, dtype=bool))
+            matrix, target = self._matrix[:, columns], target[columns]
+            distances = ((matrix - target) ** 2).sum(axis=1)
+        # El redondeo puede dar distancias mínimamente negativas para vehículos idénticos
+        np.maximum(distances, 0, out=distances)
+
+        candidates = np.arange(self.size)
+        if allowed is not None:
+            candidates = np.fromiter(sorted(allowed), dtype=np.int64, count=len(allowed))
+        if position is not None:
+            candidates = candidates[candidates != position]
+        if not len(candidates):
+            return []
+        keys = distances[candidates]
+        ranked = top_k_positions(keys, k)
+        return list(zip(candidates[ranked].tolist(), np.sqrt(keys[ranked]).tolist()))
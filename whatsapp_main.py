@@ -1,5 +1,7 @@
 import os
+import hmac
 import json
+import logging
 import time
 from flask import Flask, request, jsonify
 from flask_cors import CORS
@@ -9,15 +11,24 @@ from dotenv import load_dotenv
 load_dotenv()  # Cargar .env principal
 load_dotenv('.env.whatsapp')  # Cargar configuración específica de WhatsApp
 
+# Registros de los módulos (selección de modelos por petición, recargas); LOG_LEVEL=WARNING los silencia
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(name)s %(message)s")
+
 # Importar nuestros componentes del concesionario
 from whatsapp_sender import WhatsAppSender
 from message_manager import MessageManager
 from car_dealership_agent import CarDealershipWhatsAppAgent
+from agent_metrics import metrics
+from inventory_loader import start_inventory_watcher
+from vehicle_catalog import get_catalog
+from vehicle_cards import vehicle_cards, prerender_enabled, prerender_languages
 
 # Configuración de WhatsApp con validación
 VERIFY_TOKEN_META = os.getenv("WHATSAPP_VERIFY_TOKEN", "automax_webhook_2025")
 WHATSAPP_ACCESS_TOKEN = os.getenv("WHATSAPP_ACCESS_TOKEN")
 PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
+# Token para los endpoints /admin (sin configurar, quedan desactivados)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 # Validar que las variables de entorno estén configuradas
 if not WHATSAPP_ACCESS_TOKEN:
@@ -30,6 +41,13 @@ if not PHONE_NUMBER_ID:
     print("🔧 Configura la variable de entorno WHATSAPP_PHONE_NUMBER_ID")
     exit(1)
 
+# Inventario externo con recarga en caliente (opcional, AUTOMAX_INVENTORY_SOURCE)
+inventory_watcher = start_inventory_watcher()
+
+# Fichas pre-renderizadas al arrancar (opcional, VEHICLE_CARD_PRERENDER=1)
+if prerender_enabled():
+    print(f"🗂️ Fichas pre-renderizadas: {vehicle_cards.prerender(get_catalog(), prerender_languages())}")
+
 # Inicializar componentes
 whatsapp_sender = WhatsAppSender(WHATSAPP_ACCESS_TOKEN, PHONE_NUMBER_ID)
 car_agent = CarDealershipWhatsAppAgent()
@@ -39,9 +57,6 @@ message_manager = MessageManager(whatsapp_sender, car_agent)
 app = Flask(__name__)
 CORS(app)
 
-# Almacenamiento temporal en memoria (después será Firestore)
-user_conversations = {}
-
 @app.route('/', methods=['GET'])
 def hello():
     return "🚗 AutoMax WhatsApp Bot - Sistema de Concesionario", 200
@@ -171,13 +186,23 @@ def process_whatsapp_message(message_data):
                     
                     print(f"📋 Lista seleccionada: {list_id} - {list_title}")
                     
-                    message_manager.handle_list_selection(
-                        user_phone=user_phone,
-                        user_name=user_name,
-                        selection_id=list_id,
-                        selection_title=list_title,
-                        message_id=message_id
-                    )
+                    try:
+                        import asyncio
+                        loop = asyncio.new_event_loop()
+                        asyncio.set_event_loop(loop)
+                        result = loop.run_until_complete(
+                            message_manager.handle_list_selection(
+                                user_phone=user_phone,
+                                user_name=user_name,
+                                selection_id=list_id,
+                                selection_title=list_title,
+                                message_id=message_id
+                            )
+                        )
+                        loop.close()
+                        print(f"✅ Selección procesada: {result}")
+                    except Exception as e:
+                        print(f"❌ Error procesando selección: {str(e)}")
             
             elif message["type"] == "image":
                 # Procesar imágenes (futuro: fotos de autos que quieren)
@@ -209,14 +234,50 @@ def status():
         "status": "active",
         "service": "AutoMax WhatsApp Bot",
         "version": "1.0.0",
-        "active_conversations": len(user_conversations),
+        "active_conversations": car_agent.get_active_users_count(),
+        "conversations": car_agent.conversations.stats(),
+        "conversation_topics": car_agent.get_topic_counts(),
+        "inventory": {"version": get_catalog().version, "vehicles": len(get_catalog())},
+        "vehicle_cards": vehicle_cards.stats(),
         "components": {
             "whatsapp_sender": "ready",
             "car_agent": "ready",
             "message_manager": "ready"
-        }
+        },
+        "metrics": metrics.snapshot(),
+        "speculation": car_agent.chat_agent.speculation.report(),
+        "answer_cache": car_agent.chat_agent.answer_cache.report(),
+        "models": car_agent.chat_agent.llm.router.status()
     })
 
+def _is_admin_request() -> bool:
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+@app.route('/admin/answer-cache', methods=['GET', 'DELETE'])
+def answer_cache_admin():
+    """
+    GET: estadísticas de la caché semántica de respuestas; DELETE: vaciarla
+    (por ejemplo tras cambiar el prompt del sistema). Requiere X-Admin-Token.
+    """
+    if not _is_admin_request():
+        return jsonify({"status": "error", "message": "unauthorized"}), 403
+    answer_cache = car_agent.chat_agent.answer_cache
+    if request.method == 'DELETE':
+        return jsonify({"status": "success", "purged": answer_cache.purge()})
+    return jsonify(answer_cache.report(include_questions=True))
+
+@app.route('/admin/conversations', methods=['GET'])
+def conversations_admin():
+    """
+    Resumen (mensajes, temas y marcas) de cada conversación activa, leído de
+    los contadores incrementales de la sesión. Requiere X-Admin-Token.
+    """
+    if not _is_admin_request():
+        return jsonify({"status": "error", "message": "unauthorized"}), 403
+    summaries = car_agent.get_conversation_summaries()
+    return jsonify({"active": len(summaries), "conversations": summaries})
+
 @app.route('/test', methods=['POST'])
 def test_message():
     """